@@ -0,0 +1,68 @@
+"""
+Valbar accelererad backend för sekventiella kärnor (EMA/Wilder-rekursion,
+stopp-loopar per bar).
+
+    TRADERBOT_BACKEND=auto   numba om det är installerat, annars numpy (standard)
+    TRADERBOT_BACKEND=numba  kräv numba – saknas det faller vi tillbaka med en varning
+    TRADERBOT_BACKEND=numpy  ren NumPy/Python
+
+Kärnor skrivs som vanliga Python-funktioner över NumPy-arrayer och märks
+med @kernel. Backend väljs vid anropet, så set_backend() gäller direkt.
+
+Paritetskontroll: python -m app.bench_indicators --backends kör varje kärna
+med båda backends och avslutar med fel om de skiljer sig (eller om numba
+saknas). Den ingår också i en vanlig körning av bench_indicators.
+"""
+import functools
+import os
+import warnings
+
+try:
+    import numba
+except ImportError:  # valfritt beroende
+    numba = None
+
+BACKENDS = ("auto", "numba", "numpy")
+_backend = os.getenv("TRADERBOT_BACKEND", "auto").strip().lower() or "auto"
+_warned = False
+
+
+def set_backend(name: str):
+    global _backend
+    name = (name or "auto").strip().lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Okänd backend: {name} (välj bland {', '.join(BACKENDS)})")
+    _backend = name
+
+
+def active() -> str:
+    """Backend som faktiskt används: 'numba' eller 'numpy'."""
+    global _warned
+    if _backend == "numpy" or (_backend == "auto" and numba is None):
+        return "numpy"
+    if numba is None:
+        if not _warned:
+            warnings.warn("TRADERBOT_BACKEND=numba men numba är inte installerat – kör numpy")
+            _warned = True
+        return "numpy"
+    return "numba"
+
+
+def kernel(fn):
+    """
+    Märk en loopkärna. Med numba kompileras den (njit, cache) vid första
+    anropet; annars körs Python-versionen. fn.py är alltid den okompilerade.
+    """
+    compiled = None
+
+    @functools.wraps(fn)
+    def call(*args):
+        nonlocal compiled
+        if active() == "numba":
+            if compiled is None:
+                compiled = numba.njit(cache=True)(fn)
+            return compiled(*args)
+        return fn(*args)
+
+    call.py = fn
+    return call
@@ -1,7 +1,17 @@
 
 import argparse, time, os, json, sys
 import pandas as pd
-import numpy as np
+
+try:
+    from app.data import get_data, get_data_many, period_start
+    from app.providers import get_provider
+    from app import indicators as ind
+    from app import streaming
+except ImportError:
+    from data import get_data, get_data_many, period_start
+    from providers import get_provider
+    import indicators as ind
+    import streaming
 
 STATE_FILE = "alert_state.json"
 
@@ -19,23 +29,15 @@ def rsi(series: pd.Series, period: int = 14) -> pd.Series:
     if isinstance(series, pd.DataFrame):
         series = series.iloc[:, 0]
     series = pd.to_numeric(series, errors="coerce")
-    delta = series.diff()
-    up = np.where(delta > 0, delta, 0.0)
-    down = np.where(delta < 0, -delta, 0.0)
-    roll_up = pd.Series(up, index=series.index).rolling(period).mean()
-    roll_down = pd.Series(down, index=series.index).rolling(period).mean()
-    rs = roll_up / roll_down
-    return 100 - (100 / (1 + rs))
+    # rullande medel, första diffen räknas som 0 (som tidigare np.where-variant)
+    return pd.Series(ind.rsi_sma(series.to_numpy(dtype="float64"), period, zero_first=True), index=series.index)
 
 def macd(series: pd.Series, fast=12, slow=26, signal=9):
     if isinstance(series, pd.DataFrame):
         series = series.iloc[:, 0]
     series = pd.to_numeric(series, errors="coerce")
-    ema_fast = series.ewm(span=fast, adjust=False).mean()
-    ema_slow = series.ewm(span=slow, adjust=False).mean()
-    macd_line = ema_fast - ema_slow
-    signal_line = macd_line.ewm(span=signal, adjust=False).mean()
-    return macd_line, signal_line
+    macd_line, signal_line, _ = ind.macd(series.to_numpy(dtype="float64"), fast, slow, signal)
+    return pd.Series(macd_line, index=series.index), pd.Series(signal_line, index=series.index)
 
 def latest_signal(close: pd.Series):
     macd_line, signal_line = macd(close)
@@ -64,6 +66,63 @@ def latest_signal(close: pd.Series):
         "SELL": bool(sell),
     }
 
+def latest_signal_stream(close: pd.Series, ind_state: dict = None):
+    """
+    Som latest_signal men med inkrementella indikatorer (app/streaming.py).
+    ind_state = {"start", "ts", "px", "macd", "rsi"} gäller efter senaste
+    *stängda* bar; bara barer efter ts körs igenom. Sista baren räknas på en
+    kopia eftersom den kan vara ofullständig. Returnerar (signal, nytt ind_state).
+
+    EMA-tillståndet beror på var serien börjar, så det återanvänds bara när
+    fönstret börjar på samma bar ("start"). När --period-fönstret glider
+    (period_start flyttas en dag) byggs tillståndet om från fönstret – samma
+    värden som latest_signal, bara färre omräkningar inom dagen.
+    """
+    if len(close) < 2:
+        return None, ind_state
+    vals = close.to_numpy(dtype=float)
+    pos = None
+    if ind_state and ind_state.get("start") == str(close.index[0]):
+        try:
+            pos = close.index.get_loc(pd.Timestamp(ind_state["ts"]))
+        except (KeyError, ValueError, TypeError):
+            pos = None
+        # bar saknas, ligger sist eller har justerats om -> bygg om från fönstret
+        if (not isinstance(pos, int) or pos >= len(vals) - 1
+                or abs(vals[pos] - ind_state.get("px", float("nan"))) > 1e-9 * abs(vals[pos])):
+            pos = None
+    if pos is None:
+        m = streaming.MACDState(12, 26, 9)
+        r = streaming.RollingRSIState(14, zero_first=True)
+        pos = -1
+    else:
+        m = streaming.from_dict(ind_state["macd"])
+        r = streaming.from_dict(ind_state["rsi"])
+
+    for x in vals[pos + 1:-1]:
+        m.update(x)
+        r.update(x)
+    macd_prev, sig_prev = m.line, m.signal.value
+    m_now, (macd_now, sig_now) = streaming.peek(m, vals[-1])
+    _, r_now = streaming.peek(r, vals[-1])
+
+    cross_up = (macd_prev <= sig_prev) and (macd_now > sig_now)
+    cross_down = (macd_prev >= sig_prev) and (macd_now < sig_now)
+
+    buy = cross_up and (r_now > 50)
+    sell = cross_down or (r_now < 45)
+
+    new_state = {"start": str(close.index[0]), "ts": str(close.index[-2]), "px": float(vals[-2]), "macd": m.to_dict(), "rsi": r.to_dict()}
+    return {
+        "timestamp": str(close.index[-1]),
+        "price": float(vals[-1]),
+        "rsi": float(r_now),
+        "macd": float(macd_now),
+        "signal": float(sig_now),
+        "BUY": bool(buy),
+        "SELL": bool(sell),
+    }, new_state
+
 def load_state(path):
     if os.path.exists(path):
         try:
@@ -80,12 +139,12 @@ def save_state(path, state):
     except Exception as e:
         print("Kunde inte spara state:", e, file=sys.stderr)
 
-def check_symbol(symbol, period, interval):
-    import yfinance as yf
-    try:
-        data = yf.download(symbol, period=period, interval=interval, auto_adjust=True, progress=False)
-    except Exception as e:
-        return symbol, None, f"Fel vid hämtning: {e}"
+def check_symbol(symbol, period, interval, data=None, source="auto", state_entry=None):
+    if data is None:
+        try:
+            data = get_data(symbol, period_start(period), interval=interval, source=source)
+        except Exception as e:
+            return symbol, None, f"Fel vid hämtning: {e}"
     if data is None or data.empty or "Close" not in data.columns:
         return symbol, None, "Tom data eller saknar 'Close'"
     close = data["Close"]
@@ -94,19 +153,55 @@ def check_symbol(symbol, period, interval):
     close = close.dropna()
     if close.empty:
         return symbol, None, "Saknar prisdata"
-    sig = latest_signal(close)
+    if state_entry is None:
+        sig = latest_signal(close)
+    else:
+        sig, state_entry["ind"] = latest_signal_stream(close, state_entry.get("ind"))
     return symbol, sig, None
 
+def check_symbols(symbols, period, interval, chunk_size=50, sleep_between=0.0, source="auto", state=None):
+    """
+    Batchat läge: hämtar chunk_size symboler per anrop och delar upp den
+    kombinerade ramen per symbol innan latest_signal körs.
+    """
+    for i in range(0, len(symbols), chunk_size):
+        chunk = symbols[i:i + chunk_size]
+        try:
+            frames = get_data_many(chunk, period_start(period), interval=interval, source=source,
+                                   chunk_size=chunk_size)
+        except Exception as e:
+            for sym in chunk:
+                yield sym, None, f"Fel vid hämtning: {e}"
+        else:
+            errors = getattr(get_provider(source), "errors", {})
+            for sym in chunk:
+                if sym in errors:
+                    yield sym, None, f"Fel vid hämtning: {errors[sym]}"
+                else:
+                    entry = state.setdefault(sym, {}) if state is not None else None
+                    yield check_symbol(sym, period, interval, data=frames.get(sym), state_entry=entry)
+        if i + chunk_size < len(symbols):
+            time.sleep(sleep_between)
+
 def main():
     ap = argparse.ArgumentParser(description="Batch-alert för flera svenska aktier (RSI+MACD)")
     ap.add_argument("--csv", default="tickers_se.csv", help="CSV med kolumn 'symbol' (ex: NANEXA.ST)")
     ap.add_argument("--period", default="6mo")
     ap.add_argument("--interval", default="1d")
+    ap.add_argument("--source", default="auto", help="Datakälla (se app/providers.py)")
     ap.add_argument("--loop", action="store_true")
     ap.add_argument("--seconds", type=int, default=600)
     ap.add_argument("--notify", action="store_true", help="Visa Windows-notiser")
     ap.add_argument("--only-signals", action="store_true", help="Skriv bara ut köp/sälj, inte 'ingen signal'")
-    ap.add_argument("--sleep-between", type=float, default=1.0, help="Sekunders vila mellan symboler (rate-limit vänligt)")
+    ap.add_argument("--sleep-between", type=float, default=1.0, help="Sekunders vila mellan symboler/chunkar (rate-limit vänligt)")
+    ap.add_argument("--chunk-size", type=int, default=50, help="Symboler per nedladdning (0 = en symbol i taget)")
+    ap.add_argument("--full-recalc", action="store_true",
+                    help="Räkna MACD/RSI över hela fönstret varje pass (i stället för sparat indikatortillstånd)")
+    ap.add_argument("--async", dest="use_async", action="store_true",
+                    help="Hämta via asyncio mot Yahoos chart-API (token bucket i stället för --sleep-between)")
+    ap.add_argument("--rate", type=float, default=5.0, help="Max anrop per sekund i --async")
+    ap.add_argument("--concurrency", type=int, default=8, help="Max samtidiga anrop i --async")
+    ap.add_argument("--timeout", type=float, default=10.0, help="Timeout per symbol i --async (sekunder)")
     args = ap.parse_args()
 
     # Läs tickers
@@ -120,13 +215,33 @@ def main():
 
     state = load_state(STATE_FILE)
 
+    symbols = [s.strip() for s in df["symbol"].dropna().astype(str) if s.strip()]
+
+    if args.use_async:
+        try:
+            from app.fetch_async import YahooAsyncProvider
+        except ImportError:
+            from fetch_async import YahooAsyncProvider
+        provider = YahooAsyncProvider(rate=args.rate, concurrency=args.concurrency, timeout=args.timeout)
+
+    def results():
+        st = None if args.full_recalc else state
+        if args.use_async:
+            # ett pass = en omgång; takten styrs av token bucket, inte av sleep
+            yield from check_symbols(symbols, args.period, args.interval, max(1, len(symbols)), 0.0, provider, st)
+            return
+        if args.chunk_size > 0:
+            yield from check_symbols(symbols, args.period, args.interval, args.chunk_size,
+                                     args.sleep_between, args.source, st)
+            return
+        for sym in symbols:
+            entry = st.setdefault(sym, {}) if st is not None else None
+            yield check_symbol(sym, args.period, args.interval, source=args.source, state_entry=entry)
+            time.sleep(args.sleep_between)
+
     def run_pass():
         nonlocal state
-        for sym in df["symbol"].dropna().astype(str):
-            sym = sym.strip()
-            if not sym:
-                continue
-            symbol, sig, err = check_symbol(sym, args.period, args.interval)
+        for symbol, sig, err in results():
             if err:
                 if not args.only_signals:
                     print(f"{symbol}: {err}")
@@ -147,31 +262,34 @@ def main():
                         msg = f"{symbol} {ts}: KÖP-signal (pris ~ {price:.2f}) | MACD↑ & RSI {rsi_now:.1f}>50"
                         print(msg)
                         notify("KÖP-signal", msg, args.notify)
-                        state[symbol] = {"timestamp": ts, "last_signal": "BUY"}
+                        state.setdefault(symbol, {}).update(timestamp=ts, last_signal="BUY")
                 elif sig["SELL"]:
                     if prev_ts != ts or prev_sig != "SELL":
                         msg = f"{symbol} {ts}: SÄLJ-signal (pris ~ {price:.2f}) | MACD↓ eller RSI {rsi_now:.1f}<45"
                         print(msg)
                         notify("SÄLJ-signal", msg, args.notify)
-                        state[symbol] = {"timestamp": ts, "last_signal": "SELL"}
+                        state.setdefault(symbol, {}).update(timestamp=ts, last_signal="SELL")
                 else:
                     if not args.only_signals:
                         print(f"{symbol} {ts}: INGEN signal | Pris {price:.2f}, RSI {rsi_now:.1f}, MACD {macd_now:.4f} vs {macd_sig:.4f}")
                     # uppdatera timestamp så vi inte spammar nästa gång
                     state.setdefault(symbol, {})["timestamp"] = ts
-                time.sleep(args.sleep_between)
 
         save_state(STATE_FILE, state)
 
-    if args.loop:
-        while True:
-            try:
-                run_pass()
-            except Exception as e:
-                print("Fel i loop:", e, file=sys.stderr)
-            time.sleep(args.seconds)
-    else:
-        run_pass()
+    try:
+        if args.loop:
+            while True:
+                try:
+                    run_pass()
+                except Exception as e:
+                    print("Fel i loop:", e, file=sys.stderr)
+                time.sleep(args.seconds)
+        else:
+            run_pass()
+    finally:
+        if args.use_async:
+            provider.close()
 
 if __name__ == "__main__":
     main()
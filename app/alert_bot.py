@@ -3,7 +3,11 @@ import argparse
 import time
 import sys
 import pandas as pd
-import numpy as np
+
+try:
+    from app import indicators as ind
+except ImportError:
+    import indicators as ind
 
 # Optional Windows toast (won't crash if not installed or not on Windows)
 def notify(title, msg):
@@ -18,23 +22,15 @@ def rsi(series: pd.Series, period: int = 14) -> pd.Series:
     if isinstance(series, pd.DataFrame):
         series = series.iloc[:, 0]
     series = pd.to_numeric(series, errors="coerce")
-    delta = series.diff()
-    up = np.where(delta > 0, delta, 0.0)
-    down = np.where(delta < 0, -delta, 0.0)
-    roll_up = pd.Series(up, index=series.index).rolling(period).mean()
-    roll_down = pd.Series(down, index=series.index).rolling(period).mean()
-    rs = roll_up / roll_down
-    return 100 - (100 / (1 + rs))
+    # rullande medel, första diffen räknas som 0 (som tidigare np.where-variant)
+    return pd.Series(ind.rsi_sma(series.to_numpy(dtype="float64"), period, zero_first=True), index=series.index)
 
 def macd(series: pd.Series, fast=12, slow=26, signal=9):
     if isinstance(series, pd.DataFrame):
         series = series.iloc[:, 0]
     series = pd.to_numeric(series, errors="coerce")
-    ema_fast = series.ewm(span=fast, adjust=False).mean()
-    ema_slow = series.ewm(span=slow, adjust=False).mean()
-    macd_line = ema_fast - ema_slow
-    signal_line = macd_line.ewm(span=signal, adjust=False).mean()
-    return macd_line, signal_line
+    macd_line, signal_line, _ = ind.macd(series.to_numpy(dtype="float64"), fast, slow, signal)
+    return pd.Series(macd_line, index=series.index), pd.Series(signal_line, index=series.index)
 
 def latest_signal(close: pd.Series):
     macd_line, signal_line = macd(close)
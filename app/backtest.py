@@ -2,18 +2,23 @@
 import argparse
 from dataclasses import dataclass
 from datetime import datetime, date
-import math
-import sys
 import numpy as np
 import pandas as pd
-import yfinance as yf
+
+try:
+    from app.data import get_data
+    from app import indicators as ind, metrics
+except ImportError:
+    from data import get_data
+    import indicators as ind
+    import metrics
 
 @dataclass
 class Params:
     ticker: str = "AAPL"
     start: str = "2018-01-01"   # YYYY-MM-DD
     interval: str = "1d"        # 1d, 1h, 1wk
-    source: str = "stooq"       # används ej – vi hämtar via yfinance oavsett
+    source: str = "stooq"       # datakälla, se app/providers.py (stooq -> yfinance)
     rsi_buy: int = 52           # köp när RSI <= detta
     rsi_sell: int = 59          # sälj när RSI >= detta
     use_sl: bool = True
@@ -26,95 +31,94 @@ def _to_date(s: str) -> datetime:
         return datetime(s.year, s.month, s.day)
     return datetime.fromisoformat(str(s))
 
-def load_prices(ticker: str, start: str, interval: str) -> pd.DataFrame:
-    df = yf.download(ticker, start=_to_date(start), interval=interval, auto_adjust=True, progress=False, threads=False)
-    if isinstance(df.columns, pd.MultiIndex):
-        df = df.droplevel(0, axis=1)
-    return df.dropna()
+def load_prices(ticker: str, start: str, interval: str, source: str = "auto") -> pd.DataFrame:
+    # via lokala barlagret – bara nya barer hämtas från nätet
+    return get_data(ticker, _to_date(start), interval=interval, source=source)
 
 def rsi_series(close: pd.Series, window: int = 14) -> pd.Series:
-    delta = close.diff()
-    gain = delta.clip(lower=0.0)
-    loss = -delta.clip(upper=0.0)
-    avg_gain = gain.rolling(window).mean()
-    avg_loss = loss.rolling(window).mean().replace(0, np.nan)
-    rs = avg_gain / avg_loss
-    rsi = 100 - (100 / (1 + rs))
-    return rsi.fillna(method="bfill").fillna(50.0)
+    # RSI på rullande medel (NaN när snittförlusten är 0), se app/indicators.py
+    rsi = pd.Series(ind.rsi_sma(close.to_numpy(dtype="float64"), window, nan_on_zero_loss=True),
+                    index=close.index)
+    return rsi.bfill().fillna(50.0)
+
+def rsi_trades(close: np.ndarray, rsi: np.ndarray, rsi_buy: float, rsi_sell: float,
+               sl_mult: float = None):
+    """
+    Entry/exit-index för RSI-strategin utan loop per bar.
+    Köp på första bar (från index 1) med RSI <= rsi_buy när vi är ute; sälj
+    på första bar därefter med RSI >= rsi_sell eller pris <= entry*sl_mult.
+    Stoppet letas bara upp till nästa säljsignal. Samma bar som en exit kan
+    inte bli ny entry. -> (entries, exits) där exit -1 = öppen position.
+    """
+    n = len(close)
+    buys = np.flatnonzero(rsi[1:] <= rsi_buy) + 1
+    sells = np.flatnonzero(rsi >= rsi_sell)
+    # nästa köp/sälj strikt efter bar i (n = ingen), uppslag i O(1) i loopen
+    after = np.arange(n)
+    next_buy = np.append(buys, n)[np.searchsorted(buys, after, side="right")].tolist()
+    next_sell = np.append(sells, n)[np.searchsorted(sells, after, side="right")].tolist()
+    entries, exits = [], []
+    e = next_buy[0] if n else n
+    while e < n:
+        x = next_sell[e]
+        if sl_mult is not None:
+            hit = np.flatnonzero(close[e + 1:min(x, n - 1) + 1] <= close[e] * sl_mult)
+            if len(hit):
+                x = e + 1 + int(hit[0])
+        entries.append(e)
+        if x >= n:
+            exits.append(-1)
+            break
+        exits.append(x)
+        e = next_buy[x]
+    return np.array(entries, dtype=np.int64), np.array(exits, dtype=np.int64)
+
 
 def backtest_rsi(df: pd.DataFrame, p: Params) -> dict:
     if df.empty or "Close" not in df.columns:
         raise ValueError("Tom data – kunde inte hämta priser.")
-    close = df["Close"].copy()
+    close = df["Close"].astype("float64")  # kompakta (float32) ramar räknas i float64
     rsi = rsi_series(close, 14)
 
     slip = p.slip_bps / 10_000.0
     fee = p.fee
     sl_mult = 1.0 - (p.sl / 100.0)
-
-    equity = 1.0
-    eq_curve = [equity]
-    in_pos = False
-    entry_price = np.nan
-
-    trades = []
-    wins = 0
+    cost = (1.0 - slip) * (1.0 - fee)
+
+    c = np.ascontiguousarray(close.to_numpy())
+    n = len(c)
+    ent, ext = rsi_trades(c, rsi.to_numpy(dtype="float64"), p.rsi_buy, p.rsi_sell,
+                          sl_mult if p.use_sl else None)
+    closed = ext >= 0
+    e, x = ent[closed], ext[closed]
+
+    # trade-resultat inkl exit-kostnader
+    trades = c[x] / c[e] * (1.0 - slip) * (1.0 - fee)
+    wins = int((trades > 1.0).sum())
+
+    # daglig mark-to-market: i position på barer e+1..x (öppen: till sista)
+    held = np.zeros(n + 1, dtype=np.int64)
+    np.add.at(held, ent + 1, 1)
+    np.add.at(held, np.where(ext >= 0, ext + 1, n), -1)
+    held = np.cumsum(held[:n]) > 0
+    growth = np.ones(n)
+    prev = c[:-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth[1:] = np.where(held[1:] & (prev > 0), c[1:] / np.where(prev > 0, prev, 1.0), 1.0)
+    costs = np.ones(n)
+    costs[ent] = cost
+    costs[x] = cost
+    # pris först, kostnad sedan – samma multiplikationsordning som bar för bar
+    eq = np.cumprod(np.column_stack([growth, costs]).ravel())[1::2]
+
+    max_dd = float(metrics.max_drawdown(eq)) if len(eq) else 0.0
 
     dates = close.index
-    for i in range(1, len(dates)):
-        today = dates[i]
-        prev = dates[i - 1]
-        price = float(close.loc[today])
-        price_prev = float(close.loc[prev])
-        r = float(rsi.loc[today])
-
-        # mark-to-market om vi är i position
-        if in_pos:
-            # dagsavkastning i priset
-            growth = price / price_prev if price_prev > 0 else 1.0
-            equity *= growth
-
-        # sälj villkor
-        sell_now = False
-        if in_pos:
-            stop_price = entry_price * sl_mult if p.use_sl else -math.inf
-            if (p.use_sl and price <= stop_price) or (r >= p.rsi_sell):
-                sell_now = True
-
-        # köp villkor
-        buy_now = False
-        if not in_pos and (r <= p.rsi_buy):
-            buy_now = True
-
-        # genomför affärer (kostnader appliceras som multiplikatorer)
-        if sell_now:
-            # slippage + courtage vid exit
-            equity *= (1.0 - slip) * (1.0 - fee)
-            # trade-resultat
-            trade_ret = price / entry_price * (1.0 - slip) * (1.0 - fee)  # inkl kostnader
-            wins += 1 if trade_ret > 1.0 else 0
-            trades.append(trade_ret)
-            in_pos = False
-            entry_price = np.nan
-
-        if buy_now:
-            # slippage + courtage vid entry
-            equity *= (1.0 - slip) * (1.0 - fee)
-            entry_price = price
-            in_pos = True
-
-        eq_curve.append(equity)
-
-    eq = pd.Series(eq_curve, index=dates)
-    max_equity = eq.cummax()
-    dd = (eq / max_equity - 1.0)
-    max_dd = dd.min() if len(dd) else 0.0
-
     start_dt = dates[0].to_pydatetime()
     end_dt = dates[-1].to_pydatetime()
     years = max((end_dt - start_dt).days / 365.25, 1e-9)
-    total_ret = eq.iloc[-1] - 1.0
-    cagr = (eq.iloc[-1]) ** (1 / years) - 1.0 if eq.iloc[-1] > 0 else -1.0
+    total_ret = eq[-1] - 1.0
+    cagr = (eq[-1]) ** (1 / years) - 1.0 if eq[-1] > 0 else -1.0
 
     summary = {
         "ticker": p.ticker,
@@ -122,11 +126,11 @@ def backtest_rsi(df: pd.DataFrame, p: Params) -> dict:
         "to": end_dt.date().isoformat(),
         "bars": int(len(df)),
         "trades": int(len(trades)),
-        "win_rate": (wins / len(trades)) if trades else 0.0,
-        "total_return_pct": total_ret * 100.0,
-        "cagr_pct": cagr * 100.0,
-        "max_drawdown_pct": max_dd * 100.0,
-        "final_equity": float(eq.iloc[-1]),
+        "win_rate": (wins / len(trades)) if len(trades) else 0.0,
+        "total_return_pct": float(total_ret * 100.0),
+        "cagr_pct": float(cagr * 100.0),
+        "max_drawdown_pct": float(max_dd * 100.0),
+        "final_equity": float(eq[-1]),
     }
     return summary
 
@@ -154,7 +158,7 @@ def run(
         fee=float(fee),
         slip_bps=int(slip_bps),
     )
-    df = load_prices(p.ticker, p.start, p.interval)
+    df = load_prices(p.ticker, p.start, p.interval, p.source)
     summary = backtest_rsi(df, p)
 
     # skriv trevliga rader (Streamlit visar stdout i en kodruta)
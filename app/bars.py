@@ -0,0 +1,218 @@
+"""
+Barer som sammanhängande NumPy-arrayer – en .npy-fil per kolumn.
+
+Layout (en katalog per ticker/intervall):
+    ts.npy      int64, ns sedan epoch (UTC)
+    open.npy / high.npy / low.npy / close.npy / volume.npy
+    meta.json   {"tz": "...", "n": ..., "scale": ...}
+
+Kompakt läge (Bars.compact): priser som float32 eller skalade int32-ticks
+(pris = tick * scale) och volym som uint32 – halva minnet mot float64.
+Omvandling till float64 sker först vid kärnans gräns (f64/to_frame).
+
+open_bars() mappar filerna med mmap_mode="r": inget parsas och inget kopieras,
+så N arbetsprocesser som öppnar samma historik delar samma sidor i OS-cachen.
+
+Export och byte av katalog sker under ett exklusivt fcntl-lås på
+"<katalog>.lock" (locked()) och med unika tmp-namn, så att flera processer
+som exporterar samtidigt inte krockar. Läsare som tar det delade låset ser
+aldrig katalogen mitt i ett byte.
+"""
+import json
+import os
+import shutil
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows – bara unika tmp-namn, inget lås
+    fcntl = None
+
+FIELDS = ("open", "high", "low", "close", "volume")
+PRICES = ("open", "high", "low", "close")
+_INT_NAN = np.iinfo(np.int32).min  # NaN-markör för int32-priser
+_COLS = {"open": "Open", "high": "High", "low": "Low", "close": "Close", "volume": "Volume"}
+
+
+class Bars:
+    __slots__ = ("ts", "open", "high", "low", "close", "volume", "tz", "scale")
+
+    def __init__(self, ts, open, high, low, close, volume, tz=None, scale=None):
+        self.ts = ts
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.tz = tz
+        self.scale = scale  # tickstorlek om priserna är int32, annars None
+
+    def __len__(self):
+        return len(self.ts)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "Bars":
+        idx = pd.DatetimeIndex(df.index)
+        tz = str(idx.tz) if idx.tz is not None else None
+        ts = (idx.tz_convert("UTC") if tz else idx).as_unit("ns").asi8.astype(np.int64)
+        cols = {}
+        for f in FIELDS:
+            c = _COLS[f]
+            cols[f] = (np.ascontiguousarray(df[c].to_numpy(dtype=np.float64))
+                       if c in df.columns else np.full(len(df), np.nan))
+        return cls(np.ascontiguousarray(ts), tz=tz, **cols)
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(np.asarray(getattr(self, f)).nbytes for f in ("ts",) + FIELDS))
+
+    def f64(self, field: str) -> np.ndarray:
+        """Kolumnen som float64 – används vid gränsen mot indikator-/backtestkärnor."""
+        a = np.asarray(getattr(self, field))
+        if self.scale is not None and field in PRICES:
+            out = a.astype(np.float64) * self.scale
+            out[a == _INT_NAN] = np.nan
+            return out
+        return a if a.dtype == np.float64 else a.astype(np.float64)
+
+    def compact(self, price_dtype: str = "float32", tick: float = None) -> "Bars":
+        """
+        Kompakt kopia: float32- eller int32-priser (skalade med tick) och uint32-volym.
+        tick=None för int32 väljer 1e-4 eller grövre så att högsta priset ryms.
+        """
+        vol = np.nan_to_num(np.asarray(self.volume, dtype=np.float64), nan=0.0)
+        vol = np.clip(vol, 0, np.iinfo(np.uint32).max).astype(np.uint32)
+        prices = {f: self.f64(f) for f in PRICES}
+        if price_dtype == "float32":
+            cols = {f: prices[f].astype(np.float32) for f in PRICES}
+            scale = None
+        elif price_dtype == "int32":
+            top = max((np.nanmax(np.abs(p)) for p in prices.values() if len(p) and not np.isnan(p).all()),
+                      default=0.0)
+            scale = tick or 1e-4
+            while top / scale >= np.iinfo(np.int32).max:
+                scale *= 10
+            cols = {}
+            for f, p in prices.items():
+                q = np.round(p / scale)
+                q[np.isnan(q)] = _INT_NAN
+                cols[f] = q.astype(np.int32)
+        else:
+            raise ValueError(f"Okänd pristyp: {price_dtype}")
+        return Bars(np.asarray(self.ts, dtype=np.int64), volume=vol, tz=self.tz, scale=scale, **cols)
+
+    def index(self) -> pd.DatetimeIndex:
+        idx = pd.DatetimeIndex(np.asarray(self.ts).view("datetime64[ns]"))
+        return idx.tz_localize("UTC").tz_convert(self.tz) if self.tz else idx
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({_COLS[f]: self.f64(f) for f in FIELDS}, index=self.index())
+
+    def slice(self, i: int, j: int = None) -> "Bars":
+        """Vy över [i, j) – inga kopior, även för mmap-arrayer."""
+        s = slice(i, j)
+        return Bars(self.ts[s], *(getattr(self, f)[s] for f in FIELDS), tz=self.tz, scale=self.scale)
+
+    def since(self, start) -> "Bars":
+        ts = pd.Timestamp(start)
+        if self.tz:
+            ts = ts.tz_localize(self.tz) if ts.tzinfo is None else ts
+            ts = ts.tz_convert("UTC").tz_localize(None)
+        elif ts.tzinfo is not None:
+            ts = ts.tz_localize(None)
+        return self.slice(int(np.searchsorted(self.ts, ts.value, side="left")))
+
+
+@contextmanager
+def locked(path, exclusive: bool = True):
+    """fcntl-lås på "<path>.lock": exklusivt för export, delat för läsning."""
+    path = Path(path)
+    if fcntl is None:
+        yield
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(path.name + ".lock"), "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def save_bars(bars, path, lock: bool = True) -> Path:
+    """
+    Skriver Bars (eller en OHLCV-DataFrame) som .npy-filer. Byter katalog
+    atomiskt under locked(path); lock=False om anroparen redan håller låset.
+    """
+    if isinstance(bars, pd.DataFrame):
+        bars = Bars.from_frame(bars)
+    path = Path(path)
+    if lock:
+        with locked(path):
+            return save_bars(bars, path, lock=False)
+    tmp, tag = _tmp_dir(path)
+    np.save(tmp / "ts.npy", np.ascontiguousarray(bars.ts, dtype=np.int64))
+    for f in FIELDS:
+        np.save(tmp / f"{f}.npy", np.ascontiguousarray(getattr(bars, f)))
+    return _swap(tmp, path, tag, bars.tz, len(bars), bars.scale)
+
+
+def extend_bars(path, keep: int, new, chunk: int = 1 << 20, lock: bool = True) -> Path:
+    """
+    Ny export = de keep första barerna i path följda av new (Bars eller
+    DataFrame). Den gamla delen kopieras bit om chunk barer mellan mmap-filer,
+    så minnet beror på chunk och svansen – inte på historikens längd.
+    Byts atomiskt som save_bars.
+    """
+    if isinstance(new, pd.DataFrame):
+        new = Bars.from_frame(new)
+    path = Path(path)
+    if lock:
+        with locked(path):
+            return extend_bars(path, keep, new, chunk, lock=False)
+    old = open_bars(path)
+    if old.scale is not None:
+        raise ValueError("extend_bars kräver float-priser (ingen int32-export)")
+    keep, n = int(keep), int(keep) + len(new)
+    tmp, tag = _tmp_dir(path)
+    for f in ("ts",) + FIELDS:
+        src = getattr(old, f)
+        dst = np.lib.format.open_memmap(tmp / f"{f}.npy", mode="w+", dtype=src.dtype, shape=(n,))
+        for a in range(0, keep, chunk):
+            dst[a:min(a + chunk, keep)] = src[a:min(a + chunk, keep)]
+        dst[keep:] = np.asarray(getattr(new, f), dtype=src.dtype)
+        dst.flush()
+        del dst
+    return _swap(tmp, path, tag, old.tz, n, None)
+
+
+def _tmp_dir(path: Path):
+    tag = f"{os.getpid()}.{uuid.uuid4().hex[:8]}"
+    tmp = path.with_name(f"{path.name}.{tag}.tmp")
+    tmp.mkdir(parents=True)
+    return tmp, tag
+
+
+def _swap(tmp: Path, path: Path, tag: str, tz, n: int, scale) -> Path:
+    """meta.json sist i tmp, sedan byte av katalog (anroparen håller låset)."""
+    (tmp / "meta.json").write_text(json.dumps({"tz": tz, "n": n, "scale": scale}), encoding="utf-8")
+    old = path.with_name(f"{path.name}.{tag}.old")
+    if path.exists():
+        os.replace(path, old)
+    os.replace(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+    return path
+
+
+def open_bars(path, mmap: bool = True) -> Bars:
+    path = Path(path)
+    mode = "r" if mmap else None
+    meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+    ts = np.load(path / "ts.npy", mmap_mode=mode)
+    cols = {f: np.load(path / f"{f}.npy", mmap_mode=mode) for f in FIELDS}
+    return Bars(ts, tz=meta.get("tz"), scale=meta.get("scale"), **cols)
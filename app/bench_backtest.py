@@ -0,0 +1,568 @@
+"""
+Jämför de vektoriserade backtestmotorerna mot de gamla looparna på
+syntetisk data och avslutar med fel vid minsta skillnad:
+
+  - run_backtest (app/strategy.py) mot iterrows-loopen: trades/returns/equity
+  - backtest_rsi (app/backtest.py) mot .loc-loopen: hela summary-dicten
+  - grid_backtest (app/grid.py) mot en run_backtest per kombination
+    (summor kan skilja i sista decimalen, därför rtol 1e-12)
+  - metrics.table (app/metrics.py) för alla körningar mot strategy.stats en i taget
+  - exits.run_exits (_exit_loop, båda backends) mot loop_exits, en
+    vanlig per-bar-loop: alla kombinationer av fast/trailing/ATR-stopp, TP,
+    tidsstopp och fyllnadsregler – med barer där stopp och TP nås samma bar
+    (stoppet går först) – plus samma serie körd i bitar med state/offset
+  - chunked.run_chunked (mmap-barer, CSV:er bit för bit) mot
+    run_backtest(build_signals(...)) för flera bitstorlekar, med och utan
+    stopp/TP/trail/tid: affärsrader, equity och nyckeltal bitexakt
+  - portfolio (app/portfolio.py) på en ojämn panel: signalerna för sent
+    noterade tickers mot alert_batch.latest_signal på tickerns egen serie,
+    säljordrar som saknar öppning fylls på nästa bar med data och innehav
+    vars data tar slut stängs på sista stängningen
+  - kompakta barer (float32 / int32-ticks, app/bars.py) mot float64: RSI inom
+    COMPACT_RSI_TOL punkter, samma antal affärer och nyckeltal inom
+    COMPACT_ATOL (i fältets enhet, oftast %-enheter) + COMPACT_RTOL relativt
+
+    python -m app.bench_backtest --bars 100000 --runs 20
+"""
+import argparse
+import math
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.backtest import Params, backtest_rsi, rsi_series
+from app import accel, exits
+from app.bars import Bars, open_bars, save_bars
+from app.chunked import run_chunked
+from app.alert_batch import latest_signal
+from app.portfolio import backtest_portfolio, signals
+from app.data import build_signals, compact_frame
+from app.grid import combos, grid_backtest
+from app.optimize import leaderboard
+from app import metrics
+from app.strategy import run_backtest, stats
+
+
+COMPACT_RSI_TOL = 5e-3   # RSI-punkter (int32-ticks om 1e-4 ger ~1e-3)
+COMPACT_ATOL = 1e-3      # nyckeltal, fältets enhet
+COMPACT_RTOL = 1e-5
+
+
+# ---- gammal loop (referens) ----
+
+def loop_backtest(df, fee_pct=0.0, slippage_bps=0):
+    pos = 0
+    entry_px = None
+    rets = []
+    trades = []
+    for i, row in df.iterrows():
+        px = float(row["Close"])
+        if pos == 0 and row["BUY"]:
+            pos = 1
+            entry_px = px * (1 + slippage_bps/10000)
+            trades.append({"Type": "BUY", "Date": i, "Price": entry_px})
+        elif pos == 1 and row["SELL"]:
+            exit_px = px * (1 - slippage_bps/10000)
+            ret = (exit_px / entry_px - 1) - (fee_pct/100)*2
+            rets.append(ret)
+            trades.append({"Type": "SELL", "Date": i, "Price": exit_px, "PnL": ret})
+            pos = 0
+            entry_px = None
+    equity = np.cumprod([1] + [1+r for r in rets])
+    return {"trades": pd.DataFrame(trades), "returns": rets, "equity": equity}
+
+
+def loop_backtest_rsi(df, p):
+    if df.empty or "Close" not in df.columns:
+        raise ValueError("Tom data – kunde inte hämta priser.")
+    close = df["Close"].astype("float64")  # kompakta (float32) ramar räknas i float64
+    rsi = rsi_series(close, 14)
+    # (oförändrad loop bar för bar)
+
+    slip = p.slip_bps / 10_000.0
+    fee = p.fee
+    sl_mult = 1.0 - (p.sl / 100.0)
+
+    equity = 1.0
+    eq_curve = [equity]
+    in_pos = False
+    entry_price = np.nan
+
+    trades = []
+    wins = 0
+
+    dates = close.index
+    for i in range(1, len(dates)):
+        today = dates[i]
+        prev = dates[i - 1]
+        price = float(close.loc[today])
+        price_prev = float(close.loc[prev])
+        r = float(rsi.loc[today])
+
+        # mark-to-market om vi är i position
+        if in_pos:
+            # dagsavkastning i priset
+            growth = price / price_prev if price_prev > 0 else 1.0
+            equity *= growth
+
+        # sälj villkor
+        sell_now = False
+        if in_pos:
+            stop_price = entry_price * sl_mult if p.use_sl else -math.inf
+            if (p.use_sl and price <= stop_price) or (r >= p.rsi_sell):
+                sell_now = True
+
+        # köp villkor
+        buy_now = False
+        if not in_pos and (r <= p.rsi_buy):
+            buy_now = True
+
+        # genomför affärer (kostnader appliceras som multiplikatorer)
+        if sell_now:
+            # slippage + courtage vid exit
+            equity *= (1.0 - slip) * (1.0 - fee)
+            # trade-resultat
+            trade_ret = price / entry_price * (1.0 - slip) * (1.0 - fee)  # inkl kostnader
+            wins += 1 if trade_ret > 1.0 else 0
+            trades.append(trade_ret)
+            in_pos = False
+            entry_price = np.nan
+
+        if buy_now:
+            # slippage + courtage vid entry
+            equity *= (1.0 - slip) * (1.0 - fee)
+            entry_price = price
+            in_pos = True
+
+        eq_curve.append(equity)
+
+    eq = pd.Series(eq_curve, index=dates)
+    max_equity = eq.cummax()
+    dd = (eq / max_equity - 1.0)
+    max_dd = dd.min() if len(dd) else 0.0
+
+    start_dt = dates[0].to_pydatetime()
+    end_dt = dates[-1].to_pydatetime()
+    years = max((end_dt - start_dt).days / 365.25, 1e-9)
+    total_ret = eq.iloc[-1] - 1.0
+    cagr = (eq.iloc[-1]) ** (1 / years) - 1.0 if eq.iloc[-1] > 0 else -1.0
+
+    summary = {
+        "ticker": p.ticker,
+        "from": start_dt.date().isoformat(),
+        "to": end_dt.date().isoformat(),
+        "bars": int(len(df)),
+        "trades": int(len(trades)),
+        "win_rate": (wins / len(trades)) if trades else 0.0,
+        "total_return_pct": total_ret * 100.0,
+        "cagr_pct": cagr * 100.0,
+        "max_drawdown_pct": max_dd * 100.0,
+        "final_equity": float(eq.iloc[-1]),
+    }
+    return summary
+
+
+def loop_exits(o, h, l, c, atr, buy, sell, r):
+    """Exitreglerna som en rak loop över barerna, utan tillståndsarray."""
+    trades, pos, pend_exit, pend_entry = [], None, 0, False
+    qty_at = lambda px: r.base_capital // px if r.base_capital > 0 else 1.0
+    for i in range(len(c)):
+        if pos and pend_exit:
+            trades.append((pos["i"], i, pos["px"], o[i], pos["qty"], pend_exit))
+            pos, pend_exit = None, 0
+        if pend_entry and pos is None and qty_at(o[i]) > 0:
+            pos = {"i": i, "px": o[i], "qty": qty_at(o[i]), "high": o[i]}
+        pend_entry = False
+
+        hit = None
+        if pos:
+            pos["high"] = max(pos["high"], h[i])
+            stops = []
+            if r.fixed_pct > 0:
+                stops.append(pos["px"] * (1 - r.fixed_pct / 100.0))
+            if r.trail_pct > 0:
+                stops.append(pos["high"] * (1 - r.trail_pct / 100.0))
+            if r.atr_mult > 0:
+                stops.append(pos["high"] - (0.0 if math.isnan(atr[i]) else atr[i]) * r.atr_mult)
+            levels = []
+            if stops:
+                levels.append((max(stops), exits.STOP))
+            if r.tp_pct > 0:
+                levels.append((pos["px"] * (1 + r.tp_pct / 100.0), exits.TP))
+            # stoppet före TP: når baren båda gäller stoppet
+            for lvl, why in levels:
+                reached = l[i] <= lvl if why == exits.STOP else h[i] >= lvl
+                at_close = c[i] <= lvl if why == exits.STOP else c[i] >= lvl
+                if r.stop_fill == "intrabar" and reached:
+                    hit = (lvl, why)
+                elif r.stop_fill == "close" and at_close:
+                    hit = (c[i], why)
+                elif r.stop_fill == "next_open" and reached:
+                    pend_exit = pend_exit or why
+                if hit:
+                    break
+            for why, fired in ((exits.TIME, r.time_stop > 0 and i - pos["i"] >= r.time_stop),
+                               (exits.SIGNAL, bool(sell[i]))):
+                if hit or not fired:
+                    continue
+                if r.exit_fill == "close":
+                    hit = (c[i], why)
+                else:
+                    pend_exit = pend_exit or why
+            if hit:
+                trades.append((pos["i"], i, pos["px"], hit[0], pos["qty"], hit[1]))
+                pos, pend_exit = None, 0
+
+        if pos is None and not hit and buy[i]:
+            if r.entry_fill == "close":
+                if qty_at(c[i]) > 0:
+                    pos = {"i": i, "px": c[i], "qty": qty_at(c[i]), "high": c[i]}
+            else:
+                pend_entry = True
+    if pos:
+        trades.append((pos["i"], -1, pos["px"], np.nan, pos["qty"], exits.OPEN))
+    return trades
+
+
+def synthetic(bars, p_buy, p_sell, seed):
+    rng = np.random.default_rng(seed)
+    c = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+    idx = pd.bdate_range("2000-01-03", periods=bars, name="Date")
+    return pd.DataFrame({"Close": c, "BUY": rng.random(bars) < p_buy, "SELL": rng.random(bars) < p_sell}, index=idx)
+
+
+def same(a, b) -> bool:
+    if a["returns"] != b["returns"] or not np.array_equal(a["equity"], b["equity"]):
+        return False
+    ta, tb = a["trades"], b["trades"]
+    if ta.empty or tb.empty:
+        return ta.empty and tb.empty and list(ta.columns) == list(tb.columns)
+    try:
+        pd.testing.assert_frame_equal(ta, tb, check_dtype=False)
+    except AssertionError:
+        return False
+    return True
+
+
+def check_rsi(runs, bars):
+    bad = 0
+    for k in range(runs):
+        rng = np.random.default_rng(100 + k)
+        n = int(rng.integers(2, 400)) if k % 4 == 0 else bars // 10
+        c = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+        idx = pd.date_range("2005-01-03", periods=n, freq="h" if k % 3 == 0 else "B")
+        df = pd.DataFrame({"Close": c}, index=idx)
+        rb = int(rng.integers(30, 55))
+        p = Params(rsi_buy=rb, rsi_sell=rb + int(rng.integers(-5, 25)), use_sl=bool(k % 2),
+                   sl=float(rng.choice([1.0, 2.0, 5.0])), fee=float(rng.choice([0.0, 0.001])),
+                   slip_bps=int(rng.choice([0, 10])))
+        if backtest_rsi(df, p) != loop_backtest_rsi(df, p):
+            bad += 1
+            print(f"avvikelse backtest_rsi: dataset {k} ({n} barer)")
+
+    c = 100 * np.exp(np.cumsum(np.random.default_rng(7).normal(0, 0.01, bars)))
+    df = pd.DataFrame({"Close": c}, index=pd.date_range("2000-01-03", periods=bars, freq="h"))
+    p = Params(use_sl=True, sl=2.0, fee=0.0005, slip_bps=5)
+    t0 = time.perf_counter(); ref = loop_backtest_rsi(df, p); t_loop = time.perf_counter() - t0
+    t0 = time.perf_counter(); new = backtest_rsi(df, p); t_vec = time.perf_counter() - t0
+    bad += new != ref
+    print(f"backtest_rsi {bars} barer, {ref['trades']} affärer: loop {t_loop*1e3:.1f} ms, "
+          f"arrayer {t_vec*1e3:.2f} ms ({t_loop/t_vec:.0f}x)")
+    return bad
+
+
+def check_grid(bars):
+    rng = np.random.default_rng(5)
+    c = 50 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, bars)))
+    o = c * (1 + rng.normal(0, 0.01, bars))
+    df = pd.DataFrame({"Open": o, "High": np.maximum(o, c) * 1.01, "Low": np.minimum(o, c) * 0.99, "Close": c},
+                      index=pd.bdate_range("2010-01-01", periods=bars))
+    kw = dict(rsi_buy_range=range(30, 56, 5), rsi_sell_range=range(50, 71, 5), sl_list=[0, 2, 4],
+              tp_list=[0, 5], trail_list=[0, 6], tstop_list=[0, 10], fee_pct=0.05, slippage_bps=5,
+              min_trades=0, max_dd_pct=1000, min_pf=0, rsi_len_list=[10, 14])
+    t0 = time.perf_counter(); ref = leaderboard(df, engine="loop", **kw); t_loop = time.perf_counter() - t0
+    t0 = time.perf_counter(); new = leaderboard(df, engine="grid", **kw); t_grid = time.perf_counter() - t0
+    # grid_backtest direkt på combos(), med egen RSI-bank i stället för optimize:s
+    g = combos(kw["rsi_buy_range"], kw["rsi_sell_range"], kw["sl_list"], kw["tp_list"], kw["trail_list"],
+               kw["tstop_list"], kw["rsi_len_list"])
+    raw = grid_backtest(df, g, fee_pct=kw["fee_pct"], slippage_bps=kw["slippage_bps"])
+    key = ["rsi_len", "rsi_buy", "rsi_sell", "sl_fast_pct", "tp_pct", "trail_pct", "tstop_bars"]
+    bad = 0
+    for name, other in (("grid", new), ("grid_backtest", raw)):
+        try:
+            pd.testing.assert_frame_equal(ref.sort_values(key).reset_index(drop=True),
+                                          other.sort_values(key).reset_index(drop=True),
+                                          check_dtype=False, rtol=1e-12)
+        except AssertionError as e:
+            print(f"avvikelse {name}: {e}")
+            bad += 1
+    print(f"grid {bars} barer, {len(ref)} kombinationer: loop {t_loop*1e3:.0f} ms, "
+          f"grid {t_grid*1e3:.0f} ms ({t_loop/t_grid:.0f}x)")
+    return bad
+
+
+def check_metrics(runs: int = 5000):
+    """metrics.table för alla körningar i ett anrop mot strategy.stats en i taget."""
+    rng = np.random.default_rng(7)
+    idx = pd.bdate_range("2010-01-01", periods=2500)
+    rets = [rng.normal(0.002, 0.03, int(rng.integers(0, 300))) for _ in range(runs)]
+    t0 = time.perf_counter()
+    ref = pd.DataFrame([stats(r, np.cumprod(np.concatenate([[1.0], 1.0 + r])), idx) for r in rets])
+    t_loop = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    offsets, values = metrics.ragged(rets)
+    new = metrics.table(offsets, values, metrics.years_between(idx))
+    t_vec = time.perf_counter() - t0
+    a, b = ref.to_numpy(dtype=float), new.to_numpy(dtype=float)
+    bad = int(not np.array_equal(a, b, equal_nan=True))
+    if bad:
+        print("avvikelse: metrics.table mot strategy.stats")
+    print(f"metrics {runs} körningar, {len(values)} affärer: en i taget {t_loop*1e3:.0f} ms, "
+          f"ett anrop {t_vec*1e3:.0f} ms ({t_loop/t_vec:.0f}x)")
+    return bad
+
+
+def _exit_rows(res) -> list:
+    return list(zip(res["entry_i"].tolist(), res["exit_i"].tolist(), res["entry_px"].tolist(),
+                    res["exit_px"].tolist(), res["qty"].tolist(), res["reason"].tolist()))
+
+
+def _same_rows(a, b) -> bool:
+    return len(a) == len(b) and all(
+        all(x == y or (isinstance(x, float) and math.isnan(x) and math.isnan(y)) for x, y in zip(ra, rb))
+        for ra, rb in zip(a, b))
+
+
+def check_exits(bars: int = 600):
+    """run_exits mot loop_exits för varje regelkombination och backend, även i bitar."""
+    rng = np.random.default_rng(13)
+    c = 50 * np.exp(np.cumsum(rng.normal(0, 0.02, bars)))
+    o = np.concatenate([[c[0]], c[:-1]]) * (1 + rng.normal(0, 0.01, bars))
+    # breda barer: stopp och TP nås ofta samma bar
+    h = np.maximum(o, c) * (1 + np.abs(rng.normal(0, 0.03, bars)))
+    l = np.minimum(o, c) * (1 - np.abs(rng.normal(0, 0.03, bars)))
+    atr = pd.Series(h - l).rolling(14).mean().to_numpy()
+    buy, sell = rng.random(bars) < 0.08, rng.random(bars) < 0.04
+
+    cases = []
+    for fixed, trail, mult, tp, tstop, cap in np.ndindex(2, 2, 2, 2, 2, 2):
+        for ef, xf, sf in np.ndindex(2, 2, 3):
+            cases.append(exits.ExitRules(
+                fixed_pct=5.0 * fixed, trail_pct=4.0 * trail, atr_mult=2.5 * mult, tp_pct=6.0 * tp,
+                time_stop=15 * tstop, base_capital=10_000.0 * cap, entry_fill=("close", "next_open")[ef],
+                exit_fill=("close", "next_open")[xf], stop_fill=("intrabar", "close", "next_open")[sf]))
+
+    both = 0  # barer där både stopp och TP nåddes i en position
+    bad = 0
+    names = ["numpy"] + (["numba"] if accel.numba is not None else [])
+    t0 = time.perf_counter()
+    for rules in cases:
+        ref = loop_exits(o, h, l, c, atr, buy, sell, rules)
+        if rules.stop_fill == "intrabar" and rules.fixed_pct and rules.tp_pct and not (rules.trail_pct or rules.atr_mult):
+            both += sum(1 for e, x, epx, _, _, why in ref
+                        if why == exits.STOP and x >= 0 and h[x] >= epx * (1 + rules.tp_pct / 100.0))
+        for name in names:
+            accel.set_backend(name)
+            whole = _exit_rows(exits.run_exits(o, h, l, c, atr, buy, sell, rules))
+            state, parts = None, []
+            for a in range(0, bars, 97):
+                res = exits.run_exits(o[a:a + 97], h[a:a + 97], l[a:a + 97], c[a:a + 97], atr[a:a + 97],
+                                      buy[a:a + 97], sell[a:a + 97], rules, state=state, offset=a,
+                                      include_open=a + 97 >= bars)
+                state = res["state"]
+                parts += _exit_rows(res)
+            for label, got in (("ett svep", whole), ("i bitar", parts)):
+                if not _same_rows(got, ref):
+                    bad += 1
+                    if bad <= 3:
+                        print(f"avvikelse exits {name} {label}: {rules}")
+    accel.set_backend("auto")
+    if not both:
+        bad += 1
+        print("exits: ingen bar med både stopp och TP – datan täcker inte prioriteten")
+    print(f"exits {len(cases)} regelkombinationer × {'/'.join(names)}: {both} barer med stopp och TP samma bar, "
+          f"{time.perf_counter() - t0:.1f} s")
+    return bad
+
+
+def check_chunked(bars: int = 3000):
+    """run_chunked mot minnesmotorn: bitstorlek 1, udda storlekar och hela serien i en bit."""
+    rng = np.random.default_rng(17)
+    c = 60 * np.exp(np.cumsum(rng.normal(0, 0.015, bars)))
+    o = np.concatenate([[c[0]], c[:-1]]) * (1 + rng.normal(0, 0.005, bars))
+    df = pd.DataFrame({"Open": o, "High": np.maximum(o, c) * (1 + np.abs(rng.normal(0, 0.01, bars))),
+                       "Low": np.minimum(o, c) * (1 - np.abs(rng.normal(0, 0.01, bars))), "Close": c,
+                       "Volume": rng.integers(1_000, 10**6, bars).astype(float)},
+                      index=pd.date_range("2019-01-02 09:00", periods=bars, freq="h", tz="Europe/Stockholm"))
+    rule_sets = [dict(), dict(stop_pct=3.0), dict(tp_pct=4.0, trail_pct=2.5),
+                 dict(stop_pct=2.0, tp_pct=5.0, trail_pct=3.0, time_stop=12)]
+    chunks = [1, 7, 97, 1000, bars]
+    bad, crossing, still_open = 0, 0, 0
+    with tempfile.TemporaryDirectory() as root:
+        save_bars(df, Path(root) / "bars")
+        mm = open_bars(Path(root) / "bars")
+        for rules in rule_sets:
+            ref = run_backtest(build_signals(df, 45, 55), 0.05, 5, **rules)
+            rows = ref["trades"].assign(Date=lambda t: t["Date"].astype(str))
+            if "Reason" in rows:
+                rows["Reason"] = rows["Reason"].replace("", np.nan)
+            sells = rows["Type"] == "SELL"
+            ref_eq = pd.DataFrame({"Date": [str(df.index[0])] + rows.loc[sells, "Date"].tolist(),
+                                   "Equity": ref["equity"]})
+            pos = df.index.get_indexer(ref["trades"]["Date"])
+            still_open += len(rows) % 2
+            for chunk in chunks:
+                out = Path(root) / f"out_{chunk}"
+                st = run_chunked(mm, out, 45, 55, 14, 0.05, 5, chunk=chunk, **rules)
+                got = pd.read_csv(out / "trades.csv", float_precision="round_trip")
+                eq = pd.read_csv(out / "equity.csv", float_precision="round_trip")
+                errs = []
+                if not got.equals(rows.reset_index(drop=True)):
+                    errs.append("affärsrader")
+                if not eq.equals(ref_eq):
+                    errs.append("equity")
+                if st != ref["stats"]:
+                    errs.append("nyckeltal")
+                if errs:
+                    bad += 1
+                    print(f"avvikelse chunked {rules or 'utan exits'} bit {chunk}: {', '.join(errs)}")
+                if chunk == 97:
+                    crossing += int(np.sum(pos[0::2][:len(pos[1::2])] // chunk != pos[1::2] // chunk))
+    if not crossing or not still_open:
+        bad += 1
+        print(f"chunked: datan saknar positioner över bitgräns ({crossing}) eller öppen sista position ({still_open})")
+    print(f"chunked {bars} barer × {len(rule_sets)} regeluppsättningar × bitar {chunks}: "
+          f"{crossing} positioner över bitgräns (bit 97)")
+    return bad
+
+
+def check_portfolio(bars: int = 400, tickers: int = 8):
+    """Ojämn panel: sena noteringar, hål i Open och tickers vars data tar slut."""
+    rng = np.random.default_rng(19)
+    c = 50 * np.exp(np.cumsum(rng.normal(0, 0.02, (bars, tickers)), axis=0))
+    o = c * (1 + rng.normal(0, 0.005, (bars, tickers)))
+    first = rng.integers(0, bars // 3, tickers)
+    first[0] = 0
+    last = np.where(np.arange(tickers) % 3 == 1, rng.integers(bars // 2, bars - 10, tickers), bars - 1)
+    for j in range(tickers):
+        c[:first[j], j] = o[:first[j], j] = np.nan
+        c[last[j] + 1:, j] = o[last[j] + 1:, j] = np.nan
+    holes = rng.random((bars, tickers)) < 0.05
+    holes[last, np.arange(tickers)] = False
+    o[holes] = np.nan  # ingen handel på öppningen, stängningen finns
+    index = pd.bdate_range("2015-01-02", periods=bars)
+    panel = {"index": index, "symbols": [f"T{j}" for j in range(tickers)], "Open": o, "Close": c}
+    bad = 0
+
+    buy, sell, _ = signals(c)
+    diff = 0
+    for j in range(tickers):
+        own = pd.Series(c[first[j]:last[j] + 1, j], index=index[first[j]:last[j] + 1])
+        for t in range(first[j] + 1, last[j] + 1):
+            sig = latest_signal(own.iloc[:t - first[j] + 1])
+            diff += (sig["BUY"], sig["SELL"]) != (bool(buy[t, j]), bool(sell[t, j]))
+    if diff:
+        bad += 1
+        print(f"avvikelse portfolio.signals mot latest_signal: {diff} barer")
+
+    res = backtest_portfolio(panel, max_positions=3)
+    tr = res["trades"]
+    t_in, t_out = index.get_indexer(tr["entry_date"]), index.get_indexer(tr["exit_date"])
+    can_trade = ~np.isnan(o) & ~np.isnan(c)
+    late = 0
+    for sym, a, b_ in zip(tr["symbol"], t_in, t_out):
+        j = int(sym[1:])
+        s_ = next((t for t in range(a, last[j]) if sell[t, j]), None)
+        fills = [u for u in range(s_ + 1, last[j] + 1) if can_trade[u, j]] if s_ is not None else []
+        late += b_ != (fills[0] if fills else last[j])
+    if late:
+        bad += 1
+        print(f"avvikelse portfolio: {late} av {len(tr)} affärer stängdes inte vid första möjliga bar")
+    # innehav vars data tagit slut ska ha stängts på sista baren, inte ligga kvar
+    stale = [sym for sym in res["holdings"]["symbol"] if last[int(sym[1:])] < bars - 1]
+    forced = sum(1 for sym, b_ in zip(tr["symbol"], t_out) if b_ == last[int(sym[1:])] < bars - 1)
+    if stale or not forced:
+        bad += 1
+        print(f"avvikelse portfolio: innehav kvar efter datans slut {stale}, {forced} stängda på sista baren")
+    delayed = int(sum(holes[u, int(sym[1:])] for sym, u in zip(tr["symbol"], t_out - 1) if u >= 0))
+    print(f"portfolio {tickers} tickers × {bars} barer: {len(tr)} affärer, {delayed} exit efter saknad öppning, "
+          f"{forced} stängda när datan tog slut")
+    return bad
+
+
+def check_compact(bars: int = 5000):
+    """Backtest på kompakta barer (float32 och int32-ticks) mot float64-vägen, med tolerans."""
+    rng = np.random.default_rng(11)
+    c = 80 * np.exp(np.cumsum(rng.normal(0.0002, 0.015, bars)))
+    o = c * (1 + rng.normal(0, 0.004, bars))
+    df = pd.DataFrame({"Open": o, "High": np.maximum(o, c) * 1.006, "Low": np.minimum(o, c) * 0.994,
+                       "Close": c, "Volume": rng.integers(1_000, 10**6, bars).astype(float)},
+                      index=pd.bdate_range("2005-01-03", periods=bars, name="Date"))
+    variants = {"float32": compact_frame(df), "int32": Bars.from_frame(df).compact("int32").to_frame()}
+    p = Params(rsi_buy=40, rsi_sell=60, use_sl=True, sl=3.0, fee=0.0005, slip_bps=5)
+    ref_rsi = rsi_series(df["Close"], 14).to_numpy()
+    ref_bt = backtest_rsi(df, p)
+    ref_run = run_backtest(build_signals(df, 40, 60), 0.05, 5, stop_pct=4.0, tp_pct=8.0, trail_pct=5.0)["stats"]
+    bad = 0
+    for name, cdf in variants.items():
+        dev = _dev(ref_rsi, rsi_series(cdf["Close"], 14).to_numpy())
+        bt = backtest_rsi(cdf, p)
+        run = run_backtest(build_signals(cdf, 40, 60), 0.05, 5, stop_pct=4.0, tp_pct=8.0, trail_pct=5.0)["stats"]
+        errs = [f"RSI {dev:.1e}"] if dev > COMPACT_RSI_TOL else []
+        for label, ref, new in (("backtest_rsi", ref_bt, bt), ("run_backtest", ref_run, run)):
+            if ref["trades"] != new["trades"]:
+                errs.append(f"{label} trades {ref['trades']} != {new['trades']}")
+            for k, v in ref.items():
+                if isinstance(v, float) and not np.isclose(new[k], v, rtol=COMPACT_RTOL, atol=COMPACT_ATOL, equal_nan=True):
+                    errs.append(f"{label} {k} {v} != {new[k]}")
+        if errs:
+            bad += 1
+            print(f"avvikelse kompakt {name}: {errs[:4]}")
+        print(f"kompakt {name}: RSI max avvik {dev:.1e}, {ref_run['trades']} + {ref_bt['trades']} affärer")
+    return bad
+
+
+def _dev(a, b) -> float:
+    both = ~(np.isnan(a) | np.isnan(b))
+    return float(np.max(np.abs(a[both] - b[both]))) if both.any() else 0.0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="run_backtest: vektoriserad mot iterrows-loop")
+    ap.add_argument("--bars", type=int, default=20_000)
+    ap.add_argument("--runs", type=int, default=20, help="antal slumpade dataset att jämföra")
+    args = ap.parse_args()
+
+    bad = 0
+    for k in range(args.runs):
+        rng = np.random.default_rng(k)
+        bars = int(rng.integers(0, 300)) if k % 4 == 0 else args.bars // 10
+        df = synthetic(bars, rng.uniform(0, 0.2), rng.uniform(0, 0.2), k)
+        fee, slip = float(rng.choice([0.0, 0.05])), int(rng.choice([0, 5]))
+        if not same(run_backtest(df, fee, slip), loop_backtest(df, fee, slip)):
+            bad += 1
+            print(f"avvikelse: dataset {k} ({bars} barer)")
+
+    df = synthetic(args.bars, 0.05, 0.05, 999)
+    t0 = time.perf_counter(); ref = loop_backtest(df, 0.05, 5); t_loop = time.perf_counter() - t0
+    t0 = time.perf_counter(); new = run_backtest(df, 0.05, 5); t_vec = time.perf_counter() - t0
+    bad += not same(new, ref)
+    print(f"run_backtest {args.bars} barer, {len(ref['returns'])} affärer: loop {t_loop*1e3:.1f} ms, "
+          f"vektoriserad {t_vec*1e3:.2f} ms ({t_loop/t_vec:.0f}x)")
+    bad += check_rsi(args.runs, args.bars)
+    bad += check_grid(min(args.bars, 3000))
+    bad += check_metrics()
+    bad += check_exits()
+    bad += check_chunked()
+    bad += check_portfolio()
+    bad += check_compact()
+    if bad:
+        raise SystemExit(f"{bad} dataset skiljer sig")
+    print(f"OK – {2 * (args.runs + 1)} dataset identiska, grid = loop, exits = loop, chunked = minne")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Kontroll av app/fetch_async.py mot en lokal HTTP-server (http.server i en
+tråd, inget nätverk): alla symboler svarar direkt utom de som hänger.
+
+  - anropstakten håller TokenBucket-gränsen (rate/burst)
+  - en hängande symbol ger timeout-fel efter ungefär timeout sekunder
+  - övriga symboler får data och väntar inte in den hängande
+  - lika många hängande symboler som arbetstrådar, först i kön: trådarna
+    blir fria vid deadline och symbolerna bakom rapporteras inte som timeout
+  - anrop inifrån en körande event-loop (som i en notebook) fungerar
+
+Avslutar med fel annars.
+
+    python -m app.bench_fetch --symbols 12 --rate 20 --timeout 0.5
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.fetch_async import YahooAsyncProvider
+
+SLOW = "HANG"
+
+
+def _payload(symbol: str, bars: int = 5) -> dict:
+    t0 = 1_700_000_000
+    px = [100.0 + i for i in range(bars)]
+    return {"chart": {"result": [{
+        "meta": {"symbol": symbol, "exchangeTimezoneName": "Europe/Stockholm"},
+        "timestamp": [t0 + 86400 * i for i in range(bars)],
+        "indicators": {"quote": [{"open": px, "high": px, "low": px, "close": px, "volume": [1000] * bars}],
+                       "adjclose": [{"adjclose": px}]},
+    }]}}
+
+
+def _server(hang: float):
+    arrivals = []
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            symbol = self.path.split("?")[0].rsplit("/", 1)[-1]
+            with lock:
+                arrivals.append((time.monotonic(), symbol))
+            body = json.dumps(_payload(symbol)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if symbol.startswith(SLOW):
+                # en byte i taget: läs-timeouten i requests löser aldrig ut,
+                # bara AsyncFetchers egen timeout per anrop
+                end = time.monotonic() + hang
+                for b in body:
+                    if stop.is_set() or time.monotonic() > end:
+                        return
+                    try:
+                        self.wfile.write(bytes([b]))
+                        self.wfile.flush()
+                    except ConnectionError:  # klienten gav upp vid sin deadline
+                        return
+                    time.sleep(0.05)
+                return
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    srv.daemon_threads = True
+    srv.block_on_close = False
+    srv.stop = stop
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, arrivals
+
+
+def _pass(base, tickers, rate, burst, concurrency, timeout, in_loop=False):
+    with YahooAsyncProvider(rate=rate, burst=burst, concurrency=concurrency, timeout=timeout,
+                            base_url=base) as prov:
+        t0 = time.monotonic()
+        if in_loop:
+            async def caller():
+                return prov.fetch_many(tickers, "2023-01-01")
+            out = asyncio.run(caller())
+        else:
+            out = prov.fetch_many(tickers, "2023-01-01")
+        return out, dict(prov.errors), time.monotonic() - t0
+
+
+def _verify(label, tickers, out, errors, took, limit) -> int:
+    bad = 0
+    hung = [t for t in tickers if t.startswith(SLOW)]
+    wrong = [t for t in hung if "timeout" not in errors.get(t, "")]
+    if wrong:
+        bad += 1
+        print(f"{label}: väntade timeout-fel för {wrong}, fick {[errors.get(t) for t in wrong]}")
+    missing = [t for t in tickers if not t.startswith(SLOW) and (out[t].empty or t in errors)]
+    if missing:
+        bad += 1
+        print(f"{label}: utan data trots snabbt svar: {missing} {[errors.get(t) for t in missing][:3]}")
+    if took > limit:
+        bad += 1
+        print(f"{label}: passet tog {took:.2f}s > {limit:.2f}s – hängande symboler blockerade")
+    print(f"{label}: {len(tickers)} symboler på {took:.2f}s, {len(hung)} hängande")
+    return bad
+
+
+def check(symbols: int, rate: float, burst: float, timeout: float, hang: float) -> int:
+    srv, arrivals = _server(hang)
+    base = f"http://127.0.0.1:{srv.server_address[1]}/chart/{{symbol}}"
+    healthy = [f"S{i:02d}" for i in range(symbols - 1)]
+    bad = 0
+    try:
+        # 1) en hängande sist, fyra trådar: takt + timeout
+        tickers = healthy + [SLOW]
+        out, errors, took = _pass(base, tickers, rate, burst, 4, timeout)
+        times = sorted(t for t, _ in arrivals)
+        # k:te anropet får tidigast komma (k + 1 - burst) / rate efter det första
+        slack = 0.02
+        early = [k for k, t in enumerate(times) if t - times[0] < (k + 1 - burst) / rate - slack]
+        if len(times) != len(tickers) or early:
+            bad += 1
+            print(f"takt: {len(times)} anrop av {len(tickers)}, {len(early)} för tidiga (rate {rate}/s, burst {burst})")
+        # allt ska vara klart när takten och en timeout har gått – inte efter hang
+        bad += _verify("takt", tickers, out, errors, took, max(0.0, (len(tickers) - burst) / rate) + timeout + 1.0)
+
+        # 2) två hängande först och två trådar: poolen är full tills deadline
+        tickers = [f"{SLOW}{i}" for i in range(2)] + healthy
+        out, errors, took = _pass(base, tickers, rate, burst, 2, timeout)
+        bad += _verify("full pool", tickers, out, errors, took,
+                       max(0.0, (len(tickers) - burst) / rate) + 2 * timeout + 1.0)
+
+        # 3) inifrån en körande event-loop
+        out, errors, took = _pass(base, healthy[:3], rate, burst, 4, timeout, in_loop=True)
+        bad += _verify("i event-loop", healthy[:3], out, errors, took, 3 / rate + timeout + 1.0)
+    finally:
+        srv.stop.set()  # släpp hängande anslutningar
+        srv.shutdown()
+    return bad
+
+
+def main():
+    ap = argparse.ArgumentParser(description="AsyncFetcher mot lokal server med en hängande symbol")
+    ap.add_argument("--symbols", type=int, default=12)
+    ap.add_argument("--rate", type=float, default=20.0, help="Anrop per sekund")
+    ap.add_argument("--burst", type=float, default=2.0)
+    ap.add_argument("--timeout", type=float, default=0.5, help="Timeout per anrop (s)")
+    ap.add_argument("--hang", type=float, default=5.0, help="Hur länge den hängande symbolen hänger (s)")
+    args = ap.parse_args()
+    bad = check(args.symbols, args.rate, args.burst, args.timeout, args.hang)
+    if bad:
+        raise SystemExit(f"{bad} fel i fetch_async")
+    print(f"OK – takt ≤ {args.rate}/s, hängande symboler gav timeout utan att blockera övriga")
+
+
+if __name__ == "__main__":
+    main()
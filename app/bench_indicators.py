@@ -0,0 +1,223 @@
+"""
+Jämför app/indicators.py mot de gamla pandas-implementationerna (tid + max
+avvikelse) och kör kontrollerna nedan. Avslutar med fel om någon av dem
+avviker – för pandas-jämförelsen mer än PANDAS_RTOL relativt seriens
+största värde, eller med NaN på andra platser.
+
+    python -m app.bench_indicators --bars 200000 --repeat 10
+    python -m app.bench_indicators --backends     # bara numpy mot numba (app/accel.py)
+    python -m app.bench_indicators --stream       # bara alert_batch.latest_signal_stream
+
+Paritetskontrollen för numba-vägen: de rekursiva kärnorna (EMA/Wilder och
+exit-loopen i app/exits.py) körs med båda backends och får skilja sig högst
+rtol relativt. Saknas numba är det ett fel, inte ett godkänt resultat –
+--skip-numba hoppar över kontrollen uttryckligen.
+
+Strömningskontrollen matar barer en i taget genom
+alert_batch.latest_signal_stream – tillståndet går via JSON
+(to_dict/from_dict) mellan stegen, sista baren skrivs om innan den stängs
+och historiken justeras om ibland – och jämför varje steg med latest_signal.
+Den körs både med växande historik och med ett glidande fönster som i
+alert_batch (--period), där fönstrets start flyttas en "dag" i taget.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from app import accel, exits, indicators as ind
+from app.alert_batch import latest_signal, latest_signal_stream
+
+PANDAS_RTOL = 1e-9
+
+
+# ---- gamla pandas-varianter (referens) ----
+
+def pd_rsi_wilder(s, n=14):
+    d = s.diff()
+    au = d.clip(lower=0).ewm(alpha=1/n, adjust=False).mean()
+    ad = (-d).clip(lower=0).ewm(alpha=1/n, adjust=False).mean()
+    return 100 - (100 / (1 + au / ad.replace(0, np.nan)))
+
+
+def pd_rsi_sma(s, n=14):
+    d = s.diff()
+    up = pd.Series(np.where(d > 0, d, 0.0), index=s.index).rolling(n).mean()
+    dn = pd.Series(np.where(d < 0, -d, 0.0), index=s.index).rolling(n).mean()
+    return 100 - (100 / (1 + up / dn))
+
+
+def pd_macd(s, fast=12, slow=26, signal=9):
+    line = s.ewm(span=fast, adjust=False).mean() - s.ewm(span=slow, adjust=False).mean()
+    return line, line.ewm(span=signal, adjust=False).mean()
+
+
+def pd_atr(h, l, c, n=14):
+    pc = c.shift(1)
+    tr = pd.concat([(h - l), (h - pc).abs(), (l - pc).abs()], axis=1).max(axis=1)
+    return tr.rolling(n).mean()
+
+
+def _time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def _dev(a, b):
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    both = ~(np.isnan(a) | np.isnan(b))
+    return float(np.max(np.abs(a[both] - b[both]))) if both.any() else 0.0
+
+
+def _backend_cases(c, h, l):
+    rng = np.random.default_rng(1)
+    a = ind.atr(h, l, c, 14)
+    buy, sell = rng.random(len(c)) < 0.02, rng.random(len(c)) < 0.02
+    rules = exits.ExitRules(8.0, 12.0, 3.0, tp_pct=15.0, time_stop=40, base_capital=10000,
+                            entry_fill="next_open", exit_fill="next_open")
+    stops = lambda: exits.run_exits(c, h, l, c, a, buy, sell, rules)
+    return [
+        ("ema", lambda: ind.ema(c, 12)),
+        ("rsi_wilder", lambda: ind.rsi_wilder(c, 14)),
+        ("macd", lambda: ind.macd(c)[1]),
+        ("rsi_bank", lambda: ind.rsi_bank(c, range(5, 31))),
+        ("exit_loop", lambda: np.concatenate([stops()[k].astype(float) for k in ("entry_i", "exit_i", "exit_px")])),
+    ]
+
+
+def check_backends(c, h, l, repeat, rtol=1e-9) -> int:
+    if accel.numba is None:
+        print("numba är inte installerat – paritetskontrollen kan inte köras (--skip-numba för att hoppa över)")
+        return 1
+    print(f"{'kärna':<12}{'numpy ms':>12}{'numba ms':>12}{'x':>8}{'max rel avvik':>16}")
+    worst = 0.0
+    for name, fn in _backend_cases(c, h, l):
+        accel.set_backend("numpy")
+        t_np, r_np = _time(fn, repeat)
+        accel.set_backend("numba")
+        fn()  # kompilering räknas inte
+        t_nb, r_nb = _time(fn, repeat)
+        scale = np.nanmax(np.abs(r_np)) or 1.0
+        rel = _dev(r_np, r_nb) / scale
+        if (np.isnan(r_np) != np.isnan(r_nb)).any():
+            rel = float("inf")
+        worst = max(worst, rel)
+        print(f"{name:<12}{t_np*1e3:>12.2f}{t_nb*1e3:>12.2f}{t_np/t_nb:>8.2f}{rel:>16.2e}")
+    accel.set_backend("auto")
+    if worst > rtol:
+        print(f"backends skiljer sig: {worst:.2e} > {rtol:.0e}")
+        return 1
+    print(f"backends: numpy = numba inom {rtol:.0e}")
+    return 0
+
+
+def _same_signal(a, b, tol):
+    if a is None or b is None:
+        return a is None and b is None
+    for k, v in a.items():
+        w = b[k]
+        if isinstance(v, float):
+            if not (np.isnan(v) and np.isnan(w)) and abs(v - w) > tol * max(1.0, abs(v)):
+                return False
+        elif v != w:
+            return False
+    return True
+
+
+def check_stream(bars: int = 500, adjust_every: int = 97, tol: float = 1e-9,
+                 window: int = 120, day: int = 8) -> int:
+    """
+    Varje steg: sista baren först med ett preliminärt pris, sedan med det
+    slutliga (samma tidsstämpel), och tillståndet sparas som JSON som i
+    alert_state.json. Var adjust_every:e steg skalas hela historiken om
+    (split/utdelning) så att tillståndet måste byggas om. Andra varvet ser
+    bara de senaste window barerna, med start som flyttas var day:e bar.
+    """
+    rng = np.random.default_rng(2)
+    c = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+    idx = pd.date_range("2024-01-01", periods=bars, freq="h", tz="Europe/Stockholm")
+    bad, steps = 0, 0
+    for sliding in (False, True):
+        state = None
+        for i in range(2, bars + 1):
+            if i % adjust_every == 0:
+                c = c * 0.5
+            a = max(0, (i - window) // day * day) if sliding else 0
+            errs, state = _stream_step(c, idx, a, i, state, rng, tol)
+            for e in errs[:max(0, 3 - bad)]:
+                print(e)
+            bad, steps = bad + len(errs), steps + 2
+    print(f"stream: {steps} steg (växande och glidande fönster), {bad} avvikelser mot latest_signal")
+    return bad
+
+
+def _stream_step(c, idx, a, i, state, rng, tol):
+    """Preliminär och slutlig sista bar för fönstret [a, i). -> (avvikelser, tillstånd)."""
+    bad = []
+    final = pd.Series(c[a:i], index=idx[a:i])
+    provisional = final.copy()
+    provisional.iloc[-1] *= 1 + rng.normal(0, 0.01)
+    for close in (provisional, final):
+        got, state = latest_signal_stream(close, state)
+        state = json.loads(json.dumps(state))
+        if not _same_signal(latest_signal(close), got, tol):
+            bad.append(f"steg {i} ({close.index[0]} – {close.index[-1]}): {got} != {latest_signal(close)}")
+    return bad, state
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark indikatorkärnor mot pandas")
+    ap.add_argument("--bars", type=int, default=200_000)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--backends", action="store_true", help="Jämför numpy- och numba-backend (paritet)")
+    ap.add_argument("--stream", action="store_true", help="latest_signal_stream bar för bar mot latest_signal")
+    ap.add_argument("--skip-numba", action="store_true", help="Hoppa över numba-pariteten (t.ex. utan numba)")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    c = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, args.bars)))
+    h, l = c * 1.005, c * 0.995
+    if args.backends or args.stream:
+        bad = check_backends(c, h, l, args.repeat) if args.backends else 0
+        bad += check_stream() if args.stream else 0
+        if bad:
+            raise SystemExit(f"{bad} kontroller misslyckades")
+        return
+    s, hs, ls = pd.Series(c), pd.Series(h), pd.Series(l)
+
+    cases = [
+        ("rsi_wilder", lambda: pd_rsi_wilder(s), lambda: ind.rsi_wilder(c, 14)),
+        ("rsi_sma", lambda: pd_rsi_sma(s), lambda: ind.rsi_sma(c, 14, zero_first=True)),
+        ("macd", lambda: pd_macd(s)[1], lambda: ind.macd(c)[1]),
+        ("sma200", lambda: s.rolling(200).mean(), lambda: ind.sma(c, 200)),
+        ("max20", lambda: s.rolling(20).max(), lambda: ind.rolling_max(c, 20)),
+        ("atr", lambda: pd_atr(hs, ls, s), lambda: ind.atr(h, l, c, 14)),
+    ]
+    print(f"{'indikator':<12}{'pandas ms':>12}{'numpy ms':>12}{'x':>8}{'max avvik':>14}")
+    bad = 0
+    for name, old, new in cases:
+        t_old, r_old = _time(old, args.repeat)
+        t_new, r_new = _time(new, args.repeat)
+        dev = _dev(r_old, r_new)
+        print(f"{name:<12}{t_old*1e3:>12.2f}{t_new*1e3:>12.2f}{t_old/t_new:>8.2f}{dev:>14.2e}")
+        r_old, r_new = np.asarray(r_old, dtype=float), np.asarray(r_new, dtype=float)
+        if (np.isnan(r_old) != np.isnan(r_new)).any() or dev > PANDAS_RTOL * (np.nanmax(np.abs(r_old)) or 1.0):
+            bad += 1
+            print(f"avvikelse {name}: {dev:.2e} (rtol {PANDAS_RTOL:.0e}) eller NaN på andra platser")
+
+    print()
+    bad += 0 if args.skip_numba else check_backends(c, h, l, args.repeat)
+    bad += check_stream()
+    if bad:
+        raise SystemExit(f"{bad} kontroller misslyckades")
+
+
+if __name__ == "__main__":
+    main()
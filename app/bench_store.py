@@ -0,0 +1,84 @@
+"""
+Samtidighetskontroll för mmap-exporten i BarStore.open_bars (app/bars.py):
+N processer öppnar samma inaktuella export på en gång, flera varv. Alla
+ska lyckas, se samma barer och inga tmp-/old-kataloger får bli kvar.
+Avslutar med fel annars.
+
+    python -m app.bench_store --workers 12 --rounds 5
+"""
+import argparse
+import multiprocessing as mp
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.store import BarStore
+
+TICKER, INTERVAL = "TEST", "1d"
+
+
+def _frame(bars: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    c = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+    return pd.DataFrame({"Open": c, "High": c * 1.01, "Low": c * 0.99, "Close": c,
+                         "Volume": rng.integers(1, 10**6, bars).astype(float)},
+                        index=pd.bdate_range("2000-01-03", periods=bars, name="Date"))
+
+
+def _worker(root, barrier, expected, q):
+    try:
+        barrier.wait()
+        bars = BarStore(root).open_bars(TICKER, INTERVAL)
+        q.put(float(np.asarray(bars.close).sum()) == expected and len(bars) > 0)
+    except Exception as e:  # rapporteras till huvudprocessen
+        q.put(f"{type(e).__name__}: {e}")
+
+
+def check(workers: int, rounds: int, bars: int) -> int:
+    bad = 0
+    ctx = mp.get_context("fork" if "fork" in mp.get_all_start_methods() else "spawn")
+    with tempfile.TemporaryDirectory() as root:
+        store = BarStore(root)
+        for r in range(rounds):
+            df = _frame(bars, r)
+            store.write(df, TICKER, INTERVAL)
+            stamp = store.bars_path(TICKER, INTERVAL) / "meta.json"
+            if stamp.exists():
+                # exporten äldre än kolumnfilen -> alla läsare ser den som inaktuell
+                os.utime(stamp, (0, 0))
+            expected = float(df["Close"].to_numpy().sum())
+            barrier, q = ctx.Barrier(workers), ctx.Queue()
+            procs = [ctx.Process(target=_worker, args=(root, barrier, expected, q)) for _ in range(workers)]
+            for p in procs:
+                p.start()
+            results = [q.get(timeout=120) for _ in procs]
+            for p in procs:
+                p.join()
+            errors = [x for x in results if x is not True]
+            if errors:
+                bad += len(errors)
+                print(f"varv {r}: {len(errors)} av {workers} misslyckades: {errors[:3]}")
+        left = [p.name for p in Path(root, INTERVAL).iterdir() if p.name.endswith((".tmp", ".old"))]
+        if left:
+            bad += 1
+            print(f"kvarlämnade kataloger: {left}")
+    return bad
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Många processer mot samma inaktuella mmap-export")
+    ap.add_argument("--workers", type=int, default=12)
+    ap.add_argument("--rounds", type=int, default=5)
+    ap.add_argument("--bars", type=int, default=50_000)
+    args = ap.parse_args()
+    bad = check(args.workers, args.rounds, args.bars)
+    if bad:
+        raise SystemExit(f"{bad} fel vid samtidig export")
+    print(f"OK – {args.workers} processer × {args.rounds} varv öppnade samma export utan fel")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,15 @@
 ﻿import warnings; warnings.filterwarnings("ignore")
-import pandas as pd, numpy as np, yfinance as yf
+import pandas as pd, numpy as np
+
+try:
+    from app.data import get_data
+    from app import exits, indicators as ind
+    from app.ledger import TradeLedger
+except ImportError:
+    from data import get_data
+    import exits
+    import indicators as ind
+    from ledger import TradeLedger
 
 # --------- PARAMETRAR ----------
 TICKER = "NANEXA.ST"
@@ -12,27 +22,22 @@ ATR_MULT        = 3.0
 BASE_CAPITAL = 10000
 FEE_PCT_EACH_SIDE = 0.0
 
-def ema(s,span): return s.ewm(span=span, adjust=False).mean()
+# kärnorna ligger i app/indicators.py
+def _s(v,like): return pd.Series(v, index=like.index)
+def ema(s,span): return _s(ind.ema(s.to_numpy(dtype=float),span), s)
 def macd(s):
-    line = ema(s,12)-ema(s,26); sig=ema(line,9); hist=line-sig; return line,sig,hist
-def rsi(s,period=14):
-    d=s.diff(); up=d.clip(lower=0); dn=(-d).clip(lower=0)
-    au=up.ewm(alpha=1/period, adjust=False).mean()
-    ad=dn.ewm(alpha=1/period, adjust=False).mean()
-    rs=au/ad.replace(0,np.nan); return 100-(100/(1+rs))
-def atr(df,period=14):
-    h,l,c=df["High"],df["Low"],df["Close"]; pc=c.shift(1)
-    tr=pd.concat([(h-l),(h-pc).abs(),(l-pc).abs()],axis=1).max(axis=1)
-    return tr.rolling(period).mean()
+    line,sig,hist=ind.macd(s.to_numpy(dtype=float),12,26,9); return _s(line,s),_s(sig,s),_s(hist,s)
+def rsi(s,period=14): return _s(ind.rsi_wilder(s.to_numpy(dtype=float),period), s)
+def atr(df,period=14): return _s(ind.atr(df["High"],df["Low"],df["Close"],period), df)
 
-df = yf.download(TICKER, start="2021-01-01", progress=False, auto_adjust=False).dropna()
+df = get_data(TICKER, "2021-01-01", auto_adjust=False)
 df = df[df.index>=pd.to_datetime(START)].copy()
 if df.empty: raise SystemExit("Ingen data hämtad.")
 
 close=df["Close"]
 macd_line,macd_sig,macd_hist=macd(close)
 rsi14=rsi(close,14)
-sma200=close.rolling(200).mean()
+sma200=_s(ind.sma(close,200),close)
 atr14=atr(df,14)
 
 cross_up=(macd_line>macd_sig)&(macd_line.shift(1)<=macd_sig.shift(1))
@@ -52,64 +57,18 @@ atr_v=np.asarray(atr14.values,float).reshape(-1)
 buy_v=np.asarray(buy_s.values,bool).reshape(-1)
 sell_v=np.asarray(sell_s.values,bool).reshape(-1)
 
-parts=[]; trades=[]; curve=[]
-in_pos=False; qty=0; entry_px=0.0; entry_date=None
-high_water=None; fixed_stop=None
-exit_next=False; reason=""
-initial_capital=None; capital=None
+# exit-motorn i app/exits.py: entry/signal-exit nästa öppning, stopp intradag på nivån
+rules=exits.ExitRules(fixed_pct=STOP_FIXED_PCT,trail_pct=STOP_TRAIL_PCT,atr_mult=ATR_MULT,base_capital=BASE_CAPITAL,
+                      entry_fill="next_open",exit_fill="next_open",stop_fill="intrabar")
+res=exits.run_exits(open_v,high_v,low_v,df["Close"],atr_v,buy_v,sell_v,rules)
+led=TradeLedger.from_exits(res,FEE_PCT_EACH_SIDE)
+initial_capital,capital=led.capital_path()[0],led.final_capital()
 
-N=len(open_v)
-for i in range(N-1):
-    # exit på nästa öppning
-    if in_pos and exit_next:
-        px=float(open_v[i+1]); parts.append(f"{dates[i+1].date()} SÄLJ {qty} st @ {px:.2f}")
-        fee_in=entry_px*(FEE_PCT_EACH_SIDE/100.0); fee_out=px*(FEE_PCT_EACH_SIDE/100.0)
-        capital += ((px-fee_out)-(entry_px+fee_in))*qty
-        curve.append({"date":dates[i+1].date(),"capital":capital})
-        trades.append({"entry_date":entry_date.date(),"entry_price":round(entry_px,4),
-                       "exit_date":dates[i+1].date(),"exit_price":round(px,4),
-                       "qty":qty,"reason":reason})
-        in_pos=False; qty=0; entry_px=0.0; entry_date=None
-        high_water=None; fixed_stop=None; exit_next=False; reason=""
-
-    # stoppar intradag
-    if in_pos:
-        high_water=max(high_water,float(high_v[i]))
-        trail=high_water*(1-STOP_TRAIL_PCT/100.0)
-        chand=high_water - (0.0 if np.isnan(atr_v[i]) else atr_v[i])*ATR_MULT
-        stop_lvl=max(fixed_stop,trail,chand)
-        if float(low_v[i])<=stop_lvl:
-            px=float(stop_lvl); parts.append(f"{dates[i].date()} SÄLJ {qty} st @ {px:.2f}")
-            fee_in=entry_px*(FEE_PCT_EACH_SIDE/100.0); fee_out=px*(FEE_PCT_EACH_SIDE/100.0)
-            capital += ((px-fee_out)-(entry_px+fee_in))*qty
-            curve.append({"date":dates[i].date(),"capital":capital})
-            trades.append({"entry_date":entry_date.date(),"entry_price":round(entry_px,4),
-                           "exit_date":dates[i].date(),"exit_price":round(px,4),
-                           "qty":qty,"reason":"STOP"})
-            in_pos=False; qty=0; entry_px=0.0; entry_date=None
-            high_water=None; fixed_stop=None
-            continue
-
-    # entry nästa öppning
-    if (not in_pos) and buy_v[i]:
-        n_open=float(open_v[i+1]); q=int(BASE_CAPITAL//n_open)
-        if q>0:
-            qty=q; entry_px=n_open; entry_date=dates[i+1]; in_pos=True
-            high_water=entry_px; fixed_stop=entry_px*(1-STOP_FIXED_PCT/100.0)
-            parts.append(f"{dates[i+1].date()} KÖP {qty} st @ {entry_px:.2f}")
-            if initial_capital is None:
-                initial_capital=qty*entry_px; capital=initial_capital
-
-    if in_pos and sell_v[i]:
-        exit_next=True; reason="SIGNAL"
-
-line=" ".join(parts)
-if capital is not None: line += f" Slutligt kapital: {capital:.2f}"
-print(line)
+print(led.transline(dates))
 
 # summering
-if trades:
-    tdf=pd.DataFrame(trades)
+tdf=led.to_frame(dates)
+if len(tdf):
     tdf["net_return_pct"]=np.round((tdf["exit_price"]/tdf["entry_price"]-1)*100,3)
     wins=int((tdf["net_return_pct"]>0).sum())
     print("\n--- Summering (snällare filter + stop) ---")
@@ -122,5 +81,5 @@ else:
 
 # spara csv
 out="/app/output"; import os; os.makedirs(out, exist_ok=True)
-tdf.to_csv(f"{out}/NANEXA_trades_relaxed.csv", index=False) if trades else None
-pd.DataFrame(curve).to_csv(f"{out}/NANEXA_curve_relaxed.csv", index=False) if curve else None
+tdf.to_csv(f"{out}/NANEXA_trades_relaxed.csv", index=False) if len(tdf) else None
+led.curve(dates).to_csv(f"{out}/NANEXA_curve_relaxed.csv", index=False) if len(tdf) else None
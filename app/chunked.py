@@ -0,0 +1,152 @@
+"""
+Strömmande backtest i bitar för långa intradagshistoriker (1h/30m i många år).
+
+Barerna läses bit för bit ur lagrets mmap-arrayer (BarStore.open_bars /
+data.get_bars) – ingen DataFrame över hela historiken byggs. RSI-tillståndet
+(indicators.rsi_wilder_chunk) och positionstillståndet (exits.run_exits med
+state/offset) förs över bitgränserna, och affärer och equity skrivs till
+disk efter varje bit. Minnet beror på bitstorleken, inte på historikens
+längd (plus 8 byte per stängd affär för slutstatistiken). Även
+uppdateringen före körningen strömmas: data.get_bars hämtar bara svansen
+och lägger den direkt i mmap-exporten (bars.extend_bars).
+
+Resultatet är identiskt med minnesmotorn:
+
+    strategy.run_backtest(data.build_signals(df, rsi_buy, rsi_sell, rsi_len), ...)
+
+– samma affärsrader (Type/Date/Price/PnL[/Reason]), samma equity och samma
+nyckeltal, oavsett bitstorlek. CSV:erna läses bitexakt tillbaka med
+pd.read_csv(..., float_precision="round_trip"). Kontrolleras av
+app/bench_backtest.py (check_chunked).
+
+    python -m app.chunked --ticker ERIC-B.ST --interval 1h --start 2015-01-01 --out out/eric_1h
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    from app import exits
+    from app import indicators as ind
+    from app.data import get_bars
+    from app.ledger import TradeLedger
+    from app.strategy import stats
+except ImportError:
+    import exits
+    import indicators as ind
+    from data import get_bars
+    from ledger import TradeLedger
+    from strategy import stats
+
+CHUNK = 100_000
+
+
+def _dates(bars, i) -> pd.DatetimeIndex:
+    """Tidsstämplar för globala barindex i (små urval – inte hela index())."""
+    idx = pd.DatetimeIndex(np.asarray(bars.ts[np.asarray(i, dtype=np.int64)]).view("datetime64[ns]"))
+    return idx.tz_localize("UTC").tz_convert(bars.tz) if bars.tz else idx
+
+
+def run_chunked(bars, out_dir, rsi_buy: float = 45, rsi_sell: float = 55, rsi_len: int = 14,
+                fee_pct: float = 0.0, slippage_bps: int = 0, stop_pct: float = 0.0,
+                tp_pct: float = 0.0, trail_pct: float = 0.0, time_stop: int = 0,
+                chunk: int = CHUNK) -> dict:
+    """
+    bars: app/bars.Bars (gärna mmap). Skriver out_dir/trades.csv och
+    out_dir/equity.csv bit för bit. -> nyckeltal som strategy.run_backtest.
+    """
+    if chunk < 1:
+        raise ValueError("chunk måste vara minst 1")
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    trades_path, equity_path = out / "trades.csv", out / "equity.csv"
+    with_reason = bool(stop_pct or tp_pct or trail_pct or time_stop)
+    rules = exits.ExitRules(fixed_pct=stop_pct, trail_pct=trail_pct, tp_pct=tp_pct, time_stop=int(time_stop))
+    slip_in, slip_out = 1 + slippage_bps/10000, 1 - slippage_bps/10000
+
+    n = len(bars)
+    state = exits.new_state()
+    carry = None
+    eq = 1.0
+    rets = []
+    cols = ["Type", "Date", "Price", "PnL"] + (["Reason"] if with_reason else [])
+    pd.DataFrame(columns=cols).to_csv(trades_path, index=False)
+    pd.DataFrame({"Date": _dates(bars, [0]) if n else [], "Equity": [1.0] if n else []}).to_csv(equity_path, index=False)
+
+    for s in range(0, n, chunk):
+        part = bars.slice(s, s + chunk)
+        close = part.f64("close")
+        r, carry = ind.rsi_wilder_chunk(close, rsi_len, carry=carry)
+        with np.errstate(invalid="ignore"):
+            buy, sell = r < rsi_buy, r > rsi_sell
+        o, h, l = part.f64("open"), part.f64("high"), part.f64("low")
+        # run_backtest läser bara kolumner som finns – saknade är NaN i Bars
+        res = exits.run_exits(None if np.isnan(o).all() else o, None if np.isnan(h).all() else h,
+                              None if np.isnan(l).all() else l, close, None, buy, sell, rules,
+                              state=state, offset=s, include_open=False)
+        state = res["state"]
+        k = len(res["entry_i"])
+        if not k:
+            continue
+        # entrypriset är stängningen på entrybaren (exit-motorn fyller på close)
+        entry_px = res["entry_px"] * slip_in
+        exit_px = res["exit_px"] * slip_out
+        ret = (exit_px / entry_px - 1) - (fee_pct/100)*2
+        curve = np.cumprod(np.concatenate([[eq], 1.0 + ret]))[1:]
+        eq = curve[-1]
+        rets.append(ret)
+
+        led = TradeLedger(k)
+        led.extend(res["entry_i"], res["exit_i"], entry_px, exit_px, reason=res["reason"], pnl=ret)
+        led.to_rows(lambda i: _dates(bars, i), reason=with_reason).to_csv(
+            trades_path, mode="a", header=False, index=False)
+        pd.DataFrame({"Date": _dates(bars, res["exit_i"]), "Equity": curve}).to_csv(
+            equity_path, mode="a", header=False, index=False)
+
+    if state[exits.S_POS] > 0:
+        i = int(state[exits.S_ENTRY_I])
+        led = TradeLedger(1)
+        led.append(i, -1, float(bars.slice(i, i + 1).f64("close")[0]) * slip_in, reason=exits.OPEN)
+        # utan stängda affärer saknar to_rows PnL-kolumnen – följ filhuvudet
+        led.to_rows(lambda i: _dates(bars, i), reason=with_reason).reindex(columns=cols).to_csv(
+            trades_path, mode="a", header=False, index=False)
+
+    rets = np.concatenate(rets) if rets else np.empty(0)
+    equity = np.cumprod(np.concatenate([[1.0], 1.0 + rets]))
+    return stats(rets, equity, _dates(bars, [0, n - 1]) if n else pd.DatetimeIndex([]))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="RSI-backtest i bitar från datalagret (begränsat minne)")
+    ap.add_argument("--ticker", required=True)
+    ap.add_argument("--start", default="2015-01-01")
+    ap.add_argument("--interval", default="1h")
+    ap.add_argument("--source", default="auto", help="Datakälla (se app/providers.py)")
+    ap.add_argument("--no-refresh", action="store_true", help="Läs bara lagret, hämta inget")
+    ap.add_argument("--rsi_buy", type=float, default=45)
+    ap.add_argument("--rsi_sell", type=float, default=55)
+    ap.add_argument("--rsi_len", type=int, default=14)
+    ap.add_argument("--fee", type=float, default=0.0)
+    ap.add_argument("--slip", type=int, default=0)
+    ap.add_argument("--stop", type=float, default=0.0)
+    ap.add_argument("--tp", type=float, default=0.0)
+    ap.add_argument("--trail", type=float, default=0.0)
+    ap.add_argument("--tstop", type=int, default=0)
+    ap.add_argument("--chunk", type=int, default=CHUNK, help="Barer per bit")
+    ap.add_argument("--out", required=True, help="Katalog för trades.csv och equity.csv")
+    args = ap.parse_args()
+
+    bars = get_bars(args.ticker, args.start, args.interval, args.source, refresh=not args.no_refresh)
+    if bars is None or not len(bars):
+        raise SystemExit(f"Ingen data för {args.ticker} {args.interval}")
+    st = run_chunked(bars, args.out, args.rsi_buy, args.rsi_sell, args.rsi_len, args.fee, args.slip,
+                     args.stop, args.tp, args.trail, args.tstop, args.chunk)
+    print(f"{args.ticker} {args.interval}: {len(bars)} barer i bitar om {args.chunk}")
+    print(pd.Series(st).to_string())
+    print(f"Sparat till {args.out}/trades.csv och equity.csv")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,297 @@
+import numpy as np
 import pandas as pd
 
+try:
+    from app.bars import Bars, extend_bars
+    from app.store import BarStore
+    from app.providers import DataProvider, get_provider
+    from app.resample import MINUTES, can_derive, resample_bars
+    from app import indicators as ind
+    from app.indicator_cache import cached
+except ImportError:  # körs som skript inifrån app/
+    from bars import Bars, extend_bars
+    from store import BarStore
+    from providers import DataProvider, get_provider
+    from resample import MINUTES, can_derive, resample_bars
+    import indicators as ind
+    from indicator_cache import cached
+
 def rsi(series: pd.Series, n: int = 14) -> pd.Series:
-    delta = series.diff()
-    gain = delta.clip(lower=0)
-    loss = -delta.clip(upper=0)
-    avg_gain = gain.ewm(alpha=1/n, adjust=False).mean()
-    avg_loss = loss.ewm(alpha=1/n, adjust=False).mean()
-    rs = avg_gain / avg_loss.replace(0, pd.NA)
-    return 100 - (100 / (1 + rs))
+    # Wilder-RSI, se app/indicators.py
+    return pd.Series(ind.rsi_wilder(series.to_numpy(dtype="float64"), n), index=series.index)
 
-def build_signals(df: pd.DataFrame, rsi_buy: int = 45, rsi_sell: int = 55):
+def build_signals(df: pd.DataFrame, rsi_buy: int = 45, rsi_sell: int = 55, rsi_len: int = 14,
+                  use_trend: bool = False, use_atr: bool = False,
+                  atr_lo: float = 0.0, atr_hi: float = 999.0):
     """
     Enkel RSI-strategi:
       - Köp när RSI < rsi_buy
       - Sälj när RSI > rsi_sell
+    Valbara köpfilter: Close > SMA200 (use_trend) och ATR14 i % av Close
+    inom [atr_lo, atr_hi] (use_atr). Indikatorerna läses via indicator_cache,
+    så en svep över trösklar räknar RSI en gång per serie.
     """
     df = df.copy()
-    df["RSI"] = rsi(df["Close"], 14)
+    close = df["Close"].to_numpy(dtype="float64")
+    df["RSI"] = cached("rsi_wilder", close, n=rsi_len)
 
     buy_mask = df["RSI"] < rsi_buy
     sell_mask = df["RSI"] > rsi_sell
 
+    if use_trend:
+        df["SMA200"] = cached("sma", close, n=200)
+        buy_mask &= df["Close"] > df["SMA200"]
+    if use_atr:
+        atr = cached("atr", df["High"].to_numpy(dtype="float64"), df["Low"].to_numpy(dtype="float64"), close, n=14)
+        df["ATR_PCT"] = atr / close * 100.0
+        buy_mask &= df["ATR_PCT"].between(atr_lo, atr_hi)
+
     df["BUY"] = buy_mask.fillna(False)
     df["SELL"] = sell_mask.fillna(False)
     return df
 
+
+# ---------- Data ----------
+
+def _to_ts(x) -> pd.Timestamp:
+    return pd.Timestamp(str(x)) if not isinstance(x, pd.Timestamp) else x
+
+
+def _align(ts: pd.Timestamp, index: pd.DatetimeIndex) -> pd.Timestamp:
+    """Gör ts jämförbar med index (intradag från yfinance är tidszonsmärkt)."""
+    tz = getattr(index, "tz", None)
+    if tz is not None and ts.tzinfo is None:
+        return ts.tz_localize(tz)
+    if tz is None and ts.tzinfo is not None:
+        return ts.tz_localize(None)
+    return ts
+
+
+def period_start(period: str) -> pd.Timestamp:
+    """yfinance-period ('6mo', '1y', '5d', 'ytd', 'max') -> startdatum."""
+    now = pd.Timestamp.now().normalize()
+    p = period.strip().lower()
+    if p == "max":
+        return pd.Timestamp("1970-01-01")
+    if p == "ytd":
+        return pd.Timestamp(year=now.year, month=1, day=1)
+    units = {"d": "days", "wk": "weeks", "mo": "months", "y": "years"}
+    for suf, unit in units.items():
+        if p.endswith(suf) and p[:-len(suf)].isdigit():
+            return now - pd.DateOffset(**{unit: int(p[:-len(suf)])})
+    raise ValueError(f"Okänd period: {period}")
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """float32-priser och uint32-volym (halva minnet). Kärnorna räknar i float64."""
+    out = df.astype({c: "float32" for c in ("Open", "High", "Low", "Close") if c in df.columns})
+    if "Volume" in out.columns:
+        vol = np.nan_to_num(df["Volume"].to_numpy(dtype="float64"), nan=0.0)
+        out["Volume"] = np.clip(vol, 0, np.iinfo(np.uint32).max).astype("uint32")
+    return out
+
+
+OVERLAP = 5  # stängda barer som hämtas om vid varje tail-fetch och jämförs mot lagret
+COVER_GRACE = pd.Timedelta(days=4)  # helg + helgdag mellan start och första handelsbaren
+
+
+def _plan(store: BarStore, ticker: str, start_ts, interval: str, auto_adjust: bool):
+    """(cached, covered_from, hämta_från) för en ticker enligt lagret."""
+    cached = store.read(ticker, interval, auto_adjust)
+    meta = store.meta(ticker, interval, auto_adjust)
+    covered_from = _to_ts(meta["from"]) if "from" in meta else None
+    if cached is None or cached.empty or covered_from is None or start_ts < covered_from:
+        return None, None, start_ts
+    # sista baren kan ha varit ofullständig -> hämta från dess datum, och
+    # OVERLAP stängda barer till bakåt så att _commit ser en omjustering
+    return cached, covered_from, cached.index[-min(len(cached), OVERLAP + 1)].normalize()
+
+
+def _commit(store: BarStore, provider: DataProvider, ticker: str, start_ts, interval: str,
+            auto_adjust: bool, cached, covered_from, fetched: pd.DataFrame) -> pd.DataFrame:
+    if cached is None:
+        if fetched.empty:
+            return fetched
+        # "from" = begärd start (historik före den finns inte), "first" = första lagrade bar
+        store.write(fetched, ticker, interval, auto_adjust, **{"from": str(start_ts.date())},
+                    first=str(fetched.index[0]))
+        data = fetched
+    else:
+        # lagrets sista bar kan ha varit ofullständig – jämförs inte
+        overlap = fetched.index.intersection(cached.index[:-1])
+        a = cached.loc[overlap, "Close"].to_numpy(dtype=float)
+        b = fetched.loc[overlap, "Close"].to_numpy(dtype=float)
+        if len(overlap) and (abs(a - b) > 1e-6 * abs(a)).any():
+            # historiken har justerats om – lagret är inaktuellt
+            data = provider.fetch(ticker, covered_from, interval, auto_adjust)
+            store.write(data, ticker, interval, auto_adjust, **({"first": str(data.index[0])} if len(data) else {}))
+        else:
+            data = store.append(fetched, ticker, interval, auto_adjust)
+    return data[data.index >= _align(start_ts, data.index)]
+
+
+def _first_bar(store: BarStore, ticker: str, interval: str, auto_adjust: bool, meta: dict):
+    """Första lagrade baren (meta "first", annars ur filen för äldre lager)."""
+    if "first" in meta:
+        return _to_ts(meta["first"])
+    df = store.read(ticker, interval, auto_adjust)
+    return None if df is None or df.empty else df.index[0]
+
+
+def _derived(store: BarStore, provider: DataProvider, ticker: str, start_ts, interval: str,
+             auto_adjust: bool):
+    """
+    Bygger interval lokalt av närmast finare lagrade barer som täcker start
+    (se app/resample.py). Basen måste ha barer från start – inte bara ha
+    begärt dem: källan kan ha gett kortare historik än begärt (t.ex. Yahoos
+    intradaggräns). Resultatet cachas som egen partition "<interval>~<bas>"
+    och vid nästa anrop räknas bara perioderna från sista cachade bar om.
+    None om inga lagrade barer duger.
+    """
+    bases = [b for b in store.intervals(ticker, auto_adjust) if "~" not in b and can_derive(b, interval)]
+    for base in sorted(bases, key=MINUTES.get, reverse=True):
+        meta = store.meta(ticker, base, auto_adjust)
+        if "from" not in meta or _to_ts(meta["from"]) > start_ts:
+            continue
+        first = _first_bar(store, ticker, base, auto_adjust, meta)
+        if first is None or first > _align(start_ts + COVER_GRACE, first):
+            continue
+        src = get_data(ticker, meta["from"], base, provider, auto_adjust, store=store, derive=False)
+        key = f"{interval}~{base}"
+        cached = store.read(ticker, key, auto_adjust)
+        if cached is None or cached.empty:
+            data = resample_bars(src, base, interval, ticker)
+            store.write(data, ticker, key, auto_adjust, **{"from": meta["from"]})
+        else:
+            cut = _align(cached.index[-1], src.index)
+            data = store.append(resample_bars(src[src.index >= cut], base, interval, ticker),
+                                ticker, key, auto_adjust)
+        # barer märks med periodens början (vecka: måndagen) – behåll de som slutar efter start
+        end = data.index + pd.Timedelta(minutes=MINUTES[interval])
+        return data[end > _align(start_ts, data.index)]
+    return None
+
+
+def get_data(ticker: str, start="2020-01-01", interval: str = "1d", source: str = "auto",
+             auto_adjust: bool = True, use_store: bool = True, store: BarStore = None,
+             compact: bool = False, derive: bool = True) -> pd.DataFrame:
+    """
+    Hämtar OHLCV-data från vald källa (app/providers.py). Läser först det
+    lokala lagret (app/store.py) och hämtar bara barerna efter sista
+    sparade tidsstämpel.
+      - saknas historik före 'start' hämtas hela perioden om
+      - ändras överlappande bar (t.ex. utdelningsjustering) hämtas allt om
+    Källor som redan är lokala (local/replay) går förbi lagret.
+    derive=True bygger grövre intervall av finare lagrade barer när sådana
+    täcker perioden, i stället för en ny nedladdning.
+    compact=True ger float32/uint32-kolumner (se compact_frame).
+    """
+    start_ts = _to_ts(start)
+    provider = get_provider(source)
+    if not use_store or not provider.cacheable:
+        data = provider.fetch(ticker, start_ts, interval, auto_adjust)
+    else:
+        store = store or BarStore()
+        data = _derived(store, provider, ticker, start_ts, interval, auto_adjust) if derive else None
+        if data is not None:
+            return compact_frame(data) if compact else data
+        cached, covered_from, fetch_from = _plan(store, ticker, start_ts, interval, auto_adjust)
+        fetched = provider.fetch(ticker, fetch_from, interval, auto_adjust)
+        data = _commit(store, provider, ticker, start_ts, interval, auto_adjust, cached, covered_from, fetched)
+    return compact_frame(data) if compact else data
+
+
+def get_data_many(tickers, start="2020-01-01", interval: str = "1d", source: str = "auto",
+                  auto_adjust: bool = True, chunk_size: int = 50, use_store: bool = True,
+                  store: BarStore = None) -> dict:
+    """
+    Som get_data för många tickers: ett nätanrop per chunk om chunk_size
+    symboler i stället för ett per symbol. Returnerar {ticker: DataFrame}.
+    Symbolerna grupperas efter var lagret behöver börja hämta (kalla från
+    start, varma från sin sista bar), så att en kall symbol inte drar med
+    sig hela historiken för resten av chunken.
+    """
+    start_ts = _to_ts(start)
+    tickers = list(dict.fromkeys(tickers))
+    chunk_size = max(1, int(chunk_size))
+    provider = get_provider(source)
+    use_store = use_store and provider.cacheable
+    store = store or BarStore()
+    plans = {t: _plan(store, t, start_ts, interval, auto_adjust) if use_store else (None, None, start_ts)
+             for t in tickers}
+    groups = {}
+    for t in tickers:
+        groups.setdefault(_to_ts(plans[t][2]).tz_localize(None), []).append(t)
+    out = {}
+    for fetch_from, group in groups.items():
+        for i in range(0, len(group), chunk_size):
+            chunk = group[i:i + chunk_size]
+            fetched = provider.fetch_many(chunk, fetch_from, interval, auto_adjust)
+            for t in chunk:
+                if not use_store:
+                    out[t] = fetched[t]
+                    continue
+                cached, covered_from, _ = plans[t]
+                out[t] = _commit(store, provider, t, start_ts, interval, auto_adjust, cached, covered_from,
+                                 fetched[t])
+    return {t: out[t] for t in tickers}
+
+
+def _refresh_bars(store: BarStore, provider: DataProvider, ticker: str, start_ts, interval: str,
+                  auto_adjust: bool) -> bool:
+    """
+    Uppdaterar lagrets mmap-export (app/bars.py) med bara svansen, utan att
+    läsa hela historiken: de sista OVERLAP+1 barerna hämtas om och jämförs,
+    nya barer läggs till med extend_bars (bitvis kopiering). Kolumnfilen
+    lämnas orörd och kan ligga efter – get_data hämtar då svansen som vanligt
+    och exporten byggs om när kolumnfilen skrivs.
+    False om det inte går (kallt lager, tidigare start, omjusterad
+    historik) – då tar anroparen vanliga get_data-vägen.
+    """
+    meta = store.meta(ticker, interval, auto_adjust)
+    if "from" not in meta or start_ts < _to_ts(meta["from"]):
+        return False
+    bars = store.open_bars(ticker, interval, auto_adjust)
+    if bars is None or not len(bars):
+        return False
+    n = len(bars)
+    tail = bars.slice(n - min(n, OVERLAP + 1))
+    fetched = provider.fetch(ticker, tail.index()[0].normalize(), interval, auto_adjust)
+    if fetched.empty:
+        return True
+    new = Bars.from_frame(fetched)
+    # lagrets sista bar kan ha varit ofullständig – jämförs inte, ersätts
+    _, ia, ib = np.intersect1d(tail.ts[:-1], new.ts, return_indices=True)
+    a, b = tail.f64("close")[ia], new.close[ib]
+    if (abs(a - b) > 1e-6 * abs(a)).any():
+        return False
+    add = new.ts >= bars.ts[n - 1]
+    if add.any():
+        keep = int(np.searchsorted(bars.ts, new.ts[add][0]))
+        extend_bars(store.bars_path(ticker, interval, auto_adjust), keep, fetched[add])
+    return True
+
+
+def get_bars(ticker: str, start="2020-01-01", interval: str = "1d", source: str = "auto",
+             auto_adjust: bool = True, store: BarStore = None, refresh: bool = True,
+             compact: str = None):
+    """
+    Som get_data men returnerar mmap-arrayer (app/bars.Bars) från lagret.
+    refresh=True hämtar svansen rakt in i mmap-exporten (_refresh_bars) så
+    att minnet inte beror på historikens längd; kallt lager eller omjusterad
+    historik går via get_data.
+    refresh=False läser bara lokalt – lämpligt i arbetsprocesser där
+    huvudprocessen redan har uppdaterat lagret.
+    compact="float32"/"int32" ger en kompakt kopia (Bars.compact).
+    """
+    store = store or BarStore()
+    if refresh:
+        start_ts = _to_ts(start)
+        provider = get_provider(source)
+        if not (provider.cacheable and _refresh_bars(store, provider, ticker, start_ts, interval, auto_adjust)):
+            get_data(ticker, start, interval, source, auto_adjust, store=store)
+    bars = store.open_bars(ticker, interval, auto_adjust)
+    if bars is None:
+        return None
+    bars = bars.since(_to_ts(start))
+    return bars.compact(compact) if compact else bars
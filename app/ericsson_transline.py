@@ -1,5 +1,12 @@
 ﻿import os, warnings; warnings.filterwarnings("ignore")
-import numpy as np, pandas as pd, yfinance as yf
+import numpy as np, pandas as pd
+
+try:
+    from app.data import get_data
+    from app import indicators as ind
+except ImportError:
+    from data import get_data
+    import indicators as ind
 
 # --- Inställningar ---
 TICKERS = ["ERIC-B.ST", "ERIC"]   # OMX först, annars ADR
@@ -10,26 +17,16 @@ USE_RSI_FILTER = os.getenv("USE_RSI_FILTER","1") == "1"  # sätt 0 för att stä
 def rsi(series: pd.Series, period=14) -> pd.Series:
     if isinstance(series, pd.DataFrame):
         series = series.iloc[:, 0]
-    delta = series.diff()
-    gain  = delta.clip(lower=0)
-    loss  = (-delta).clip(lower=0)
-    avg_gain = gain.ewm(alpha=1/period, adjust=False).mean()
-    avg_loss = loss.ewm(alpha=1/period, adjust=False).mean()
-    rs  = avg_gain / avg_loss.replace(0, np.nan)
-    return 100 - (100 / (1 + rs))
+    return pd.Series(ind.rsi_wilder(series.to_numpy(dtype=float), period), index=series.index)
 
 def macd(series: pd.Series, fast=12, slow=26, signal=9):
     if isinstance(series, pd.DataFrame):
         series = series.iloc[:, 0]
-    ema_f = series.ewm(span=fast, adjust=False).mean()
-    ema_s = series.ewm(span=slow, adjust=False).mean()
-    line  = ema_f - ema_s
-    sig   = line.ewm(span=signal, adjust=False).mean()
-    return line, sig
+    line, sig, _ = ind.macd(series.to_numpy(dtype=float), fast, slow, signal)
+    return pd.Series(line, index=series.index), pd.Series(sig, index=series.index)
 
 def fetch(tick):
-    df = yf.download(tick, start="2021-01-01", progress=False, auto_adjust=False)
-    return df.dropna()
+    return get_data(tick, "2021-01-01", auto_adjust=False)
 
 # Hämta data (OMX -> ADR)
 used = None
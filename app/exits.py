@@ -0,0 +1,234 @@
+"""
+Gemensam exit-motor för alla backtestvarianter (bt_*-skripten,
+strategy.run_backtest och därmed optimize/ui).
+
+Regler (ExitRules, 0 = av):
+  - fast stopp      entry * (1 - fixed_pct%)
+  - trailing stopp  högsta high sedan entry * (1 - trail_pct%)
+  - ATR-chandelier  högsta high - atr_mult * ATR
+  - take-profit     entry * (1 + tp_pct%)
+  - tidsstopp       exit efter time_stop barer i position
+  - signal-exit     på säljsignal
+Stoppnivån är max av de aktiva stoppen.
+
+Fyllnadsregler: "close" (stängning på signalbaren), "next_open" (öppning på
+nästa bar) och, för stopp/TP, "intrabar" (på nivån när low/high når den).
+Gäller entry_fill (köp), exit_fill (signal/tid) och stop_fill (stopp/TP).
+
+Inre loopen (_exit_loop) är en @kernel (app/accel.py): den skriver i
+förallokerade arrayer och allokerar inget själv. Tillståndet (position,
+entry, högsta high, väntande order) ligger i en liten array som kan
+sparas och skickas in igen – en lång serie kan köras i bitar med samma
+resultat som i ett svep.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+try:
+    from app import accel
+except ImportError:
+    import accel
+
+# orsakskoder
+OPEN, SIGNAL, STOP, TP, TIME = 0, 1, 2, 3, 4
+REASONS = {OPEN: "", SIGNAL: "SIGNAL", STOP: "STOP", TP: "TP", TIME: "TIME"}
+
+# fyllnadsregler
+CLOSE, NEXT_OPEN, INTRABAR = 0, 1, 2
+FILLS = {"close": CLOSE, "next_open": NEXT_OPEN, "intrabar": INTRABAR}
+
+# index i tillståndsarrayen
+S_POS, S_ENTRY_I, S_ENTRY_PX, S_QTY, S_HIGH, S_PEND_EXIT, S_PEND_ENTRY = range(7)
+STATE_LEN = 7
+
+
+@dataclass
+class ExitRules:
+    fixed_pct: float = 0.0
+    trail_pct: float = 0.0
+    atr_mult: float = 0.0
+    tp_pct: float = 0.0
+    time_stop: int = 0
+    base_capital: float = 0.0     # > 0: qty = base_capital // entrypris, annars qty 1
+    entry_fill: str = "close"     # close | next_open
+    exit_fill: str = "close"      # close | next_open
+    stop_fill: str = "intrabar"   # intrabar | close | next_open
+
+    def params(self) -> np.ndarray:
+        for name, ok in (("entry_fill", ("close", "next_open")), ("exit_fill", ("close", "next_open")),
+                         ("stop_fill", ("intrabar", "close", "next_open"))):
+            if getattr(self, name) not in ok:
+                raise ValueError(f"{name} måste vara en av {', '.join(ok)}")
+        return np.array([self.fixed_pct, self.trail_pct, self.atr_mult, self.tp_pct, self.time_stop,
+                         self.base_capital, FILLS[self.entry_fill], FILLS[self.exit_fill],
+                         FILLS[self.stop_fill]], dtype=np.float64)
+
+
+def new_state() -> np.ndarray:
+    s = np.zeros(STATE_LEN)
+    s[S_ENTRY_I] = -1
+    return s
+
+
+@accel.kernel
+def _exit_loop(open_, high, low, close, atr, buy, sell, params, state, offset,
+               ent, ext, epx, xpx, qty, why):
+    fixed_pct = params[0]
+    trail_pct = params[1]
+    atr_mult = params[2]
+    tp_pct = params[3]
+    time_stop = int(params[4])
+    base_capital = params[5]
+    entry_fill = int(params[6])
+    exit_fill = int(params[7])
+    stop_fill = int(params[8])
+
+    pos = state[0] > 0
+    entry_i = int(state[1])
+    entry_px = state[2]
+    q = state[3]
+    hw = state[4]
+    pend_exit = int(state[5])
+    pend_entry = state[6] > 0
+
+    k = 0
+    for i in range(len(close)):
+        gi = offset + i
+        done = False
+
+        # 1) fyllnader på öppningen
+        if pos and pend_exit > 0:
+            ent[k] = entry_i
+            epx[k] = entry_px
+            qty[k] = q
+            ext[k] = gi
+            xpx[k] = open_[i]
+            why[k] = pend_exit
+            k += 1
+            pos = False
+            pend_exit = 0
+        if pend_entry and not pos:
+            px = open_[i]
+            n = base_capital // px if base_capital > 0 else 1.0
+            if n > 0:
+                pos = True
+                entry_i = gi
+                entry_px = px
+                q = n
+                hw = px
+        pend_entry = False
+
+        # 2) stopp / TP / tid / signal för öppen position
+        if pos:
+            if high[i] > hw:
+                hw = high[i]
+            x_px = np.nan
+            x_why = 0
+
+            stop = -np.inf
+            if fixed_pct > 0:
+                stop = entry_px * (1 - fixed_pct / 100.0)
+            if trail_pct > 0:
+                stop = max(stop, hw * (1 - trail_pct / 100.0))
+            if atr_mult > 0:
+                a = atr[i]
+                if a != a:
+                    a = 0.0
+                stop = max(stop, hw - a * atr_mult)
+            if stop > -np.inf:
+                if stop_fill == INTRABAR and low[i] <= stop:
+                    x_px, x_why = stop, 2
+                elif stop_fill == CLOSE and close[i] <= stop:
+                    x_px, x_why = close[i], 2
+                elif stop_fill == NEXT_OPEN and low[i] <= stop and pend_exit == 0:
+                    pend_exit = 2
+
+            if x_why == 0 and tp_pct > 0:
+                lvl = entry_px * (1 + tp_pct / 100.0)
+                if stop_fill == INTRABAR and high[i] >= lvl:
+                    x_px, x_why = lvl, 3
+                elif stop_fill == CLOSE and close[i] >= lvl:
+                    x_px, x_why = close[i], 3
+                elif stop_fill == NEXT_OPEN and high[i] >= lvl and pend_exit == 0:
+                    pend_exit = 3
+
+            if x_why == 0 and time_stop > 0 and gi - entry_i >= time_stop:
+                if exit_fill == CLOSE:
+                    x_px, x_why = close[i], 4
+                elif pend_exit == 0:
+                    pend_exit = 4
+
+            if x_why == 0 and sell[i]:
+                if exit_fill == CLOSE:
+                    x_px, x_why = close[i], 1
+                elif pend_exit == 0:
+                    pend_exit = 1
+
+            if x_why > 0:
+                ent[k] = entry_i
+                epx[k] = entry_px
+                qty[k] = q
+                ext[k] = gi
+                xpx[k] = x_px
+                why[k] = x_why
+                k += 1
+                pos = False
+                pend_exit = 0
+                done = True
+
+        # 3) entry
+        if (not pos) and (not done) and buy[i]:
+            if entry_fill == CLOSE:
+                px = close[i]
+                n = base_capital // px if base_capital > 0 else 1.0
+                if n > 0:
+                    pos = True
+                    entry_i = gi
+                    entry_px = px
+                    q = n
+                    hw = px
+            else:
+                pend_entry = True
+
+    state[0] = 1.0 if pos else 0.0
+    state[1] = entry_i
+    state[2] = entry_px
+    state[3] = q
+    state[4] = hw
+    state[5] = pend_exit
+    state[6] = 1.0 if pend_entry else 0.0
+    return k
+
+
+def run_exits(open_, high, low, close, atr, buy, sell, rules: ExitRules, state=None, offset: int = 0,
+              include_open: bool = True) -> dict:
+    """
+    Kör exit-motorn över en serie (eller en bit av en, med state/offset).
+    -> dict med arrayer per affär: entry_i, exit_i (-1 = öppen), entry_px,
+    exit_px, qty, reason – plus "state" att skicka in för nästa bit.
+    include_open lägger till en öppen position sist (exit_i = -1).
+    """
+    f = lambda a: np.ascontiguousarray(a, dtype=np.float64).reshape(-1)
+    b = lambda a: np.ascontiguousarray(a, dtype=np.bool_).reshape(-1)
+    c = f(close)
+    n = len(c)
+    o = c if open_ is None else f(open_)
+    h = c if high is None else f(high)
+    l = c if low is None else f(low)
+    a = np.zeros(n) if atr is None else f(atr)
+    state = new_state() if state is None else state
+
+    m = 2 * n + 2  # högst en exit på öppningen + en under baren per bar, + öppen
+    ent, ext = np.empty(m, np.int64), np.empty(m, np.int64)
+    epx, xpx, qty = np.empty(m), np.empty(m), np.empty(m)
+    why = np.empty(m, np.int8)
+    k = _exit_loop(o, h, l, c, a, b(buy), b(sell), rules.params(), state, int(offset),
+                   ent, ext, epx, xpx, qty, why)
+    if include_open and state[S_POS] > 0:
+        ent[k], epx[k], qty[k] = int(state[S_ENTRY_I]), state[S_ENTRY_PX], state[S_QTY]
+        ext[k], xpx[k], why[k] = -1, np.nan, OPEN
+        k += 1
+    return {"entry_i": ent[:k], "exit_i": ext[:k], "entry_px": epx[:k], "exit_px": xpx[:k],
+            "qty": qty[:k], "reason": why[:k], "state": state}
+
@@ -0,0 +1,220 @@
+"""
+Asyncio-baserad hämtning mot Yahoos chart-API.
+
+  - TokenBucket: global hastighetsgräns (anrop/sekund med burst)
+  - AsyncFetcher: begränsad samtidighet, keep-alive via en delad
+    requests.Session (anslutningspool), timeout per anrop – en symbol som
+    hänger hoppas över i stället för att stoppa hela passet
+  - YahooAsyncProvider: DataProvider för get_data/get_data_many ("async")
+
+Timeouten gäller själva anropet och räknas från att en arbetstråd börjar
+på det: svaret läses i bitar mot en deadline (plus requests egen timeout
+per läsning), så tråden blir fri igen och nästa symbol väntar aldrig i
+poolens kö på en som hänger. Semaforen och poolen har samma storlek.
+
+Anropas _fetch_many inifrån en körande event-loop (notebook, async-kod)
+körs hämtningen i en egen tråd med egen loop i stället för asyncio.run.
+Stäng med close() eller använd providern som context manager.
+
+Bas-URL:en kan pekas om (YAHOO_CHART_URL eller base_url=) mot en lokal
+HTTP-server för test.
+"""
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+try:
+    from app.providers import DataProvider, clean_ohlcv
+except ImportError:
+    from providers import DataProvider, clean_ohlcv
+
+CHART_URL = os.getenv("YAHOO_CHART_URL", "https://query1.finance.yahoo.com/v8/finance/chart/{symbol}")
+HEADERS = {"User-Agent": "Mozilla/5.0 (dalatraderbot)"}
+
+
+class TokenBucket:
+    """rate tokens/sekund, max burst tokens. acquire() väntar tills en token finns."""
+
+    def __init__(self, rate: float, burst: float = None):
+        if rate <= 0:
+            raise ValueError("rate måste vara > 0")
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1.0:
+                await asyncio.sleep((1.0 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1.0
+
+
+class AsyncFetcher:
+    def __init__(self, rate: float = 5.0, burst: float = None, concurrency: int = 8,
+                 timeout: float = 10.0, session=None):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = max(1, int(concurrency))
+        self.timeout = float(timeout)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.concurrency, pool_maxsize=self.concurrency)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update(HEADERS)
+        self.session = session
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency)
+
+    def close(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _get(self, url, params):
+        """Körs i poolens tråd; deadline räknas härifrån, inte från köandet."""
+        import requests
+        import urllib3
+
+        deadline = time.monotonic() + self.timeout
+        try:
+            with self.session.get(url, params=params, timeout=self.timeout, stream=True) as r:
+                r.raise_for_status()
+                # read1 (urllib3 2) ger det som har kommit, read väntar in hela biten
+                read = getattr(r.raw, "read1", None) or r.raw.read
+                body = bytearray()
+                while True:
+                    if time.monotonic() > deadline:
+                        raise TimeoutError
+                    part = read(1 << 16, decode_content=True)
+                    if not part:
+                        break
+                    body += part
+        except (requests.exceptions.Timeout, urllib3.exceptions.TimeoutError):
+            raise TimeoutError from None
+        return json.loads(body)
+
+    async def _one(self, key, url, params, bucket, sem):
+        async with sem:
+            await bucket.acquire()
+            loop = asyncio.get_running_loop()
+            try:
+                return key, await loop.run_in_executor(self._pool, self._get, url, params), None
+            except TimeoutError:
+                return key, None, f"timeout efter {self.timeout:g}s"
+            except Exception as e:
+                return key, None, str(e)
+
+    async def get_json_many(self, requests_):
+        """requests_: [(nyckel, url, params)] -> [(nyckel, json|None, fel|None)] i samma ordning."""
+        bucket = TokenBucket(self.rate, self.burst)
+        sem = asyncio.Semaphore(self.concurrency)
+        return await asyncio.gather(*(self._one(k, u, p, bucket, sem) for k, u, p in requests_))
+
+
+def _run(coro):
+    """asyncio.run – eller i en egen tråd om anroparen redan kör en event-loop."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        return ex.submit(asyncio.run, coro).result()
+
+
+# ---------- Yahoo chart ----------
+
+def chart_params(start, interval: str) -> dict:
+    t0 = pd.Timestamp(str(start))
+    t0 = t0.tz_convert("UTC") if t0.tzinfo else t0.tz_localize("UTC")
+    return {
+        "period1": int(t0.timestamp()),
+        "period2": int(time.time()),
+        "interval": interval,
+        "events": "div,splits",
+        "includeAdjustedClose": "true",
+    }
+
+
+def parse_chart(payload: dict, interval: str = "1d", auto_adjust: bool = True) -> pd.DataFrame:
+    """Yahoo chart-JSON -> OHLCV-DataFrame med samma form som yfinance ger."""
+    try:
+        res = payload["chart"]["result"][0]
+        ts = res.get("timestamp") or []
+        q = res["indicators"]["quote"][0]
+    except (KeyError, IndexError, TypeError):
+        return clean_ohlcv(None)
+    if not ts:
+        return clean_ohlcv(None)
+
+    tz = res.get("meta", {}).get("exchangeTimezoneName") or "UTC"
+    idx = pd.to_datetime(np.asarray(ts, dtype="int64"), unit="s", utc=True).tz_convert(tz)
+    if interval in ("1d", "5d", "1wk", "1mo", "3mo"):
+        idx = idx.tz_localize(None).normalize()  # yfinance ger tidszonslösa datum för dagsdata
+    cols = {c.capitalize(): np.asarray(q.get(c) or [np.nan] * len(ts), dtype=float)
+            for c in ("open", "high", "low", "close", "volume")}
+    if auto_adjust:
+        adj = res["indicators"].get("adjclose", [{}])[0].get("adjclose")
+        if adj is not None:
+            f = np.asarray(adj, dtype=float) / cols["Close"]
+            for c in ("Open", "High", "Low", "Close"):
+                cols[c] = cols[c] * f
+    df = pd.DataFrame(cols, index=pd.DatetimeIndex(idx, name="Date"))
+    return clean_ohlcv(df[~df.index.duplicated(keep="last")])
+
+
+class YahooAsyncProvider(DataProvider):
+    name = "async"
+
+    def __init__(self, rate: float = 5.0, concurrency: int = 8, timeout: float = 10.0,
+                 base_url: str = None, burst: float = None):
+        super().__init__()
+        self.fetcher = AsyncFetcher(rate=rate, burst=burst, concurrency=concurrency, timeout=timeout)
+        self.base_url = base_url or CHART_URL
+        self.errors = {}
+
+    def _fetch(self, ticker, start, interval, auto_adjust):
+        return self._fetch_many([ticker], start, interval, auto_adjust)[ticker]
+
+    def close(self):
+        self.fetcher.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _fetch_many(self, tickers, start, interval, auto_adjust):
+        params = chart_params(start, interval)
+        reqs = [(t, self.base_url.format(symbol=t), params) for t in tickers]
+        out = {}
+        for t, payload, err in _run(self.fetcher.get_json_many(reqs)):
+            if err:
+                self.errors[t] = err
+                out[t] = clean_ohlcv(None)
+            else:
+                self.errors.pop(t, None)
+                out[t] = parse_chart(payload, interval, auto_adjust)
+        return out
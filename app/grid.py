@@ -0,0 +1,146 @@
+"""
+Parametergrid i ett svep: alla kombinationer (RSI-trösklar, stopp, TP,
+trailing, tidsstopp, RSI-längd) backtestas samtidigt.
+
+Positionstillståndet för de N kombinationerna ligger i arrayer (i position,
+entrypris, högsta high, entrybar) och uppdateras vektoriserat för en bar i
+taget – barserien gås igenom en gång oavsett gridens storlek. Nyckeltalen
+ackumuleras per kombination under svepet.
+
+Semantik och nyckeltal är desamma som strategy.run_backtest på
+data.build_signals (köp RSI < rsi_buy, sälj RSI > rsi_sell, entry/exit på
+stängningen, stopp/TP intradag på nivån) och kolumnerna följer
+opt_aapl*.csv.
+"""
+import itertools
+
+import numpy as np
+import pandas as pd
+
+try:
+    from app import indicators as ind, metrics
+except ImportError:
+    import indicators as ind
+    import metrics
+
+PARAM_COLS = ["rsi_buy", "rsi_sell", "sl_fast_pct", "tp_pct", "trail_pct", "tstop_bars"]
+
+
+def combos(rsi_buy, rsi_sell, sl=(0.0,), tp=(0.0,), trail=(0.0,), tstop=(0,), rsi_len=(14,)) -> pd.DataFrame:
+    """Kartesisk produkt i samma ordning som optimize.leaderboard, utan rsi_buy >= rsi_sell."""
+    rows = [(n, rb, rs, a, b, c, d)
+            for n, rb, rs, a, b, c, d in itertools.product(rsi_len, rsi_buy, rsi_sell, sl, tp, trail, tstop)
+            if rb < rs]
+    return pd.DataFrame(rows, columns=["rsi_len"] + PARAM_COLS)
+
+
+def sample_combos(k: int, rng, rsi_buy, rsi_sell, sl=(0.0,), tp=(0.0,), trail=(0.0,), tstop=(0,),
+                  rsi_len=(14,)) -> pd.DataFrame:
+    """
+    k slumpade kombinationer ur samma produkt som combos() utan att bygga den,
+    utan återläggning och i combos()-ordning. Färre än k giltiga -> alla.
+    """
+    axes = [np.asarray(a) for a in (rsi_len, rsi_buy, rsi_sell, sl, tp, trail, tstop)]
+    sizes = tuple(len(a) for a in axes)
+    rest = int(np.prod(sizes[:1] + sizes[3:], dtype=np.int64))
+    if int((axes[1][:, None] < axes[2][None, :]).sum()) * rest <= k:
+        return combos(rsi_buy, rsi_sell, sl, tp, trail, tstop, rsi_len)
+    total = int(np.prod(sizes, dtype=np.int64))
+    picked = np.empty(0, dtype=np.int64)
+    while len(picked) < k:
+        draw = rng.integers(0, total, size=2 * (k - len(picked)))
+        ix = np.unravel_index(draw, sizes)
+        draw = draw[axes[1][ix[1]] < axes[2][ix[2]]]
+        picked = np.union1d(picked, draw)
+    picked = np.sort(rng.choice(picked, size=k, replace=False))
+    ix = np.unravel_index(picked, sizes)
+    return pd.DataFrame({c: a[i] for c, a, i in zip(["rsi_len"] + PARAM_COLS, axes, ix)})
+
+
+def grid_backtest(df: pd.DataFrame, grid: pd.DataFrame, fee_pct: float = 0.0,
+                  slippage_bps: int = 0, bank=None) -> pd.DataFrame:
+    """
+    grid: DataFrame från combos(). -> grid + nyckeltalskolumnerna, en rad per kombination.
+    bank: (längder, rsi_bank) som redan är räknad – t.ex. delad mellan
+    arbetsprocesser i optimize; annars räknas den här.
+    """
+    close = df["Close"].to_numpy(dtype=float)
+    high = df["High"].to_numpy(dtype=float) if "High" in df.columns else close
+    low = df["Low"].to_numpy(dtype=float) if "Low" in df.columns else close
+    n, M = len(close), len(grid)
+
+    if bank is None:
+        lens = sorted(grid["rsi_len"].unique())
+        R = ind.rsi_bank(close, lens)                   # (barer, längder)
+    else:
+        lens, R = bank
+    li = np.searchsorted(lens, grid["rsi_len"].to_numpy())
+    single = len(lens) == 1
+
+    rb = grid["rsi_buy"].to_numpy(dtype=float)
+    rs = grid["rsi_sell"].to_numpy(dtype=float)
+    sl = grid["sl_fast_pct"].to_numpy(dtype=float)
+    tp = grid["tp_pct"].to_numpy(dtype=float)
+    tr = grid["trail_pct"].to_numpy(dtype=float)
+    ts = grid["tstop_bars"].to_numpy(dtype=np.int64)
+    # inaktiva regler blir nivåer som aldrig nås (-inf/+inf), så att varje
+    # bar bara är några jämförelser över hela griden
+    sl_mult = np.where(sl > 0, 1 - sl / 100.0, -np.inf)
+    tp_mult = np.where(tp > 0, 1 + tp / 100.0, np.inf)
+    tr_mult = np.where(tr > 0, 1 - tr / 100.0, -np.inf)
+    hold = np.where(ts > 0, ts, np.iinfo(np.int64).max // 2)
+    slip_in, slip_out, fee2 = 1 + slippage_bps/10000, 1 - slippage_bps/10000, (fee_pct/100)*2
+
+    pos = np.zeros(M, dtype=bool)
+    ep = np.zeros(M)                    # entrypris (stängning)
+    hw = np.full(M, -np.inf)            # högsta high sedan entry
+    fixed = np.full(M, -np.inf)         # fast stoppnivå
+    tp_lvl = np.full(M, np.inf)
+    deadline = np.full(M, np.iinfo(np.int64).max)
+    no_pos = np.zeros(M, dtype=bool)
+    # ackumulerade nyckeltal
+    ntr = np.zeros(M, dtype=np.int64)
+    nwin = np.zeros(M, dtype=np.int64)
+    sum_win, sum_loss, sum_ret = np.zeros(M), np.zeros(M), np.zeros(M)
+    eq, peak, mdd = np.ones(M), np.ones(M), np.zeros(M)
+
+    for i in range(n):
+        r = R[i, 0] if single else R[i, li]
+        c, h, l = close[i], high[i], low[i]
+        done = no_pos
+
+        if pos.any():
+            np.maximum(hw, h, out=hw, where=pos)
+            stop = np.maximum(fixed, hw * tr_mult)
+            hit_stop = pos & (l <= stop)
+            done = hit_stop | (pos & ((h >= tp_lvl) | (deadline <= i) | (r > rs)))
+            if done.any():
+                e = np.flatnonzero(done)
+                raw = np.where(hit_stop[e], stop[e], np.where(h >= tp_lvl[e], tp_lvl[e], c))
+                ret = (raw * slip_out) / (ep[e] * slip_in) - 1 - fee2
+                win = ret > 0
+                ntr[e] += 1
+                nwin[e] += win
+                sum_win[e] += np.where(win, ret, 0.0)
+                sum_loss[e] += np.where(win, 0.0, ret)
+                sum_ret[e] += ret
+                eq[e] *= 1.0 + ret
+                peak[e] = np.maximum(peak[e], eq[e])
+                mdd[e] = np.minimum(mdd[e], eq[e] / peak[e] - 1.0)
+                pos[e] = False
+                hw[e] = -np.inf
+
+        enter = ~pos & ~done & (r < rb)
+        if enter.any():
+            e = np.flatnonzero(enter)
+            pos[e] = True
+            ep[e] = c
+            hw[e] = c
+            fixed[e] = c * sl_mult[e]
+            tp_lvl[e] = c * tp_mult[e]
+            deadline[e] = i + hold[e]
+
+    idx = df.index
+    out = pd.DataFrame(metrics.from_sums(ntr, nwin, sum_win, sum_loss, sum_ret, eq, mdd,
+                                         metrics.years_between(idx)))
+    return pd.concat([grid.reset_index(drop=True), out], axis=1)
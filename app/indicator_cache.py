@@ -0,0 +1,94 @@
+"""
+Memoiserade indikatorer: nyckel = innehållshash av indata + namn + parametrar.
+
+Optimeringsloopar anropar build_signals för varje kombination av trösklar,
+stopp, TP osv. men RSI:n beror bara på Close och längden – med cachen räknas
+den en gång per (serie, längd). LRU med tak på antal poster
+(INDICATOR_CACHE_SIZE, standard 256).
+
+    from app.indicator_cache import cached
+    r = cached("rsi_wilder", close, n=14)    # -> ind.rsi_wilder(close, n=14)
+
+Returnerade arrayer är skrivskyddade eftersom de delas mellan anropare.
+"""
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    from app import indicators as ind
+except ImportError:
+    import indicators as ind
+
+
+def fingerprint(*arrays) -> str:
+    """blake2b över dtype, form och bytes för varje array."""
+    h = hashlib.blake2b(digest_size=16)
+    for a in arrays:
+        a = np.ascontiguousarray(a)
+        h.update(f"{a.dtype.str}{a.shape}".encode())
+        h.update(a.data)
+    return h.hexdigest()
+
+
+def _readonly(out):
+    if isinstance(out, tuple):
+        return tuple(_readonly(o) for o in out)
+    if isinstance(out, np.ndarray):
+        out.setflags(write=False)
+    return out
+
+
+class IndicatorCache:
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = max(0, int(maxsize))
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        self._data.clear()
+        self.hits = self.misses = 0
+
+    @staticmethod
+    def _key(name, arrays, params):
+        return name, fingerprint(*arrays), tuple(sorted(params.items()))
+
+    def put(self, name: str, *arrays, value, **params):
+        """Lägg in ett redan beräknat värde (t.ex. en kolumn ur indicators.rsi_bank)."""
+        arrays = tuple(np.asarray(a, dtype=np.float64) for a in arrays)
+        if self.maxsize:
+            self._data[self._key(name, arrays, params)] = _readonly(np.array(value, dtype=np.float64))
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get(self, name: str, *arrays, fn=None, **params):
+        """
+        Värdet för fn(*arrays, **params); fn är som standard indicators.<name>.
+        Arrayerna konverteras till float64 innan de hashas.
+        """
+        arrays = tuple(np.asarray(a, dtype=np.float64) for a in arrays)
+        key = self._key(name, arrays, params)
+        if key in self._data:
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key]
+        self.misses += 1
+        out = _readonly((fn or getattr(ind, name))(*arrays, **params))
+        if self.maxsize:
+            self._data[key] = out
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return out
+
+
+CACHE = IndicatorCache(int(os.getenv("INDICATOR_CACHE_SIZE", "256")))
+
+
+def cached(name: str, *arrays, fn=None, **params):
+    return CACHE.get(name, *arrays, fn=fn, **params)
@@ -0,0 +1,347 @@
+"""
+Gemensamma indikatorkärnor (NumPy) – ersätter kopiorna av rsi/macd/atr i skripten.
+
+Alla funktioner tar råa arrayer (1D, eller 2D där tiden är axel 0 och
+kolumnerna är serier) och returnerar float64-arrayer av samma form.
+Värdena matchar pandas-varianterna de ersätter:
+
+    ema        == s.ewm(span=span, adjust=False).mean()
+    rsi_wilder == Wilder-RSI via ewm(alpha=1/n) (strategy/ericsson/bt_*)
+    rsi_sma    == RSI på rullande medel (alert_*, trading_bot, backtest.rsi_series)
+    sma        == s.rolling(n).mean()
+    atr        == rullande medel av true range (bt_*)
+
+Parameterbankar (ema_bank, rsi_bank, macd_bank) ger barer × parametervärden
+i en genomgång av prisarrayen – kolumn k är identisk med motsvarande
+enkelanrop med parameter k.
+
+Inledande NaN (t.ex. första diff) hoppas över som i pandas; NaN mitt i
+serien stöds inte – datan är dropna:ad i get_data.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    from app import accel
+except ImportError:
+    import accel
+
+_MAX_GROWTH = 150 * np.log(10.0)  # blocklängd så att (1-a)^-L < 1e150
+
+
+def _f64(x) -> np.ndarray:
+    return np.asarray(x, dtype=np.float64)
+
+
+@accel.kernel
+def _ema_loop(x, alpha, y0, out):
+    """Rak rekursion över 2D (barer, kolumner) – för numba-backenden."""
+    n, k = x.shape
+    for c in range(k):
+        a = alpha[c]
+        y = y0[c]
+        for t in range(n):
+            y = y + a * (x[t, c] - y)
+            out[t, c] = y
+    return out
+
+
+def _block_len(alpha) -> int:
+    """Blocklängd för _ema_core (oberoende av seriens längd; stor om a är 0)."""
+    b = 1.0 - np.asarray(alpha, dtype=np.float64)
+    bmin = float(np.min(np.where(b > 0.0, b, 1.0)))
+    return np.iinfo(np.int64).max if bmin >= 1.0 else int(max(1, _MAX_GROWTH // -np.log(bmin)))
+
+
+def _ema_core(x: np.ndarray, alpha, y0) -> np.ndarray:
+    """
+    y[t] = (1-a)*y[t-1] + a*x[t] med y[-1] = y0, utan Python-loop per bar.
+    Löses blockvis i sluten form: y_j = b^(j+1)*y0 + a*b^j*cumsum(x_i*b^-i),
+    b = 1-a. Blocklängden hålls så kort att b^-L inte spricker.
+    Med numba-backenden (app/accel.py) körs rekursionen i stället som loop.
+    """
+    n = len(x)
+    out = np.empty(x.shape, dtype=np.float64)
+    if n == 0:
+        return out
+    if accel.active() == "numba":
+        x2 = np.ascontiguousarray(x, dtype=np.float64).reshape(n, -1)
+        k = x2.shape[1]
+        a = np.ascontiguousarray(np.broadcast_to(np.asarray(alpha, dtype=np.float64), (k,)))
+        y = np.ascontiguousarray(np.broadcast_to(np.asarray(y0, dtype=np.float64), (k,)))
+        return _ema_loop(x2, a, y, np.empty((n, k))).reshape(x.shape)
+    alpha = np.asarray(alpha, dtype=np.float64)
+    b = 1.0 - alpha
+    if np.all(b == 0.0):
+        out[:] = x
+        return out
+    L = min(n, _block_len(alpha))
+    b = np.where(b > 0.0, b, np.finfo(np.float64).tiny)
+    j = np.arange(L, dtype=np.float64).reshape((L,) + (1,) * (x.ndim - 1))
+    pow_j = b ** j
+    pow_j1 = pow_j * b
+    inv_j = b ** -j
+    y = y0
+    for s in range(0, n, L):
+        xs = x[s:s + L]
+        m = len(xs)
+        c = np.cumsum(xs * inv_j[:m], axis=0)
+        ys = pow_j1[:m] * y + alpha * pow_j[:m] * c
+        out[s:s + m] = ys
+        y = ys[-1]
+    return out
+
+
+def ewm(x, alpha) -> np.ndarray:
+    """Exponentiellt medel (adjust=False) som startar vid första giltiga värdet."""
+    x = _f64(x)
+    out = np.full(x.shape, np.nan)
+    if x.ndim == 1:
+        ok = np.flatnonzero(~np.isnan(x))
+        if len(ok):
+            f = ok[0]
+            out[f] = x[f]
+            out[f + 1:] = _ema_core(x[f + 1:], alpha, x[f])
+        return out
+    first = np.argmax(~np.isnan(x), axis=0)
+    valid = ~np.isnan(x).all(axis=0)
+    if valid.all() and (first == first[0]).all():
+        f = first[0]
+        out[f] = x[f]
+        out[f + 1:] = _ema_core(x[f + 1:], alpha, x[f])
+        return out
+    a = np.broadcast_to(np.asarray(alpha, dtype=np.float64), x.shape[1:])
+    for k in np.flatnonzero(valid):
+        out[:, k] = ewm(x[:, k], a[k])
+    return out
+
+
+def ewm_chunk(x, alpha, carry: dict = None):
+    """
+    ewm (1D) för en bit av en längre serie. carry från föregående bit (None
+    för första) -> (värden för biten, ny carry). Bitarna ihopsatta är
+    bitidentiska med ewm över hela serien: _ema_core löser blockvis, så
+    carry håller värdet vid senaste blockgräns plus råvärdena i det
+    påbörjade blocket (högst _block_len(alpha) st), som räknas om med nästa bit.
+    """
+    x = _f64(x)
+    out = np.full(x.shape, np.nan)
+    y, tail = (None, np.empty(0)) if carry is None else (carry["y"], carry["tail"])
+    start = 0
+    if y is None:
+        ok = np.flatnonzero(~np.isnan(x))
+        if not len(ok):
+            return out, {"y": None, "tail": tail}
+        start = ok[0] + 1
+        y = out[ok[0]] = x[ok[0]]
+    ext = np.concatenate([tail, x[start:]])
+    if len(ext):
+        res = _ema_core(ext, alpha, y)
+        out[start:] = res[len(tail):]
+        L = _block_len(alpha)
+        full = len(ext) // L * L
+        if full:
+            y = res[full - 1]
+        tail = ext[full:].copy()
+    return out, {"y": y, "tail": tail}
+
+
+def ema(x, span) -> np.ndarray:
+    return ewm(x, 2.0 / (np.asarray(span, dtype=np.float64) + 1.0))
+
+
+def macd(x, fast: int = 12, slow: int = 26, signal: int = 9):
+    """(macd_line, signal_line, hist)"""
+    line = ema(x, fast) - ema(x, slow)
+    sig = ema(line, signal)
+    return line, sig, line - sig
+
+
+def ema_bank(x, spans) -> np.ndarray:
+    """EMA för flera spans: (barer, len(spans))."""
+    x = _f64(x)
+    spans = np.asarray(spans, dtype=np.float64).ravel()
+    return ewm(np.repeat(x[:, None], len(spans), axis=1), 2.0 / (spans + 1.0))
+
+
+def macd_bank(x, fast=(12,), slow=(26,), signal=(9,)):
+    """
+    MACD för alla kombinationer (fast, slow, signal) med fast < slow.
+    -> (combos, line, sig, hist) där combos är listan av tupler i kolumnordning.
+    EMA:erna räknas en gång per unik span.
+    """
+    combos = [(f, s, g) for f in fast for s in slow for g in signal if f < s]
+    spans = sorted({f for f, _, _ in combos} | {s for _, s, _ in combos})
+    col = {s: k for k, s in enumerate(spans)}
+    e = ema_bank(x, spans)
+    line = np.stack([e[:, col[f]] - e[:, col[s]] for f, s, _ in combos], axis=1) if combos \
+        else np.empty((len(e), 0))
+    sig = ema(line, np.array([g for _, _, g in combos], dtype=np.float64))
+    return combos, line, sig, line - sig
+
+
+def _diff(x: np.ndarray, zero_first: bool = False) -> np.ndarray:
+    d = np.empty(x.shape, dtype=np.float64)
+    d[0] = 0.0 if zero_first else np.nan
+    d[1:] = x[1:] - x[:-1]
+    return d
+
+
+def _gains_losses(x, zero_first=False):
+    d = _diff(_f64(x), zero_first)
+    with np.errstate(invalid="ignore"):
+        gain = np.where(d > 0, d, np.where(np.isnan(d), np.nan, 0.0))
+        loss = np.where(d < 0, -d, np.where(np.isnan(d), np.nan, 0.0))
+    return gain, loss
+
+
+def _rsi_from(avg_gain, avg_loss, nan_on_zero_loss):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = avg_gain / avg_loss
+        out = 100.0 - 100.0 / (1.0 + rs)
+    if nan_on_zero_loss:
+        out[avg_loss == 0] = np.nan
+    return out
+
+
+def rsi_wilder(x, n: int = 14, nan_on_zero_loss: bool = True) -> np.ndarray:
+    """Wilder-RSI (ewm alpha=1/n). NaN där snittförlusten är 0, som replace(0, NaN) i kopiorna."""
+    gain, loss = _gains_losses(x)
+    return _rsi_from(ewm(gain, 1.0 / n), ewm(loss, 1.0 / n), nan_on_zero_loss)
+
+
+def rsi_wilder_chunk(x, n: int = 14, nan_on_zero_loss: bool = True, carry: dict = None):
+    """rsi_wilder bit för bit (se ewm_chunk): -> (värden för biten, ny carry)."""
+    x = _f64(x)
+    carry = carry or {"prev": None, "gain": None, "loss": None}
+    if carry["prev"] is None:
+        gain, loss = _gains_losses(x)
+    else:
+        gain, loss = _gains_losses(np.concatenate([[carry["prev"]], x]))
+        gain, loss = gain[1:], loss[1:]
+    g, cg = ewm_chunk(gain, 1.0 / n, carry["gain"])
+    l, cl = ewm_chunk(loss, 1.0 / n, carry["loss"])
+    prev = x[-1] if len(x) else carry["prev"]
+    return _rsi_from(g, l, nan_on_zero_loss), {"prev": prev, "gain": cg, "loss": cl}
+
+
+def rsi_sma(x, n: int = 14, zero_first: bool = False, nan_on_zero_loss: bool = False) -> np.ndarray:
+    """
+    RSI på rullande medel av vinster/förluster.
+    zero_first=True: första diffen räknas som 0 (np.where-varianten i alert-skripten).
+    nan_on_zero_loss=True: NaN i stället för 100 när snittförlusten är 0 (backtest.rsi_series).
+    """
+    gain, loss = _gains_losses(x, zero_first)
+    return _rsi_from(sma(gain, n), sma(loss, n), nan_on_zero_loss)
+
+
+def rsi_bank(x, lengths, kind: str = "wilder", **kw) -> np.ndarray:
+    """
+    RSI för flera längder: (barer, len(lengths)). kind="wilder" ger
+    rsi_wilder-kolumner, kind="sma" rsi_sma-kolumner (kw: zero_first,
+    nan_on_zero_loss som i enkelfunktionerna).
+    """
+    lengths = [int(n) for n in np.asarray(lengths).ravel()]
+    if kind == "wilder":
+        gain, loss = _gains_losses(x)
+        k = len(lengths)
+        a = 1.0 / np.asarray(lengths, dtype=np.float64)
+        g = ewm(np.repeat(gain[:, None], k, axis=1), a)
+        l = ewm(np.repeat(loss[:, None], k, axis=1), a)
+        return _rsi_from(g, l, kw.get("nan_on_zero_loss", True))
+    if kind == "sma":
+        gain, loss = _gains_losses(x, kw.get("zero_first", False))
+        return _rsi_from(_sma_bank(gain, lengths), _sma_bank(loss, lengths), kw.get("nan_on_zero_loss", False))
+    raise ValueError(f"Okänd RSI-typ: {kind}")
+
+
+def _block_prefix(x: np.ndarray, B: int) -> np.ndarray:
+    N = len(x)
+    nb = -(-N // B)
+    xp = np.zeros((nb * B,) + x.shape[1:])
+    xp[:N] = x
+    return np.cumsum(xp.reshape((nb, B) + x.shape[1:]), axis=1)
+
+
+def _rolling_sum(x: np.ndarray, n: int, P: np.ndarray = None) -> np.ndarray:
+    """
+    Rullande summa via prefixsummor som startar om i block om B >= n barer,
+    så att avrundningsfelet beror på B och inte på seriens längd. P kan
+    återanvändas mellan fönsterlängder (se _sma_bank).
+    """
+    N = len(x)
+    if P is None:
+        P = _block_prefix(x, max(n, 1024))
+    B = P.shape[1]
+    out = np.empty_like(P)
+    if B > n:
+        out[:, n:] = P[:, n:] - P[:, :-n]
+    out[:, n - 1] = P[:, n - 1]
+    if n > 1:
+        # fönstret sträcker sig in i föregående block
+        o = np.arange(n - 1)
+        out[1:, :n - 1] = P[1:, :n - 1] + (P[:-1, -1:] - P[:-1, B - n + o])
+        out[0, :n - 1] = np.nan
+    return out.reshape((-1,) + x.shape[1:])[:N]
+
+
+def sma(x, n: int) -> np.ndarray:
+    x = _f64(x)
+    out = np.full(x.shape, np.nan)
+    if n <= 0 or len(x) < n:
+        return out
+    bad = np.isnan(x)
+    s = _rolling_sum(np.where(bad, 0.0, x), n)
+    if bad.any():
+        s[_rolling_sum(bad.astype(np.float64), n) > 0] = np.nan  # som min_periods=n
+    out[n - 1:] = s[n - 1:] / n
+    return out
+
+
+def _sma_bank(x: np.ndarray, lengths) -> np.ndarray:
+    """sma för flera längder ur en och samma blockade prefixsumma."""
+    x = _f64(x)
+    out = np.full((len(x), len(lengths)), np.nan)
+    bad = np.isnan(x)
+    clean = np.where(bad, 0.0, x)
+    B = max(max(lengths, default=1), 1024)
+    P = _block_prefix(clean, B)
+    Pb = _block_prefix(bad.astype(np.float64), B) if bad.any() else None
+    for k, n in enumerate(lengths):
+        if n <= 0 or len(x) < n:
+            continue
+        s = _rolling_sum(clean, n, P)
+        if Pb is not None:
+            s[_rolling_sum(bad, n, Pb) > 0] = np.nan
+        out[n - 1:, k] = s[n - 1:] / n
+    return out
+
+
+def rolling_max(x, n: int) -> np.ndarray:
+    return _rolling(x, n, np.max)
+
+
+def rolling_min(x, n: int) -> np.ndarray:
+    return _rolling(x, n, np.min)
+
+
+def _rolling(x, n, fn) -> np.ndarray:
+    x = _f64(x)
+    out = np.full(x.shape, np.nan)
+    if n <= 0 or len(x) < n:
+        return out
+    out[n - 1:] = fn(sliding_window_view(x, n, axis=0), axis=-1)
+    return out
+
+
+def true_range(high, low, close) -> np.ndarray:
+    h, l, c = _f64(high), _f64(low), _f64(close)
+    pc = np.empty_like(c)
+    pc[0] = np.nan
+    pc[1:] = c[:-1]
+    # fmax hoppar över NaN som pandas max(axis=1) – första baren blir h-l
+    return np.fmax(h - l, np.fmax(np.abs(h - pc), np.abs(l - pc)))
+
+
+def atr(high, low, close, n: int = 14) -> np.ndarray:
+    return sma(true_range(high, low, close), n)
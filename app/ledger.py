@@ -0,0 +1,168 @@
+"""
+Kolumnär affärsliggare: en förallokerad, växande strukturerad array i
+stället för en dict per affär.
+
+    entry_i, exit_i (-1 = öppen)   int64   globala barindex
+    entry_px, exit_px              float64
+    qty                            float64
+    reason                         int8    exits.REASONS
+    pnl                            float64 avkastning eller kronor, enligt motorn
+
+DataFrames byggs först när de efterfrågas (to_frame / to_rows / curve) och
+KÖP/SÄLJ-raden formateras först när den skrivs ut (parts / transline).
+"""
+import numpy as np
+import pandas as pd
+
+try:
+    from app import exits
+except ImportError:
+    import exits
+
+TRADE_DTYPE = np.dtype([("entry_i", np.int64), ("exit_i", np.int64), ("entry_px", np.float64),
+                        ("exit_px", np.float64), ("qty", np.float64), ("reason", np.int8),
+                        ("pnl", np.float64)])
+
+
+class TradeLedger:
+    __slots__ = ("_a", "n")
+
+    def __init__(self, capacity: int = 64):
+        self._a = np.empty(max(1, int(capacity)), dtype=TRADE_DTYPE)
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def data(self) -> np.ndarray:
+        """Vy över de ifyllda raderna (ingen kopia)."""
+        return self._a[:self.n]
+
+    def __getitem__(self, col: str) -> np.ndarray:
+        return self._a[col][:self.n]
+
+    @property
+    def closed(self) -> np.ndarray:
+        return self["exit_i"] >= 0
+
+    def _reserve(self, k: int):
+        need = self.n + k
+        if need > len(self._a):
+            a = np.empty(max(need, 2 * len(self._a)), dtype=TRADE_DTYPE)
+            a[:self.n] = self._a[:self.n]
+            self._a = a
+
+    def append(self, entry_i, exit_i, entry_px, exit_px=np.nan, qty=1.0, reason=exits.SIGNAL, pnl=np.nan):
+        self._reserve(1)
+        self._a[self.n] = (entry_i, exit_i, entry_px, exit_px, qty, reason, pnl)
+        self.n += 1
+
+    def extend(self, entry_i, exit_i, entry_px, exit_px, qty=1.0, reason=exits.SIGNAL, pnl=np.nan):
+        """Lägg till många affärer på en gång (arrayer eller skalärer som sprids ut)."""
+        k = len(np.atleast_1d(entry_i))
+        if not k:
+            return
+        self._reserve(k)
+        s = self._a[self.n:self.n + k]
+        s["entry_i"], s["exit_i"] = entry_i, exit_i
+        s["entry_px"], s["exit_px"] = entry_px, exit_px
+        s["qty"], s["reason"], s["pnl"] = qty, reason, pnl
+        self.n += k
+
+    @classmethod
+    def from_exits(cls, res: dict, fee_pct: float = 0.0) -> "TradeLedger":
+        """
+        run_exits-resultat -> liggare. pnl i kronor efter courtage per sida,
+        som bt_*-skriptens kapitalräkning (NaN för öppen position).
+        """
+        led = cls(len(res["entry_i"]))
+        fee = fee_pct / 100.0
+        ep, xp, q = res["entry_px"], res["exit_px"], np.floor(res["qty"])
+        pnl = np.where(res["exit_i"] >= 0, ((xp - xp * fee) - (ep + ep * fee)) * q, np.nan)
+        led.extend(res["entry_i"], res["exit_i"], ep, xp, q, res["reason"], pnl)
+        return led
+
+    # ---------- kapital ----------
+
+    def capital_path(self):
+        """
+        (initial_capital, kapital efter varje stängd affär) – startkapitalet är
+        första affärens qty * entrypris. (None, tom) utan affärer.
+        """
+        if not self.n:
+            return None, np.empty(0)
+        initial = float(self["qty"][0] * self["entry_px"][0])
+        return initial, np.cumsum(np.concatenate([[initial], self["pnl"][self.closed]]))[1:]
+
+    def final_capital(self):
+        initial, path = self.capital_path()
+        return float(path[-1]) if len(path) else initial
+
+    # ---------- utdata, på begäran ----------
+
+    def parts(self, dates):
+        """KÖP/SÄLJ-delarna i tidsordning, formaterade en i taget."""
+        d = self.data
+        for ei, xi, ep, xp, q in zip(d["entry_i"], d["exit_i"], d["entry_px"], d["exit_px"], d["qty"]):
+            yield f"{dates[ei].date()} KÖP {int(q)} st @ {ep:.2f}"
+            if xi >= 0:
+                yield f"{dates[xi].date()} SÄLJ {int(q)} st @ {xp:.2f}"
+
+    def transline(self, dates) -> str:
+        line = " ".join(self.parts(dates))
+        capital = self.final_capital()
+        if capital is not None:
+            line += f" Slutligt kapital: {capital:.2f}"
+        return line
+
+    def to_frame(self, dates) -> pd.DataFrame:
+        """Stängda affärer: entry_date, entry_price, exit_date, exit_price, qty, reason."""
+        d = self.data[self.closed]
+        day = lambda i: pd.DatetimeIndex(np.asarray(dates, dtype=object)[i]).date if len(i) else []
+        return pd.DataFrame({
+            "entry_date": day(d["entry_i"]),
+            # round() per värde som tidigare – np.round kan skilja i sista biten
+            "entry_price": [round(float(x), 4) for x in d["entry_px"]],
+            "exit_date": day(d["exit_i"]),
+            "exit_price": [round(float(x), 4) for x in d["exit_px"]],
+            "qty": d["qty"].astype(np.int64),
+            "reason": [exits.REASONS[int(r)] for r in d["reason"]],
+        })
+
+    def curve(self, dates) -> pd.DataFrame:
+        """Kapital efter varje stängd affär: date, capital."""
+        _, path = self.capital_path()
+        xi = self["exit_i"][self.closed]
+        return pd.DataFrame({"date": pd.DatetimeIndex(np.asarray(dates, dtype=object)[xi]).date if len(xi) else [],
+                             "capital": path})
+
+    def to_rows(self, dates, reason: bool = False) -> pd.DataFrame:
+        """
+        KÖP/SÄLJ-rader omväxlande som strategy.run_backtest: Type, Date, Price,
+        PnL (om någon affär är stängd) och ev. Reason. dates är ett index
+        eller en funktion barindex -> tidsstämplar.
+        """
+        d = self.data
+        if not self.n:
+            return pd.DataFrame([])
+        closed = d["exit_i"] >= 0
+        first = np.arange(self.n) + np.concatenate([[0], np.cumsum(closed)[:-1]])
+        second = first[closed] + 1
+        m = self.n + int(closed.sum())
+        pos = np.empty(m, dtype=np.int64)
+        pos[first], pos[second] = d["entry_i"], d["exit_i"][closed]
+        prices = np.empty(m)
+        prices[first], prices[second] = d["entry_px"], d["exit_px"][closed]
+        types = np.empty(m, dtype=object)
+        types[first], types[second] = "BUY", "SELL"
+        cols = {"Type": types.tolist(), "Date": dates(pos) if callable(dates) else dates[pos], "Price": prices}
+        if closed.any():
+            pnl = np.full(m, np.nan)
+            pnl[second] = d["pnl"][closed]
+            cols["PnL"] = pnl
+        if reason:
+            why = np.full(m, "", dtype=object)
+            why[second] = [exits.REASONS[int(r)] for r in d["reason"][closed]]
+            cols["Reason"] = why
+        return pd.DataFrame(cols)
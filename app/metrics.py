@@ -0,0 +1,126 @@
+"""
+Nyckeltal för många körningar på en gång.
+
+Indata är en ojämn (ragged) array med affärsavkastningar – values för alla
+körningar efter varandra och offsets där körning k är
+values[offsets[k]:offsets[k+1]] – plus valfritt en equity-matris (tid ×
+körningar). Utan equity-matris byggs equity per affär som i
+strategy.run_backtest: cumprod av 1 + avkastning, med 1.0 först.
+
+Kolumnerna är desamma som i optimize-CSV:erna (STAT_COLS) och
+strategy.stats är samma beräkning för en enda körning.
+"""
+import numpy as np
+import pandas as pd
+
+STAT_COLS = ["trades", "total_return_pct", "cagr_pct", "winrate_pct", "profit_factor",
+             "expectancy_pct_per_trade", "max_drawdown_pct", "avg_win_pct", "avg_loss_pct"]
+
+
+def ragged(runs) -> tuple:
+    """Lista av avkastningsarrayer -> (offsets, values)."""
+    runs = [np.asarray(r, dtype=np.float64).ravel() for r in runs]
+    offsets = np.zeros(len(runs) + 1, dtype=np.int64)
+    np.cumsum([len(r) for r in runs], out=offsets[1:])
+    values = np.concatenate(runs) if runs else np.empty(0)
+    return offsets, values
+
+
+def years_between(index) -> float:
+    return (index[-1] - index[0]).days / 365.25 if len(index) > 1 else 0.0
+
+
+def trade_sums(offsets, values):
+    """-> (ntr, nwin, sum_win, sum_loss, sum_ret) per körning (vinst = avkastning > 0)."""
+    offsets = np.asarray(offsets, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    R = len(offsets) - 1
+    ntr = np.diff(offsets)
+    run = np.repeat(np.arange(R), ntr)
+    win = values > 0
+    nwin = np.bincount(run, weights=win, minlength=R).astype(np.int64)
+    sum_win = np.bincount(run, weights=np.where(win, values, 0.0), minlength=R)
+    sum_loss = np.bincount(run, weights=np.where(win, 0.0, values), minlength=R)
+    sum_ret = np.bincount(run, weights=values, minlength=R)
+    return ntr, nwin, sum_win, sum_loss, sum_ret
+
+
+def trade_equity(offsets, values) -> np.ndarray:
+    """
+    Equity per affär för alla körningar: (längsta körning + 1, körningar),
+    1.0 på första raden. Kortare körningar ligger kvar på sitt slutvärde,
+    vilket varken ändrar slutvärde eller drawdown.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    ntr = np.diff(offsets)
+    R = len(ntr)
+    growth = np.ones((int(ntr.max(initial=0)) + 1, R))
+    run = np.repeat(np.arange(R), ntr)
+    step = np.arange(len(values)) - np.repeat(offsets[:-1], ntr)
+    growth[step + 1, run] = 1.0 + np.asarray(values, dtype=np.float64)
+    return np.cumprod(growth, axis=0)
+
+
+def max_drawdown(equity) -> np.ndarray:
+    """Största fall från toppen (negativt, andel) längs tidsaxeln."""
+    eq = np.asarray(equity, dtype=np.float64)
+    return (eq / np.maximum.accumulate(eq, axis=0) - 1.0).min(axis=0)
+
+
+def cagr(final, years) -> np.ndarray:
+    final = np.asarray(final, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        grown = np.where(final > 0, np.abs(final) ** (1 / np.where(years > 0, years, 1.0)) - 1.0, -1.0)
+    return np.where(np.asarray(years) > 0, grown, 0.0)
+
+
+def from_sums(ntr, nwin, sum_win, sum_loss, sum_ret, final, mdd, years) -> dict:
+    """Nyckeltalen (kolumn -> array) ur ackumulerade summor, som grid_backtest samlar under svepet."""
+    nloss = ntr - nwin
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pf = np.where(sum_loss < 0, sum_win / -sum_loss, np.where(nwin > 0, np.inf, np.nan))
+        pf = np.where(ntr > 0, pf, np.nan)
+        return {
+            "trades": ntr,
+            "total_return_pct": (final - 1.0) * 100.0,
+            "cagr_pct": cagr(final, years) * 100.0,
+            "winrate_pct": np.where(ntr > 0, nwin / ntr * 100.0, 0.0),
+            "profit_factor": pf,
+            "expectancy_pct_per_trade": np.where(ntr > 0, sum_ret / ntr * 100.0, 0.0),
+            "max_drawdown_pct": mdd * 100.0,
+            "avg_win_pct": np.where(nwin > 0, sum_win / nwin * 100.0, np.nan),
+            "avg_loss_pct": np.where(nloss > 0, sum_loss / nloss * 100.0, np.nan),
+        }
+
+
+def compute(offsets, values, years, equity=None) -> dict:
+    """
+    Alla leaderboard-nyckeltal för len(offsets)-1 körningar i ett anrop.
+    years: skalär eller en per körning. equity: (tid, körningar) eller None
+    för equity per affär. -> kolumn -> array.
+    """
+    if equity is None:
+        equity = trade_equity(offsets, values)
+    equity = np.asarray(equity, dtype=np.float64)
+    return from_sums(*trade_sums(offsets, values), equity[-1], max_drawdown(equity), years)
+
+
+def compute_matrix(rets, years) -> dict:
+    """
+    Som compute() när alla körningar har lika många affärer: rets är
+    (körningar, affärer). Summerar längs raderna utan ragged-indexering –
+    snabbvägen för bootstrap-vägar (app/robustness.py).
+    """
+    R = np.asarray(rets, dtype=np.float64)
+    eq = np.cumprod(1.0 + R, axis=1)
+    peak = np.maximum(np.maximum.accumulate(eq, axis=1), 1.0)
+    mdd = np.minimum((eq / peak - 1.0).min(axis=1, initial=0.0), 0.0)
+    win = R > 0
+    return from_sums(np.full(len(R), R.shape[1]), win.sum(axis=1), np.where(win, R, 0.0).sum(axis=1),
+                     np.where(win, 0.0, R).sum(axis=1), R.sum(axis=1),
+                     eq[:, -1] if R.shape[1] else np.ones(len(R)), mdd, years)
+
+
+def table(offsets, values, years, equity=None) -> pd.DataFrame:
+    """compute() som DataFrame med STAT_COLS, en rad per körning."""
+    return pd.DataFrame(compute(offsets, values, years, equity), columns=STAT_COLS)
@@ -3,12 +3,15 @@
 TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "").strip()
 CHAT  = os.getenv("TELEGRAM_CHAT_ID", "").strip()
 
+# En session per process -> keep-alive, ingen ny TLS-anslutning per meddelande
+_SESSION = requests.Session()
+
 def send_telegram(text: str) -> bool:
     if not TOKEN or not CHAT:
         print(f"[notify ✖] Telegram ej konfigurerat. Meddelande bara i logg:\n{text}")
         return False
     try:
-        r = requests.post(
+        r = _SESSION.post(
             f"https://api.telegram.org/bot{TOKEN}/sendMessage",
             json={"chat_id": CHAT, "text": text},
             timeout=10
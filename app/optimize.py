@@ -1,11 +1,22 @@
 import argparse
 import itertools
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
+import numpy as np
 import pandas as pd
 
-from app.data import get_data
-from app.strategy import build_signals
-from app.backtest import run_backtest
+from app.data import get_data, build_signals
+from app import indicators as ind
+from app.indicator_cache import CACHE
+from app import metrics, shared
+from app.grid import PARAM_COLS, combos, grid_backtest, sample_combos
+from app.prune import prune as prune_combos
+from app.providers import get_provider
+from app.robustness import METHODS, leaderboard_bands
+from app.strategy import run_backtest
 
 
 # -------- Helpers för att tolka intervall --------
@@ -61,19 +72,94 @@ def leaderboard(
     max_dd_pct=50.0,
     min_pf=1.0,
     sort_by="cagr_pct",
+    rsi_len_list=None, # RSI-längder (None = bara 14, ingen rsi_len-kolumn)
+    engine="grid",     # grid = alla kombinationer i ett svep (app/grid.py), loop = en backtest per kombination
+    workers=1,         # > 1: processpool med priser/RSI i delat minne
+    prune=True,        # gallra kombinationer som inte kan nå min_trades före backtest (app/prune.py)
 ):
-    if tp_list is None: tp_list = [0.0]
-    if trail_list is None: trail_list = [0.0]
-    if tstop_list is None: tstop_list = [0]
-
-    rows = []
-    for rb, rs, sl, tp, tr, ts in itertools.product(
-        rsi_buy_range, rsi_sell_range, sl_list, tp_list, trail_list, tstop_list
-    ):
-        if rb >= rs:
-            continue
-
-        sig = build_signals(df, rsi_buy=rb, rsi_sell=rs)
+    """
+    Leaderboard över alla kombinationer som klarar kriterierna. Antalet
+    bortgallrade kombinationer per steg ligger i df_lead.attrs["pruned"].
+    """
+    space, with_len = _space(rsi_buy_range, rsi_sell_range, sl_list, tp_list, trail_list, tstop_list,
+                             rsi_len_list)
+    if engine not in ("grid", "loop"):
+        raise ValueError(f"Okänd motor: {engine}")
+    g = combos(**space)
+    bank = _bank(df, space["rsi_len"])
+    g, report = prune_combos(g, bank, min_trades if prune else 0, _total(space))
+    if g.empty:
+        return _with_report(pd.DataFrame(), report)
+    res = _evaluate(df, g, bank, engine, fee_pct, slippage_bps, workers)
+    if not with_len:
+        res = res.drop(columns="rsi_len")
+    return _with_report(_filter_sort(res, min_trades, max_dd_pct, min_pf, sort_by), report)
+
+
+def _space(rsi_buy_range, rsi_sell_range, sl_list, tp_list=None, trail_list=None, tstop_list=None,
+           rsi_len_list=None):
+    """Parameterlistorna med standardvärden, som nyckelord till combos(). -> (space, with_len)."""
+    space = dict(rsi_buy=rsi_buy_range, rsi_sell=rsi_sell_range, sl=sl_list,
+                 tp=[0.0] if tp_list is None else tp_list,
+                 trail=[0.0] if trail_list is None else trail_list,
+                 tstop=[0] if tstop_list is None else tstop_list,
+                 rsi_len=[14] if rsi_len_list is None else rsi_len_list)
+    return space, rsi_len_list is not None
+
+
+def _total(space) -> int:
+    """Storleken på hela produkten, före rb >= rs."""
+    return int(np.prod([len(v) for v in space.values()]))
+
+
+def _bank(df, rsi_len_list):
+    # alla RSI-längder i en genomgång – delas av båda motorerna (och arbetsprocesserna)
+    lens = np.array(sorted({int(n) for n in rsi_len_list}), dtype=np.int64)
+    return lens, ind.rsi_bank(df["Close"].to_numpy(dtype="float64"), lens)
+
+
+def _evaluate(df, g, bank, engine, fee_pct, slippage_bps, workers) -> pd.DataFrame:
+    """g + nyckeltal för varje kombination, med vald motor, seriellt eller i processpool."""
+    run = _grid_chunk if engine == "grid" else _loop_chunk
+    if workers > 1 and len(g) > 1:
+        return _parallel(run, df, g, bank, fee_pct, slippage_bps, workers)
+    return run(df, g, bank, fee_pct, slippage_bps)
+
+
+def _with_report(df_lead: pd.DataFrame, report: dict) -> pd.DataFrame:
+    df_lead.attrs["pruned"] = report
+    return df_lead
+
+
+def print_report(df_lead: pd.DataFrame):
+    """Gallring (och för halving/random sökstegen) som leaderboard-funktionerna lagt i attrs."""
+    report = df_lead.attrs.get("pruned")
+    if report:
+        print("Bortgallrade kombinationer före backtest: " + ", ".join(f"{k} {v}" for k, v in report.items()))
+    info = df_lead.attrs.get("search")
+    if info and "rounds" in info:
+        print(f"Förfining: {' -> '.join(map(str, info['rounds']))} nya kombinationer per varv, "
+              f"{info['stop']} ({info['seconds']:.1f}s)")
+    elif info:
+        steps = " -> ".join(f"{m} på {bars} barer" for bars, m in info["rungs"])
+        print(f"Sökning ({info['method']}): {steps} ({info['seconds']:.1f}s)")
+
+
+def _grid_chunk(df, g, bank, fee_pct, slippage_bps) -> pd.DataFrame:
+    return grid_backtest(df, g, fee_pct=fee_pct, slippage_bps=slippage_bps, bank=bank)
+
+
+def _loop_chunk(df, g, bank, fee_pct, slippage_bps) -> pd.DataFrame:
+    """En backtest per kombination; nyckeltalen för alla i ett anrop (app/metrics.py)."""
+    # RSI-banken -> indikatorcachen, som build_signals läser
+    close = df["Close"].to_numpy(dtype="float64")
+    lens, R = bank
+    for k, n in enumerate(lens):
+        CACHE.put("rsi_wilder", close, value=R[:, k], n=int(n))
+
+    rets = []
+    for n, rb, rs, sl, tp, tr, ts in g.itertuples(index=False):
+        sig = build_signals(df, rsi_buy=rb, rsi_sell=rs, rsi_len=int(n))
         res = run_backtest(
             sig,
             fee_pct=fee_pct,
@@ -81,35 +167,299 @@ def leaderboard(
             stop_pct=sl,
             tp_pct=tp,
             trail_pct=tr,
-            time_stop=ts,
+            time_stop=int(ts),
         )
-        s = res["stats"]
+        rets.append(res["returns"])
 
-        # filter
-        if s["trades"] < min_trades:
-            continue
-        if s["max_drawdown_pct"] > max_dd_pct:
-            continue
-        pf = s["profit_factor"]
-        if not (pf == pf) or pf < min_pf:
-            continue
+    offsets, values = metrics.ragged(rets)
+    stats = metrics.table(offsets, values, metrics.years_between(df.index))
+    return pd.concat([g.reset_index(drop=True), stats], axis=1)
 
-        rows.append({
-            "rsi_buy": rb,
-            "rsi_sell": rs,
-            "sl_fast_pct": sl,
-            "tp_pct": tp,
-            "trail_pct": tr,
-            "tstop_bars": ts,
-            **s
-        })
-
-    df_lead = pd.DataFrame(rows)
+
+# -------- Parallellt: processpool + delat minne --------
+
+def _shared_frame(spec, cols, tz):
+    """DataFrame över de delade arrayerna (byggs en gång per arbetsprocess)."""
+    key = tuple(v[0] for v in spec.values())
+    if _FRAMES.get("key") != key:
+        arrays = shared.attach(spec)
+        idx = pd.DatetimeIndex(arrays["index"].view("datetime64[ns]"))
+        idx = idx.tz_localize("UTC").tz_convert(tz) if tz else idx
+        df = pd.DataFrame({c: arrays[c] for c in cols}, index=idx)
+        _FRAMES.update(key=key, df=df, bank=(arrays["lens"], arrays["bank"]))
+    return _FRAMES["df"], _FRAMES["bank"]
+
+
+_FRAMES = {}
+
+
+def _task(run, spec, cols, tz, g, fee_pct, slippage_bps):
+    df, bank = _shared_frame(spec, cols, tz)
+    return run(df, g, bank, fee_pct, slippage_bps)
+
+
+def _parallel(run, df, g, bank, fee_pct, slippage_bps, workers):
+    """
+    Delar kombinationerna i bitar och kör dem i en processpool. Priser, index
+    och RSI-bank publiceras en gång i shared_memory – uppgifterna bär bara
+    sin del av griden. Varje kombination räknas oberoende av de andra, så
+    ihopslagningen i ordning ger samma tabell som en seriell körning.
+    """
+    cols = [c for c in ("Open", "High", "Low", "Close", "Volume") if c in df.columns]
+    idx = pd.DatetimeIndex(df.index)
+    tz = str(idx.tz) if idx.tz is not None else None
+    ts = (idx.tz_convert("UTC") if tz else idx).as_unit("ns").asi8
+    arrays = {c: df[c].to_numpy(dtype="float64") for c in cols}
+    arrays.update(index=ts, lens=bank[0], bank=bank[1])
+    blocks, spec = shared.publish(arrays)
+    # grid: en bit per arbetare (barloopen kostar per bit), loop: fler för jämn last
+    parts = workers if run is _grid_chunk else 4 * workers
+    bounds = np.linspace(0, len(g), min(parts, len(g)) + 1).astype(int)
+    chunks = [g.iloc[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            out = list(pool.map(_task, *zip(*[(run, spec, cols, tz, c, fee_pct, slippage_bps) for c in chunks])))
+    finally:
+        shared.release(blocks)
+    return pd.concat(out, ignore_index=True)
+
+
+def _filter_sort(res: pd.DataFrame, min_trades, max_dd_pct, min_pf, sort_by) -> pd.DataFrame:
+    keep = ((res["trades"] >= min_trades)
+            & (res["max_drawdown_pct"].abs() <= max_dd_pct)   # DD rapporteras negativ
+            & (res["profit_factor"] >= min_pf))                # NaN faller bort
+    df_lead = res[keep]
     if df_lead.empty:
-        return df_lead
+        return pd.DataFrame()
     return df_lead.sort_values(by=sort_by, ascending=False).reset_index(drop=True)
 
 
+# -------- Budgeterad sökning: successive halving / slump --------
+
+SEARCH_METHODS = ("halving", "random")
+
+
+def search_leaderboard(
+    df: pd.DataFrame,
+    rsi_buy_range,
+    rsi_sell_range,
+    sl_list,
+    tp_list=None,
+    trail_list=None,
+    tstop_list=None,
+    fee_pct=0.0,
+    slippage_bps=0,
+    min_trades=10,
+    max_dd_pct=50.0,
+    min_pf=1.0,
+    sort_by="cagr_pct",
+    rsi_len_list=None,
+    engine="grid",
+    workers=1,
+    prune=True,
+    method="halving",  # halving = successive halving över historikprefix, random = slumpsökning
+    samples=1000,      # antal slumpade kombinationer ur produkten
+    eta=3,             # halving: behåll 1/eta per steg, prefixet växer eta gånger
+    min_bars=250,      # halving: kortaste prefix
+    budget_s=0.0,      # sekunder (0 = ingen tidsgräns)
+    seed=0,
+):
+    """
+    Som leaderboard() men utan att backtesta hela produkten: samples
+    kombinationer dras ur den (grid.sample_combos).
+
+    halving: alla dras på ett kort prefix av historiken, den bästa 1/eta
+    (rankade på sort_by, de som klarar kriterierna först – min_trades skalat
+    efter prefixets längd) flyttas vidare till ett eta gånger längre prefix,
+    och de sista körs på hela historiken. Tar tiden slut hoppar de bästa
+    hittills direkt till hela historiken.
+
+    random: kombinationerna körs på hela historiken i omgångar tills alla är
+    körda eller tiden är slut.
+
+    Nyckeltalen i resultatet är alltid från hela historiken, så CSV:n har
+    samma kolumner och värden som leaderboard() för samma rader.
+    """
+    if method not in SEARCH_METHODS:
+        raise ValueError(f"Okänd sökmetod: {method} (välj bland {', '.join(SEARCH_METHODS)})")
+    if engine not in ("grid", "loop"):
+        raise ValueError(f"Okänd motor: {engine}")
+    space, with_len = _space(rsi_buy_range, rsi_sell_range, sl_list, tp_list, trail_list, tstop_list,
+                             rsi_len_list)
+    g = sample_combos(samples, np.random.default_rng(seed), **space)
+    bank = _bank(df, space["rsi_len"])
+    g, report = prune_combos(g, bank, min_trades if prune else 0)
+    t0 = time.perf_counter()
+    over = lambda: budget_s > 0 and time.perf_counter() - t0 >= budget_s
+    n, rungs, parts = len(df), [], []
+
+    if method == "halving" and len(g):
+        steps = 0
+        while len(g) >= eta ** (steps + 1) and n // eta ** (steps + 1) >= min_bars:
+            steps += 1
+        final = math.ceil(len(g) / eta ** steps)
+        for k in range(steps, 0, -1):
+            if rungs and over():
+                break
+            m = n // eta ** k
+            res = _evaluate(df.iloc[:m], g, (bank[0], bank[1][:m]), engine, fee_pct, slippage_bps, workers)
+            order = _rank(res, math.ceil(min_trades * m / n), max_dd_pct, min_pf, sort_by)
+            rungs.append((m, len(g)))
+            g = g.iloc[order[:math.ceil(len(g) / eta)]]
+        g = g.head(final).sort_index()
+    batch = math.ceil(len(g) / 10) if method == "random" and budget_s > 0 else max(1, len(g))
+    for a in range(0, len(g), batch):
+        if parts and over():
+            break
+        parts.append(_evaluate(df, g.iloc[a:a + batch], bank, engine, fee_pct, slippage_bps, workers))
+    if parts:
+        rungs.append((n, sum(len(p) for p in parts)))
+
+    info = {"method": method, "rungs": rungs, "seconds": time.perf_counter() - t0}
+    if not parts:
+        lead = pd.DataFrame()
+    else:
+        res = pd.concat(parts, ignore_index=True)
+        if not with_len:
+            res = res.drop(columns="rsi_len")
+        lead = _filter_sort(res, min_trades, max_dd_pct, min_pf, sort_by)
+    lead.attrs["search"] = info
+    return _with_report(lead, report)
+
+
+# -------- Grov-till-fin förfining --------
+
+KEY_COLS = ["rsi_len"] + PARAM_COLS
+INT_COLS = {"rsi_len", "rsi_buy", "rsi_sell", "tstop_bars"}
+
+
+def refine_leaderboard(
+    df: pd.DataFrame,
+    rsi_buy_range,
+    rsi_sell_range,
+    sl_list,
+    tp_list=None,
+    trail_list=None,
+    tstop_list=None,
+    fee_pct=0.0,
+    slippage_bps=0,
+    min_trades=10,
+    max_dd_pct=50.0,
+    min_pf=1.0,
+    sort_by="cagr_pct",
+    rsi_len_list=None,
+    engine="grid",
+    workers=1,
+    prune=True,
+    refine=5,          # antal topprader att zooma runt
+    max_rounds=8,
+    min_step=0.5,      # finaste steg för procentparametrarna (heltal: 1)
+):
+    """
+    Grov grid först (som leaderboard()), sedan varv för varv: runt var och en
+    av de refine bästa raderna prövas grannarna v ± steg/2 i varje svept
+    dimension (inom det grova intervallet), steget halveras varje varv ned
+    till min_step (heltal 1, högst det grova steget) och ligger sedan kvar
+    där. Kombinationer som redan är körda (eller gallrade) körs aldrig igen.
+    Grövre steg hoppas aldrig över: först på finaste steget stannar sökningen
+    när topp-raderna är oförändrade ("konvergerat") eller när inga nya
+    kombinationer återstår – annars efter max_rounds. Dimensioner med ett
+    enda värde förfinas inte.
+    """
+    space, with_len = _space(rsi_buy_range, rsi_sell_range, sl_list, tp_list, trail_list, tstop_list,
+                             rsi_len_list)
+    if engine not in ("grid", "loop"):
+        raise ValueError(f"Okänd motor: {engine}")
+    # combos()-nyckel -> kolumn, med steg och gränser från det grova intervallet
+    dims = {}
+    for key, col in zip(("rsi_len", "rsi_buy", "rsi_sell", "sl", "tp", "trail", "tstop"), KEY_COLS):
+        v = np.unique(np.asarray(space[key], dtype=np.float64))
+        step = float(np.diff(v).min()) if len(v) > 1 else 0.0
+        # finaste steget aldrig grövre än griden – annars blir grannskapet bredare än rutan
+        dims[col] = (step, min(1.0 if col in INT_COLS else min_step, step), v[0], v[-1])
+
+    t0 = time.perf_counter()
+    g = combos(**space)
+    seen = set(g.itertuples(index=False, name=None))
+    bank = _bank(df, space["rsi_len"])
+    g, report = prune_combos(g, bank, min_trades if prune else 0, _total(space))
+    parts, rounds = [], [len(g)]
+    if len(g):
+        parts.append(_evaluate(df, g, bank, engine, fee_pct, slippage_bps, workers))
+    top, why = None, "max_rounds"
+    for r in range(1, max_rounds + 1):
+        lead = _filter_sort(pd.concat(parts, ignore_index=True), min_trades, max_dd_pct, min_pf, sort_by) \
+            if parts else pd.DataFrame()
+        if lead.empty:
+            why = "inga rader klarar kriterierna"
+            break
+        best = list(lead[KEY_COLS].head(refine).itertuples(index=False, name=None))
+        # oförändrad topp räknas bara när förra varvets grannar låg på finaste steget
+        if best == top and _finest(dims, r - 1):
+            why = "konvergerat"
+            break
+        top = best
+        g = _neighbours(top, dims, r, seen)
+        if g.empty:
+            if _finest(dims, r):
+                why = "inga nya kombinationer"
+                break
+            continue
+        bank = _bank(df, g["rsi_len"])
+        g, pruned = prune_combos(g, bank, min_trades if prune else 0)
+        for k in ("köpbarer", "alternering"):
+            report[k] += pruned[k]
+        rounds.append(len(g))
+        if len(g):
+            parts.append(_evaluate(df, g, bank, engine, fee_pct, slippage_bps, workers))
+
+    res = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=KEY_COLS + metrics.STAT_COLS)
+    if not with_len:
+        res = res.drop(columns="rsi_len")
+    lead = _filter_sort(res, min_trades, max_dd_pct, min_pf, sort_by)
+    lead.attrs["search"] = {"method": "refine", "rounds": rounds, "stop": why,
+                            "seconds": time.perf_counter() - t0}
+    return _with_report(lead, report)
+
+
+def _half_step(dims, col, r: int) -> float:
+    """Grannsteget i varv r: max(steg/2**r, min_step), heltal för heltalskolumner."""
+    step, res = dims[col][:2]
+    h = max(step / 2 ** r, res) if step > 0 else 0.0
+    return float(int(h)) if col in INT_COLS else h
+
+
+def _finest(dims, r: int) -> bool:
+    """Ligger varv r på finaste steget i alla svepta dimensioner?"""
+    return all(_half_step(dims, col, r) <= dims[col][1] for col in KEY_COLS if dims[col][0] > 0)
+
+
+def _neighbours(top, dims, r: int, seen: set) -> pd.DataFrame:
+    """Ej körda kombinationer v ± max(steg/2**r, min_step) runt topp-raderna (rb < rs). seen uppdateras."""
+    rows = []
+    for row in top:
+        axes = []
+        for col, v in zip(KEY_COLS, row):
+            lo, hi = dims[col][2:]
+            h = _half_step(dims, col, r)
+            vals = {v} if h <= 0 else {min(max(v + d, lo), hi) for d in (-h, 0.0, h)}
+            axes.append(sorted(int(x) if col in INT_COLS else round(float(x), 10) for x in vals))
+        rows.extend(c for c in itertools.product(*axes) if c[1] < c[2] and c not in seen)
+    rows = sorted(set(rows))
+    seen.update(rows)
+    return pd.DataFrame(rows, columns=KEY_COLS).astype({c: np.int64 if c in INT_COLS else np.float64
+                                                        for c in KEY_COLS})
+
+
+def _rank(res: pd.DataFrame, min_trades, max_dd_pct, min_pf, sort_by) -> np.ndarray:
+    """Radordning: de som klarar kriterierna först, sedan sort_by fallande (NaN sist), stabil."""
+    ok = ((res["trades"] >= min_trades)
+          & (res["max_drawdown_pct"].abs() <= max_dd_pct)
+          & (res["profit_factor"] >= min_pf)).to_numpy()
+    score = res[sort_by].to_numpy(dtype=np.float64)
+    return np.lexsort((-np.where(np.isnan(score), -np.inf, score), ~ok))
+
+
 def time_split(df: pd.DataFrame, split_date: str):
     split = pd.to_datetime(split_date)
     train = df[df.index < split]
@@ -121,7 +471,7 @@ def print_best_row(df_lead: pd.DataFrame, title: str):
     print(f"\n=== {title}: bästa rad ===")
     best = df_lead.iloc[0]
     keys = [
-        "rsi_buy", "rsi_sell", "sl_fast_pct", "tp_pct", "trail_pct", "tstop_bars",
+        "rsi_len", "rsi_buy", "rsi_sell", "sl_fast_pct", "tp_pct", "trail_pct", "tstop_bars",
         "trades", "total_return_pct", "cagr_pct", "winrate_pct",
         "profit_factor", "expectancy_pct_per_trade", "max_drawdown_pct",
         "avg_win_pct", "avg_loss_pct"
@@ -139,9 +489,11 @@ def main():
     ap.add_argument("--ticker", required=True)
     ap.add_argument("--start", default="2018-01-01")
     ap.add_argument("--interval", default="1d")
-    ap.add_argument("--source", default="auto", choices=["auto", "yahoo", "stooq"])
+    ap.add_argument("--source", default="auto",
+                    help="auto, yahoo, stooq, local[:katalog], record[:katalog], replay[:katalog]")
 
     # Parametrar att svepa
+    ap.add_argument("--rsi_len", default="", help="RSI-längd(er), t.ex. '14' eller '10:20:2' (tomt = 14)")
     ap.add_argument("--rsi_buy", default="48:52:1")
     ap.add_argument("--rsi_sell", default="55:61:1")
 
@@ -161,9 +513,34 @@ def main():
     ap.add_argument("--sort_by", default="cagr_pct",
                     help="t.ex. cagr_pct, total_return_pct, profit_factor, trades")
 
+    ap.add_argument("--engine", choices=["grid", "loop"], default="grid",
+                    help="grid = alla kombinationer i ett svep över barerna, loop = en backtest per kombination")
+
+    # Sökstrategi
+    ap.add_argument("--search", choices=("grid",) + SEARCH_METHODS, default="grid",
+                    help="grid = alla kombinationer, halving = successive halving över historikprefix, "
+                         "random = slumpsökning")
+    ap.add_argument("--samples", type=int, default=1000, help="Kombinationer att dra (halving/random)")
+    ap.add_argument("--eta", type=int, default=3, help="halving: behåll 1/eta per steg")
+    ap.add_argument("--budget", type=float, default=0.0, help="Tidsbudget i sekunder (halving/random, 0 = ingen)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--refine", type=int, default=0,
+                    help="Förfina grova griden runt de K bästa raderna med halverat steg tills topplistan står still")
+    ap.add_argument("--min_step", type=float, default=0.5, help="--refine: finaste steg för sl/tp/trail i %%")
+
     # Train/Test
     ap.add_argument("--split", default="", help="Datum för Train/Test, ex 2023-01-01")
 
+    # Robusthet: bootstrap av affärerna för de bästa raderna (app/robustness.py)
+    ap.add_argument("--bootstrap", type=int, default=0, help="Antal omdragna vägar per rad (0 = av)")
+    ap.add_argument("--bs_method", choices=METHODS, default="bootstrap")
+    ap.add_argument("--bs_block", type=int, default=5, help="Blocklängd i affärer (bs_method=block)")
+    ap.add_argument("--bs_top", type=int, default=100, help="Antal leaderboard-rader att dra om")
+    ap.add_argument("--workers", type=int, default=1,
+                    help="Arbetsprocesser för leaderboard och bootstrap (priser/RSI i delat minne)")
+    ap.add_argument("--no_prune", action="store_true",
+                    help="Backtesta alla kombinationer, även de som inte kan nå --min_trades")
+
     # Output + utskrift
     ap.add_argument("--out", default="opt_results.csv")
     ap.add_argument("--print_best", action="store_true", help="Skriv ut bästa radens parametrar")
@@ -172,8 +549,11 @@ def main():
 
     # Hämta data
     df = get_data(args.ticker, args.start, interval=args.interval, source=args.source)
-    print(f"Loaded {len(df)} rows for {args.ticker} [{args.source}] {args.interval} since {args.start}")
+    prov = get_provider(args.source)
+    print(f"Loaded {len(df)} rows for {args.ticker} [{args.source}] {args.interval} since {args.start}"
+          f" ({prov.calls} fetch, {prov.seconds:.2f}s)")
 
+    len_list = parse_range(args.rsi_len) if args.rsi_len else None
     rb = parse_range(args.rsi_buy)
     rs = parse_range(args.rsi_sell)
     sl_list = parse_range_f(args.sl_fast)
@@ -182,24 +562,36 @@ def main():
     # tstop är heltal
     tstop_list = parse_range(args.tstop)
 
+    # grid = hela produkten, halving/random = budgeterad sökning över ett urval
+    search = leaderboard if args.search == "grid" else partial(
+        search_leaderboard, method=args.search, samples=args.samples, eta=args.eta,
+        budget_s=args.budget, seed=args.seed)
+    if args.refine:
+        if args.search != "grid":
+            raise SystemExit("--refine utgår från hela den grova griden (--search grid).")
+        search = partial(refine_leaderboard, refine=args.refine, min_step=args.min_step)
+
     if args.split:
         train, test = time_split(df, args.split)
         if len(train) < 50 or len(test) < 50:
             raise SystemExit("För lite data i train/test efter split.")
 
         # Optimize på TRAIN
-        lead_train = leaderboard(
+        lead_train = search(
             train, rb, rs, sl_list,
             tp_list=tp_list, trail_list=trail_list, tstop_list=tstop_list,
             fee_pct=args.fee, slippage_bps=args.slip,
             min_trades=args.min_trades, max_dd_pct=args.max_dd, min_pf=args.min_pf,
-            sort_by=args.sort_by
+            sort_by=args.sort_by, rsi_len_list=len_list, engine=args.engine,
+            workers=args.workers, prune=not args.no_prune
         )
+        print_report(lead_train)
         if lead_train.empty:
             print("Inga resultat som klarar kriterierna på TRAIN.")
             return
 
         Path(args.out).write_text(lead_train.to_csv(index=False), encoding="utf-8")
+        print(f"Indikatorcache: {CACHE.hits} träffar, {CACHE.misses} beräkningar")
         print("=== TRAIN – topp 10 ===")
         print(lead_train.head(10).to_string(index=False))
 
@@ -207,8 +599,11 @@ def main():
             best_train = print_best_row(lead_train, "TRAIN")
         else:
             best_train = lead_train.iloc[0]
+        if args.bootstrap:
+            save_bands(train, lead_train, args)
 
         # Testa bästa rad på TEST
+        b_len = int(best_train.get("rsi_len", 14))
         b_rb = int(best_train["rsi_buy"])
         b_rs = int(best_train["rsi_sell"])
         b_sl = float(best_train["sl_fast_pct"])
@@ -216,7 +611,7 @@ def main():
         b_tr = float(best_train.get("trail_pct", 0.0))
         b_ts = int(best_train.get("tstop_bars", 0))
 
-        sig_test = build_signals(test, rsi_buy=b_rb, rsi_sell=b_rs)
+        sig_test = build_signals(test, rsi_buy=b_rb, rsi_sell=b_rs, rsi_len=b_len)
         res_test = run_backtest(
             sig_test,
             fee_pct=args.fee,
@@ -232,22 +627,25 @@ def main():
 
         if args.print_best:
             print("\n>>> Parametrar (bäst på TRAIN) som testades på TEST:")
-            print(f"rsi_buy={b_rb}, rsi_sell={b_rs}, sl_fast_pct={b_sl}, tp_pct={b_tp}, trail_pct={b_tr}, tstop_bars={b_ts}")
+            print(f"rsi_len={b_len}, rsi_buy={b_rb}, rsi_sell={b_rs}, sl_fast_pct={b_sl}, tp_pct={b_tp}, trail_pct={b_tr}, tstop_bars={b_ts}")
 
     else:
         # Optimize på hela perioden
-        lead = leaderboard(
+        lead = search(
             df, rb, rs, sl_list,
             tp_list=tp_list, trail_list=trail_list, tstop_list=tstop_list,
             fee_pct=args.fee, slippage_bps=args.slip,
             min_trades=args.min_trades, max_dd_pct=args.max_dd, min_pf=args.min_pf,
-            sort_by=args.sort_by
+            sort_by=args.sort_by, rsi_len_list=len_list, engine=args.engine,
+            workers=args.workers, prune=not args.no_prune
         )
+        print_report(lead)
         if lead.empty:
             print("Inga resultat som klarar kriterierna.")
             return
 
         Path(args.out).write_text(lead.to_csv(index=False), encoding="utf-8")
+        print(f"Indikatorcache: {CACHE.hits} träffar, {CACHE.misses} beräkningar")
         print("=== Leaderboard – topp 20 ===")
         print(lead.head(20).to_string(index=False))
 
@@ -255,6 +653,21 @@ def main():
             print_best_row(lead, "FULL PERIOD")
 
         print(f"\nSparat till {args.out}")
+        if args.bootstrap:
+            save_bands(df, lead, args)
+
+
+def save_bands(df: pd.DataFrame, lead: pd.DataFrame, args):
+    """Konfidensband för topp-raderna -> <out>_bands.csv (leaderboard-CSV:n lämnas orörd)."""
+    b = leaderboard_bands(df, lead, top=args.bs_top, paths=args.bootstrap, method=args.bs_method,
+                          block=args.bs_block, fee_pct=args.fee, slippage_bps=args.slip, workers=args.workers)
+    out = Path(args.out)
+    path = out.with_name(out.stem + "_bands" + out.suffix)
+    path.write_text(b.to_csv(index=False), encoding="utf-8")
+    cols = [c for c in b.columns if c.endswith(("_p05", "_p50", "_p95"))]
+    print(f"\n=== Bootstrap ({args.bootstrap} vägar, {args.bs_method}) – topp 10 ===")
+    print(b[["rsi_buy", "rsi_sell", "cagr_pct"] + cols].head(10).to_string(index=False))
+    print(f"Sparat till {path}")
 
 
 if __name__ == "__main__":
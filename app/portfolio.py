@@ -0,0 +1,254 @@
+"""
+Portföljbacktest över många tickers (t.ex. tickers_se.csv) med delat kapital.
+
+Barer läggs i en panel (barer × tickers) och RSI/MACD-reglerna från
+alert_batch.latest_signal räknas för alla symboler på en gång som
+2D-operationer:
+
+    köp  = MACD korsar upp genom signallinjen och RSI > 50
+    sälj = MACD korsar ned eller RSI < 45
+
+Kapitalet är gemensamt: högst max_positions innehav, varje ny position får
+eget kapital / max_positions (begränsat av kassan). När fler köpsignaler
+finns än lediga platser tas de med högst RSI. Affärer fylls på nästa
+öppning (eller stängningen med fill="close"); saknar tickern bar då ligger
+ordern kvar tills den kan fyllas. Tar en tickers data slut före panelen
+(avnoterad, bytt lista) stängs innehavet på sista stängningen och tickern
+köps inte mer. Loopen går bar för bar men
+varje steg är vektoriserat över alla tickers, så 300 tickers × 10 år tar
+bråkdelen av en sekund.
+
+    python -m app.portfolio --csv tickers_se.csv --start 2015-01-01 --max-positions 10
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+try:
+    from app.data import get_data_many
+    from app.strategy import stats
+    from app import indicators as ind
+except ImportError:
+    from data import get_data_many
+    from strategy import stats
+    import indicators as ind
+
+
+def make_panel(frames: dict, fields=("Open", "Close")) -> dict:
+    """{ticker: DataFrame} -> {"index", "symbols", fält: 2D-array} på gemensamt index (NaN där data saknas)."""
+    symbols = [t for t, df in frames.items() if df is not None and not df.empty]
+    index = pd.DatetimeIndex([])
+    for t in symbols:
+        index = index.union(frames[t].index)
+    panel = {"index": index, "symbols": symbols}
+    for f in fields:
+        panel[f] = np.column_stack([frames[t][f].reindex(index).to_numpy(dtype=float) for t in symbols]) \
+            if symbols else np.empty((len(index), 0))
+    return panel
+
+
+def ffill(x: np.ndarray) -> np.ndarray:
+    """Framåtfyllning längs tidsaxeln (inledande NaN lämnas)."""
+    ok = ~np.isnan(x)
+    pos = np.where(ok, np.arange(len(x))[:, None], 0)
+    np.maximum.accumulate(pos, axis=0, out=pos)
+    out = x[pos, np.arange(x.shape[1])]
+    out[~np.maximum.accumulate(ok, axis=0)] = np.nan
+    return out
+
+
+def signals(close: np.ndarray, rsi_buy: float = 50.0, rsi_sell: float = 45.0):
+    """
+    2D-versionen av alert_batch.latest_signal för varje bar:
+    -> (buy, sell, rsi) som (barer, tickers). Luckor framåtfylls innan
+    indikatorerna räknas. En ticker som noteras efter panelens start räknas
+    från sin första bar, som latest_signal på tickerns egen serie.
+    """
+    c = ffill(close)
+    line, sig, _ = ind.macd(c, 12, 26, 9)  # EMA:n startar på första giltiga värdet
+    # zero_first gäller varje kolumns första bar, inte panelens rad 0
+    r = np.full_like(c, np.nan)
+    first = np.argmax(~np.isnan(c), axis=0)
+    for f in np.unique(first):
+        cols = np.flatnonzero(first == f)
+        r[f:, cols] = ind.rsi_sma(c[f:, cols], 14, zero_first=True)
+    prev_line, prev_sig = np.roll(line, 1, axis=0), np.roll(sig, 1, axis=0)
+    with np.errstate(invalid="ignore"):
+        cross_up = (prev_line <= prev_sig) & (line > sig)
+        cross_dn = (prev_line >= prev_sig) & (line < sig)
+        buy = cross_up & (r > rsi_buy)
+        sell = cross_dn | (r < rsi_sell)
+    buy[0] = sell[0] = False
+    return buy, sell, r
+
+
+def backtest_portfolio(panel: dict, capital: float = 100_000.0, max_positions: int = 10,
+                       fee_pct: float = 0.0, slippage_bps: int = 0, fill: str = "next_open",
+                       whole_shares: bool = True) -> dict:
+    """
+    -> {"equity": Series, "positions": Series, "trades": DataFrame,
+        "holdings": DataFrame (innehav kvar efter sista baren), "stats": dict}
+    stats har samma nycklar som strategy.run_backtest (max DD på dagligt eget kapital).
+    """
+    if fill not in ("next_open", "close"):
+        raise ValueError("fill måste vara next_open eller close")
+    close = panel["Close"]
+    n, m = close.shape
+    px_close = ffill(close)
+    opens = panel.get("Open", close) if fill == "next_open" else close
+    buy, sell, r = signals(close)
+    can_trade = ~np.isnan(opens) & ~np.isnan(close)
+    # sista baren med data; ended = datan tar slut före panelens sista bar
+    last = n - 1 - np.argmax(~np.isnan(close[::-1]), axis=0) if n else np.zeros(m, dtype=np.int64)
+    ended = last < n - 1
+
+    slip, fee = slippage_bps / 10_000.0, fee_pct / 100.0
+    cash = float(capital)
+    shares = np.zeros(m)
+    held = np.zeros(m, dtype=bool)
+    entry_t = np.zeros(m, dtype=np.int64)
+    entry_cost = np.zeros(m)                 # betalt inkl avgift
+    entry_px = np.zeros(m)
+    equity = np.empty(n)
+    npos = np.empty(n, dtype=np.int64)
+    pend_buy = np.zeros(m, dtype=bool)
+    pend_sell = np.zeros(m, dtype=bool)
+    prio = np.zeros(m)
+    log = []                                 # (j, t_in, t_out, px_in, px_out, shares, kostnad, intäkt)
+    eq_prev = float(capital)
+
+    def sell_out(out, t, fill_px):
+        nonlocal cash
+        proceeds = shares[out] * fill_px * (1 - fee)
+        cash += proceeds.sum()
+        log.append(np.column_stack([out, entry_t[out], np.full(len(out), t), entry_px[out], fill_px,
+                                    shares[out], entry_cost[out], proceeds]))
+        held[out] = False
+        shares[out] = 0.0
+
+    def orders(t):
+        """Nya signaler plus ordrar som väntar på en bar att fyllas på."""
+        new_buy = ~held & buy[t]
+        return held & (sell[t] | pend_sell), new_buy | (~held & pend_buy), np.where(new_buy, r[t], prio)
+
+    for t in range(n):
+        if fill == "close":
+            pend_sell, pend_buy, prio = orders(t)
+        px = opens[t]
+
+        # sälj först – frigör kassa och platser
+        out = np.flatnonzero(pend_sell & held & can_trade[t])
+        if len(out):
+            sell_out(out, t, px[out] * (1 - slip))
+
+        # köp: högst RSI först, så många som får plats (inte på/efter en tickers sista bar)
+        cand = np.flatnonzero(pend_buy & ~held & can_trade[t] & ~(ended & (t >= last)))
+        free = max_positions - int(held.sum())
+        if len(cand) and free > 0 and cash > 0:
+            cand = cand[np.argsort(-np.nan_to_num(prio[cand], nan=-np.inf), kind="stable")][:free]
+            fill_px = px[cand] * (1 + slip)
+            budget = np.minimum(eq_prev / max_positions, cash / len(cand))
+            q = budget / (fill_px * (1 + fee))
+            if whole_shares:
+                q = np.floor(q)
+            ok = q > 0
+            cand, q, fill_px = cand[ok], q[ok], fill_px[ok]
+            cost = q * fill_px * (1 + fee)
+            cash -= cost.sum()
+            held[cand] = True
+            shares[cand] = q
+            entry_t[cand] = t
+            entry_px[cand] = fill_px
+            entry_cost[cand] = cost
+
+        # datan tar slut: stäng på sista stängningen, platsen blir fri
+        gone = np.flatnonzero(held & ended & (last == t))
+        if len(gone):
+            sell_out(gone, t, close[t, gone] * (1 - slip))
+
+        # bara ordrar som saknade bar ligger kvar; köp som inte fick plats stryks
+        pend_sell &= held & ~can_trade[t]
+        pend_buy &= ~held & ~can_trade[t] & ~(ended & (t >= last))
+
+        # mark-to-market på stängningen
+        mark = np.where(held, shares * np.nan_to_num(px_close[t]), 0.0)
+        equity[t] = cash + mark.sum()
+        npos[t] = held.sum()
+        eq_prev = equity[t]
+
+        if fill == "next_open":
+            pend_sell, pend_buy, prio = orders(t)
+
+    index, symbols = panel["index"], panel["symbols"]
+    cols = ["j", "t_in", "t_out", "entry_px", "exit_px", "shares", "cost", "proceeds"]
+    raw = pd.DataFrame(np.vstack(log) if log else np.empty((0, len(cols))), columns=cols)
+    trades = pd.DataFrame({
+        "symbol": [symbols[int(j)] for j in raw["j"]],
+        "entry_date": index[raw["t_in"].astype(int)],
+        "exit_date": index[raw["t_out"].astype(int)],
+        "entry_px": raw["entry_px"], "exit_px": raw["exit_px"], "shares": raw["shares"],
+        "pnl": raw["proceeds"] - raw["cost"],
+        "ret": raw["proceeds"] / raw["cost"] - 1.0,
+    }).sort_values(["exit_date", "symbol"], kind="stable").reset_index(drop=True)
+
+    hold = np.flatnonzero(held)
+    holdings = pd.DataFrame({
+        "symbol": [symbols[j] for j in hold],
+        "entry_date": index[entry_t[hold]],
+        "entry_px": entry_px[hold], "shares": shares[hold],
+        "value": shares[hold] * (px_close[-1, hold] if n else 0.0),
+    })
+
+    eq = pd.Series(equity, index=index, name="equity")
+    st = stats(trades["ret"].to_numpy(), np.concatenate([[1.0], equity / capital]), index) if n else {}
+    if n:
+        st["exposure_pct"] = float((npos > 0).mean() * 100.0)
+        st["avg_positions"] = float(npos.mean())
+    return {"equity": eq, "positions": pd.Series(npos, index=index, name="positions"),
+            "trades": trades, "holdings": holdings, "stats": st}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Portföljbacktest (RSI+MACD) över en tickerlista med delat kapital")
+    ap.add_argument("--csv", default="tickers_se.csv", help="CSV med kolumn 'symbol'")
+    ap.add_argument("--start", default="2015-01-01")
+    ap.add_argument("--interval", default="1d")
+    ap.add_argument("--source", default="auto", help="Datakälla (se app/providers.py)")
+    ap.add_argument("--capital", type=float, default=100_000.0)
+    ap.add_argument("--max-positions", type=int, default=10)
+    ap.add_argument("--fee", type=float, default=0.0, help="Courtage % per sida")
+    ap.add_argument("--slip", type=int, default=0, help="Slippage bps")
+    ap.add_argument("--fill", choices=["next_open", "close"], default="next_open")
+    ap.add_argument("--fractional", action="store_true", help="Tillåt delar av aktier")
+    ap.add_argument("--out", default="", help="Spara daglig equity som CSV")
+    ap.add_argument("--trades-out", default="", help="Spara affärer som CSV")
+    args = ap.parse_args()
+
+    if not os.path.exists(args.csv):
+        print(f"Hittar inte {args.csv}. Skapa en CSV med header 'symbol' och dina tickers (.ST).")
+        sys.exit(2)
+    symbols = [s.strip() for s in pd.read_csv(args.csv)["symbol"].dropna().astype(str) if s.strip()]
+
+    frames = get_data_many(symbols, args.start, interval=args.interval, source=args.source)
+    panel = make_panel(frames)
+    print(f"Panel: {len(panel['index'])} barer × {len(panel['symbols'])} tickers "
+          f"({len(symbols) - len(panel['symbols'])} utan data)")
+    if not panel["symbols"]:
+        sys.exit(1)
+
+    res = backtest_portfolio(panel, args.capital, args.max_positions, args.fee, args.slip,
+                             args.fill, whole_shares=not args.fractional)
+    print(pd.Series(res["stats"]).to_string())
+    if args.out:
+        pd.concat([res["equity"], res["positions"]], axis=1).to_csv(args.out)
+        print(f"Sparat equity till {args.out}")
+    if args.trades_out:
+        res["trades"].to_csv(args.trades_out, index=False)
+        print(f"Sparat affärer till {args.trades_out}")
+
+
+if __name__ == "__main__":
+    main()
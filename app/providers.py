@@ -0,0 +1,217 @@
+"""
+Datakällor bakom get_data().
+
+    yfinance / yahoo / auto   – Yahoo Finance via yfinance
+    stooq                     – ingen egen implementation ännu, går via yfinance (som tidigare)
+    local[:<katalog>]         – lokala CSV/Parquet-filer, ingen nätverkstrafik
+    record[:<katalog>]        – hämtar via yfinance och sparar svaret
+    replay[:<katalog>]        – serverar sparade svar, aldrig nätet (deterministiskt)
+    async                     – Yahoos chart-API via asyncio (app/fetch_async.py)
+
+source="auto" kan styras med miljövariabeln DATA_SOURCE, t.ex. DATA_SOURCE=replay
+för att köra backtester/optimering helt offline.
+
+Varje provider räknar anrop och tid i hämtning (calls/seconds) så att
+datalatens kan skiljas från beräkningstid.
+"""
+import os
+import pickle
+import time
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    from app.store import COLUMNS, safe_name
+except ImportError:
+    from store import COLUMNS, safe_name
+
+
+def _to_ts(x) -> pd.Timestamp:
+    return pd.Timestamp(str(x)) if not isinstance(x, pd.Timestamp) else x
+
+
+def _naive(x):
+    return _to_ts(x).tz_localize(None).to_pydatetime()
+
+
+def clean_ohlcv(df: pd.DataFrame) -> pd.DataFrame:
+    """Platta ut yfinance-kolumner och behåll bara OHLCV utan NaN-rader."""
+    if df is None or df.empty:
+        return pd.DataFrame(columns=COLUMNS)
+    if isinstance(df.columns, pd.MultiIndex):
+        df = df.droplevel(1 if "Close" in df.columns.get_level_values(0) else 0, axis=1)
+    cols = [c for c in COLUMNS if c in df.columns]
+    return df[cols].dropna()
+
+
+class DataProvider:
+    name = "base"
+    cacheable = True  # False -> get_data går förbi barlagret
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+
+    def fetch(self, ticker: str, start, interval: str = "1d", auto_adjust: bool = True) -> pd.DataFrame:
+        t0 = time.perf_counter()
+        try:
+            return self._fetch(ticker, start, interval, auto_adjust)
+        finally:
+            self.calls += 1
+            self.seconds += time.perf_counter() - t0
+
+    def fetch_many(self, tickers, start, interval: str = "1d", auto_adjust: bool = True) -> dict:
+        t0 = time.perf_counter()
+        try:
+            return self._fetch_many(list(tickers), start, interval, auto_adjust)
+        finally:
+            self.calls += 1
+            self.seconds += time.perf_counter() - t0
+
+    def _fetch(self, ticker, start, interval, auto_adjust):
+        raise NotImplementedError
+
+    def _fetch_many(self, tickers, start, interval, auto_adjust):
+        return {t: self._fetch(t, start, interval, auto_adjust) for t in tickers}
+
+
+class YFinanceProvider(DataProvider):
+    name = "yfinance"
+
+    def _fetch(self, ticker, start, interval, auto_adjust):
+        import yfinance as yf
+        df = yf.download(ticker, start=_naive(start), interval=interval,
+                         auto_adjust=auto_adjust, progress=False, threads=False)
+        return clean_ohlcv(df)
+
+    def _fetch_many(self, tickers, start, interval, auto_adjust):
+        """Ett anrop för flera tickers; delar upp den kombinerade ramen per symbol."""
+        import yfinance as yf
+        df = yf.download(tickers, start=_naive(start), interval=interval,
+                         auto_adjust=auto_adjust, progress=False, threads=True, group_by="ticker")
+        out = {}
+        for t in tickers:
+            if isinstance(df.columns, pd.MultiIndex) and t in df.columns.get_level_values(0):
+                out[t] = clean_ohlcv(df[t])
+            else:
+                out[t] = clean_ohlcv(None)
+        return out
+
+
+class LocalFileProvider(DataProvider):
+    """
+    Läser <root>/<interval>/<TICKER>.(parquet|csv) eller <root>/<TICKER>.(parquet|csv).
+    CSV:n ska ha datum i första kolumnen och kolumnerna Open/High/Low/Close/Volume.
+    """
+    name = "local"
+    cacheable = False
+
+    def __init__(self, root=None):
+        super().__init__()
+        self.root = Path(root or os.getenv("BAR_LOCAL_DIR", "data"))
+
+    def _find(self, ticker, interval):
+        for d in (self.root / interval, self.root):
+            for name in (ticker, safe_name(ticker)):
+                for ext in (".parquet", ".csv"):
+                    p = d / f"{name}{ext}"
+                    if p.exists():
+                        return p
+        return None
+
+    def _fetch(self, ticker, start, interval, auto_adjust):
+        p = self._find(ticker, interval)
+        if p is None:
+            return clean_ohlcv(None)
+        if p.suffix == ".parquet":
+            df = pd.read_parquet(p)
+        else:
+            df = pd.read_csv(p, index_col=0, parse_dates=True)
+        df = clean_ohlcv(df.sort_index())
+        ts = _to_ts(start)
+        tz = getattr(df.index, "tz", None)
+        if tz is not None and ts.tzinfo is None:
+            ts = ts.tz_localize(tz)
+        return df[df.index >= ts]
+
+
+class RecordReplayProvider(DataProvider):
+    """
+    Spelar in svaren från en annan provider och spelar upp dem igen.
+      mode="record": hämta alltid och skriv över inspelningen
+      mode="replay": bara inspelningar – saknas den blir det ett fel
+      mode="auto":   spela upp om inspelning finns, annars hämta och spela in
+    Nyckeln är (ticker, start, interval, auto_adjust); barlagret används inte
+    så att samma anrop alltid ger samma nyckel.
+    """
+    name = "replay"
+    cacheable = False
+
+    def __init__(self, inner: DataProvider = None, root=None, mode: str = "auto"):
+        super().__init__()
+        if mode not in ("record", "replay", "auto"):
+            raise ValueError(f"Okänt läge: {mode}")
+        self.inner = inner or YFinanceProvider()
+        self.root = Path(root or os.getenv("BAR_REPLAY_DIR", "replay"))
+        self.mode = mode
+
+    def _path(self, ticker, start, interval, auto_adjust) -> Path:
+        day = _to_ts(start).strftime("%Y%m%d")
+        return self.root / interval / f"{safe_name(ticker)}__{day}__{'adj' if auto_adjust else 'raw'}.pkl"
+
+    def _fetch(self, ticker, start, interval, auto_adjust):
+        p = self._path(ticker, start, interval, auto_adjust)
+        if self.mode != "record" and p.exists():
+            with open(p, "rb") as f:
+                return pickle.load(f)
+        if self.mode == "replay":
+            raise FileNotFoundError(f"Ingen inspelning för {ticker} {interval} från {start}: {p}")
+        df = self.inner.fetch(ticker, start, interval, auto_adjust)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_name(p.name + ".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(df, f)
+        os.replace(tmp, p)
+        return df
+
+
+def _async_provider(base_url=None):
+    try:
+        from app.fetch_async import YahooAsyncProvider
+    except ImportError:
+        from fetch_async import YahooAsyncProvider
+    return YahooAsyncProvider(base_url=base_url)
+
+
+PROVIDERS = {
+    "auto": YFinanceProvider,
+    "yahoo": YFinanceProvider,
+    "yfinance": YFinanceProvider,
+    "stooq": YFinanceProvider,
+    "local": LocalFileProvider,
+    "record": lambda root=None: RecordReplayProvider(root=root, mode="record"),
+    "replay": lambda root=None: RecordReplayProvider(root=root, mode="replay"),
+    "async": _async_provider,
+}
+_INSTANCES = {}
+
+
+def register_provider(name: str, factory):
+    PROVIDERS[name] = factory
+    _INSTANCES.pop(name, None)
+
+
+def get_provider(source="auto") -> DataProvider:
+    """Namn ('yahoo', 'local:/väg', 'replay', ...) eller färdig DataProvider."""
+    if isinstance(source, DataProvider):
+        return source
+    source = (source or "auto").strip()
+    if source == "auto":
+        source = os.getenv("DATA_SOURCE", "auto").strip() or "auto"
+    if source not in _INSTANCES:
+        name, _, arg = source.partition(":")
+        if name not in PROVIDERS:
+            raise ValueError(f"Okänd datakälla: {source}")
+        _INSTANCES[source] = PROVIDERS[name](arg) if arg else PROVIDERS[name]()
+    return _INSTANCES[source]
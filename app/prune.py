@@ -0,0 +1,79 @@
+"""
+Billig förgallring av parameterkombinationer före backtest.
+
+Antalet stängda affärer kan begränsas uppifrån enbart ur signalmaskerna
+(köp RSI < rsi_buy, sälj RSI > rsi_sell, som data.build_signals):
+
+  1. rb >= rs           kombinationen är meningslös (combos() hoppar redan över den)
+  2. köpbarer           varje stängd affär behöver en egen köpbar före sista baren,
+                        så affärer <= antal barer med RSI < rb (gäller alla exitregler)
+  3. alternering        utan stopp/TP/trail/tidsstopp är antalet affärer exakt antalet
+                        växlingar köp -> sälj i händelseserien
+
+Kombinationer vars tak ligger under min_trades kan aldrig klara filtret i
+optimize.leaderboard och tas bort. Övriga rader räknas exakt som förut.
+Allt är vektoriserat över barer × kombinationer.
+"""
+import numpy as np
+import pandas as pd
+
+BATCH = 256  # (rb, rs)-par per block i alterneringssteget
+
+
+def buy_bar_bound(R: np.ndarray, rsi_buy) -> np.ndarray:
+    """Tak för affärer per (längd, rb): (len(rsi_buy), längder) ur RSI-banken R (barer, längder)."""
+    s = np.sort(R[:-1], axis=0)  # NaN sist – räknas inte som köp
+    rb = np.asarray(rsi_buy, dtype=np.float64)
+    return np.stack([np.searchsorted(s[:, k], rb, side="left") for k in range(R.shape[1])], axis=1)
+
+
+def alternations(r: np.ndarray, rb, rs) -> np.ndarray:
+    """
+    Exakt antal stängda affärer utan exitregler för varje par (rb[j], rs[j]):
+    en sälj räknas när senaste händelsen före den var ett köp.
+    """
+    rb = np.asarray(rb, dtype=np.float64)
+    rs = np.asarray(rs, dtype=np.float64)
+    out = np.empty(len(rb), dtype=np.int64)
+    t = np.arange(len(r))[:, None]
+    for a in range(0, len(rb), BATCH):
+        b, s = rb[None, a:a + BATCH], rs[None, a:a + BATCH]
+        with np.errstate(invalid="ignore"):
+            ev = (r[:, None] < b).astype(np.int8) - (r[:, None] > s)
+        last = np.maximum.accumulate(np.where(ev != 0, t, -1), axis=0)
+        prev = np.vstack([np.full((1, ev.shape[1]), -1), last[:-1]])
+        prev_ev = np.take_along_axis(ev, np.maximum(prev, 0), axis=0)
+        out[a:a + BATCH] = ((ev == -1) & (prev >= 0) & (prev_ev == 1)).sum(axis=0)
+    return out
+
+
+def prune(grid: pd.DataFrame, bank, min_trades: int, total: int = None):
+    """
+    grid: combos() (rsi_len + PARAM_COLS), bank: (längder, RSI-bank).
+    total: storleken på hela produkten (för steg 1), om känd.
+    -> (kvarvarande grid, rapport {steg: antal bortgallrade}).
+    """
+    lens, R = bank
+    report = {"rb >= rs": (total - len(grid)) if total is not None else 0}
+    if min_trades <= 0 or grid.empty:
+        report.update({"köpbarer": 0, "alternering": 0})
+        return grid, report
+
+    li = np.searchsorted(lens, grid["rsi_len"].to_numpy())
+    rbs, rb_i = np.unique(grid["rsi_buy"].to_numpy(dtype=np.float64), return_inverse=True)
+    ub = buy_bar_bound(R, rbs)[rb_i, li]
+    keep = ub >= min_trades
+    report["köpbarer"] = int((~keep).sum())
+
+    plain = keep & (grid[["sl_fast_pct", "tp_pct", "trail_pct", "tstop_bars"]].to_numpy(dtype=np.float64) == 0).all(axis=1)
+    pruned = 0
+    for k in np.unique(li[plain]):
+        rows = np.flatnonzero(plain & (li == k))
+        pairs, inv = np.unique(grid[["rsi_buy", "rsi_sell"]].to_numpy(dtype=np.float64)[rows], axis=0,
+                               return_inverse=True)
+        n = alternations(R[:, k], pairs[:, 0], pairs[:, 1])[inv.ravel()]
+        drop = rows[n < min_trades]
+        keep[drop] = False
+        pruned += len(drop)
+    report["alternering"] = pruned
+    return grid[keep].reset_index(drop=True), report
@@ -0,0 +1,81 @@
+"""
+Lokal resampling av OHLCV-barer: bygger grövre intervall (1h/1d/1wk …) av
+finare barer som redan finns i lagret i stället för att hämta om från nätet.
+
+Sessionsgränser per börs (suffix på tickern) – .ST handlas 09:00–17:30
+Stockholmstid. Intradagsbarer utanför sessionen kastas, timbarer ankras på
+sessionens öppning och dagsbarer grupperas på lokalt datum (tidszonslösa
+datum, som yfinance ger för dagsdata). Veckobarer märks med måndagen.
+"""
+import pandas as pd
+
+# suffix -> (tidszon, öppning, stängning)
+SESSIONS = {
+    ".ST": ("Europe/Stockholm", "09:00", "17:30"),
+    ".OL": ("Europe/Oslo", "09:00", "16:20"),
+    ".CO": ("Europe/Copenhagen", "09:00", "17:00"),
+    ".HE": ("Europe/Helsinki", "10:00", "18:30"),
+}
+DEFAULT_SESSION = ("America/New_York", "09:30", "16:00")
+
+# intervall -> minuter (dag/vecka räknas som ej intradag)
+MINUTES = {"1m": 1, "2m": 2, "5m": 5, "15m": 15, "30m": 30, "60m": 60, "1h": 60, "90m": 90,
+           "1d": 1440, "1wk": 10080}
+INTRADAY = {k for k, v in MINUTES.items() if v < 1440}
+AGG = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+
+
+def session_for(ticker: str):
+    t = ticker.upper()
+    for suf, sess in SESSIONS.items():
+        if t.endswith(suf):
+            return sess
+    return DEFAULT_SESSION
+
+
+def can_derive(base: str, target: str) -> bool:
+    """Kan target byggas av base? (base finare och, för intradag, jämnt delbart)"""
+    if base not in MINUTES or target not in MINUTES or MINUTES[base] >= MINUTES[target]:
+        return False
+    if target in INTRADAY:
+        return MINUTES[target] % MINUTES[base] == 0
+    return True
+
+
+def _agg(df: pd.DataFrame, grouper) -> pd.DataFrame:
+    cols = {c: f for c, f in AGG.items() if c in df.columns}
+    out = df.groupby(grouper).agg(cols)
+    return out.dropna(subset=["Open"]) if "Open" in out.columns else out.dropna()
+
+
+def _in_session(df: pd.DataFrame, ticker: str) -> pd.DataFrame:
+    tz, open_, close_ = session_for(ticker)
+    idx = df.index.tz_localize("UTC") if df.index.tz is None else df.index
+    local = df.set_axis(idx.tz_convert(tz))
+    return local.between_time(open_, close_, inclusive="left")
+
+
+def resample_bars(df: pd.DataFrame, base: str, target: str, ticker: str = "") -> pd.DataFrame:
+    """Aggregerar barer i intervallet base till target (vektoriserat, en groupby)."""
+    if not can_derive(base, target):
+        raise ValueError(f"Kan inte bygga {target} av {base}")
+    if df.empty:
+        return df
+
+    if base in INTRADAY:
+        local = _in_session(df, ticker)
+        if target in INTRADAY:
+            _, open_, _ = session_for(ticker)
+            h, m = (int(x) for x in open_.split(":"))
+            return _agg(local, pd.Grouper(freq=f"{MINUTES[target]}min", origin="start_day",
+                                          offset=pd.Timedelta(hours=h, minutes=m),
+                                          label="left", closed="left"))
+        daily = _agg(local, local.index.tz_localize(None).normalize().rename(df.index.name or "Date"))
+        if target == "1d":
+            return daily
+        df = daily
+
+    # dag -> vecka (måndag som etikett, som yfinance)
+    days = df.index.tz_localize(None) if df.index.tz is not None else df.index
+    monday = (days.normalize() - pd.to_timedelta(days.dayofweek, unit="D")).rename(df.index.name or "Date")
+    return _agg(df.set_axis(days), monday)
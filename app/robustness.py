@@ -0,0 +1,157 @@
+"""
+Robusthet för en körnings affärssekvens: bootstrap / Monte Carlo.
+
+Affärsavkastningarna dras om till tusentals vägar (matris vägar × affärer)
+och nyckeltalen räknas för alla vägar i ett anrop (metrics.compute_matrix).
+Vägarna delas i skärvor med egna frön (SeedSequence.spawn) som körs i en
+processpool – samma seed ger samma band oavsett antal arbetsprocesser.
+
+Metoder:
+    bootstrap  dragning med återläggning, affär för affär
+    block      cirkulär blockbootstrap (block affärer i följd, bevarar serieberoende)
+    shuffle    permutation av ordningen – samma slutvärde, ny drawdown
+
+    python -m app.robustness --ticker AAPL --rsi_buy 45 --rsi_sell 60 --paths 10000 --workers 4
+    python -m app.optimize ... --bootstrap 10000 --bs_top 100 --workers 4
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+try:
+    from app import metrics
+    from app.data import get_data, build_signals
+    from app.strategy import run_backtest
+except ImportError:
+    import metrics
+    from data import get_data, build_signals
+    from strategy import run_backtest
+
+METHODS = ("bootstrap", "block", "shuffle")
+BAND_COLS = {"cagr_pct": "cagr", "max_drawdown_pct": "mdd", "profit_factor": "pf"}
+SHARD = 2000  # vägar per skärva
+
+
+def resample(rets: np.ndarray, paths: int, rng, method: str = "bootstrap", block: int = 5) -> np.ndarray:
+    """-> (paths, len(rets)) omdragna affärsavkastningar."""
+    n = len(rets)
+    if method == "bootstrap":
+        idx = rng.integers(0, n, size=(paths, n))
+    elif method == "block":
+        b = max(1, min(int(block), n))
+        starts = rng.integers(0, n, size=(paths, -(-n // b)))
+        idx = ((starts[:, :, None] + np.arange(b)) % n).reshape(paths, -1)[:, :n]
+    elif method == "shuffle":
+        idx = rng.permuted(np.broadcast_to(np.arange(n), (paths, n)), axis=1)
+    else:
+        raise ValueError(f"Okänd metod: {method} (välj bland {', '.join(METHODS)})")
+    return rets[idx]
+
+
+def _shard(rets, years, paths, method, block, seed) -> dict:
+    R = resample(rets, paths, np.random.default_rng(seed), method, block)
+    m = metrics.compute_matrix(R, years)
+    return {k: m[k] for k in BAND_COLS}
+
+
+def _shards(paths: int, seed):
+    """(antal vägar, frö) per skärva – beror bara på paths och seed."""
+    sizes = [min(SHARD, paths - s) for s in range(0, paths, SHARD)]
+    return list(zip(sizes, np.random.SeedSequence(seed).spawn(len(sizes))))
+
+
+def simulate(runs, years, paths: int = 10_000, method: str = "bootstrap", block: int = 5,
+             seed: int = 0, workers: int = 1) -> list:
+    """
+    runs: lista av affärsavkastningsarrayer (en per körning), years: skalär
+    eller en per körning. -> per körning dict nyckeltal -> array (paths,).
+    Körningar utan affärer ger tomma arrayer.
+    """
+    runs = [np.asarray(r, dtype=np.float64) for r in runs]
+    years = np.broadcast_to(np.asarray(years, dtype=np.float64), (len(runs),))
+    jobs = [(k, (runs[k], float(years[k]), p, method, block, s))
+            for k in range(len(runs)) if len(runs[k]) for p, s in _shards(paths, [seed, k])]
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_shard, *zip(*(a for _, a in jobs)), chunksize=max(1, len(jobs) // (4 * workers))))
+    else:
+        parts = [_shard(*a) for _, a in jobs]
+    out = [{c: [] for c in BAND_COLS} for _ in runs]
+    for (k, _), part in zip(jobs, parts):
+        for c in BAND_COLS:
+            out[k][c].append(part[c])
+    return [{c: np.concatenate(v) if v else np.empty(0) for c, v in o.items()} for o in out]
+
+
+def bands(sim: dict, q=(5, 50, 95)) -> dict:
+    """Percentiler per nyckeltal, t.ex. {"cagr_p05": ..., "mdd_p50": ..., "pf_p95": ...}."""
+    out = {}
+    for col, short in BAND_COLS.items():
+        x = sim[col]
+        for p in q:
+            # "lower" interpolerar inte – PF kan vara inf
+            out[f"{short}_p{p:02d}"] = float(np.nanpercentile(x, p, method="lower")) if len(x) else np.nan
+    return out
+
+
+def trade_returns(df: pd.DataFrame, row, fee_pct: float = 0.0, slippage_bps: int = 0) -> np.ndarray:
+    """Affärsavkastningarna för en leaderboard-rad (samma backtest som optimize)."""
+    sig = build_signals(df, rsi_buy=row["rsi_buy"], rsi_sell=row["rsi_sell"], rsi_len=int(row.get("rsi_len", 14)))
+    res = run_backtest(sig, fee_pct=fee_pct, slippage_bps=slippage_bps, stop_pct=float(row.get("sl_fast_pct", 0.0)),
+                       tp_pct=float(row.get("tp_pct", 0.0)), trail_pct=float(row.get("trail_pct", 0.0)),
+                       time_stop=int(row.get("tstop_bars", 0)))
+    return np.asarray(res["returns"], dtype=np.float64)
+
+
+def leaderboard_bands(df: pd.DataFrame, lead: pd.DataFrame, top: int = 100, paths: int = 10_000,
+                      method: str = "bootstrap", block: int = 5, fee_pct: float = 0.0,
+                      slippage_bps: int = 0, seed: int = 0, workers: int = 1) -> pd.DataFrame:
+    """Lägger till konfidensband (cagr/mdd/pf p05/p50/p95) för de top första raderna."""
+    head = lead.head(top).reset_index(drop=True)
+    runs = [trade_returns(df, row, fee_pct, slippage_bps) for _, row in head.iterrows()]
+    sims = simulate(runs, metrics.years_between(df.index), paths, method, block, seed, workers)
+    return pd.concat([head, pd.DataFrame([bands(s) for s in sims])], axis=1)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Bootstrap/Monte Carlo av en RSI-strategis affärer")
+    ap.add_argument("--ticker", required=True)
+    ap.add_argument("--start", default="2018-01-01")
+    ap.add_argument("--interval", default="1d")
+    ap.add_argument("--source", default="auto")
+    ap.add_argument("--rsi_len", type=int, default=14)
+    ap.add_argument("--rsi_buy", type=float, default=45)
+    ap.add_argument("--rsi_sell", type=float, default=55)
+    ap.add_argument("--sl_fast", type=float, default=0.0)
+    ap.add_argument("--tp", type=float, default=0.0)
+    ap.add_argument("--trail", type=float, default=0.0)
+    ap.add_argument("--tstop", type=int, default=0)
+    ap.add_argument("--fee", type=float, default=0.0)
+    ap.add_argument("--slip", type=int, default=0)
+    ap.add_argument("--paths", type=int, default=10_000)
+    ap.add_argument("--method", choices=METHODS, default="bootstrap")
+    ap.add_argument("--block", type=int, default=5, help="Blocklängd i affärer (method=block)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--workers", type=int, default=1)
+    args = ap.parse_args()
+
+    df = get_data(args.ticker, args.start, interval=args.interval, source=args.source)
+    row = {"rsi_len": args.rsi_len, "rsi_buy": args.rsi_buy, "rsi_sell": args.rsi_sell,
+           "sl_fast_pct": args.sl_fast, "tp_pct": args.tp, "trail_pct": args.trail, "tstop_bars": args.tstop}
+    rets = trade_returns(df, row, args.fee, args.slip)
+    if not len(rets):
+        raise SystemExit("Inga affärer att dra om.")
+    years = metrics.years_between(df.index)
+    observed = metrics.compute([0, len(rets)], rets, years)
+    sim = simulate([rets], years, args.paths, args.method, args.block, args.seed, args.workers)[0]
+    print(f"{args.ticker}: {len(rets)} affärer, {args.paths} vägar ({args.method})")
+    b = bands(sim)
+    for col, short in BAND_COLS.items():
+        print(f"{col:>18}: observerat {observed[col][0]:9.2f} | p05 {b[short + '_p05']:9.2f} "
+              f"p50 {b[short + '_p50']:9.2f} p95 {b[short + '_p95']:9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Arrayer som publiceras en gång i multiprocessing.shared_memory och läses
+utan kopia i arbetsprocesser (optimize --workers).
+
+    blocks, spec = publish({"close": close, "rsi": bank})
+    ...  # skicka spec (namn, form, dtype) till arbetarna – litet att pickla
+    arrays = attach(spec)     # i arbetaren: vyer över samma minne, cachade per process
+    release(blocks)           # i huvudprocessen när poolen är klar
+"""
+import sys
+from multiprocessing import shared_memory
+
+import numpy as np
+
+_attached = {}  # spec-nyckel -> (blocks, arrays) i den här processen
+
+
+def publish(arrays: dict):
+    """{namn: array} -> (blocks, spec). Huvudprocessen äger blocken och släpper dem med release()."""
+    blocks, spec = [], {}
+    for name, a in arrays.items():
+        a = np.ascontiguousarray(a)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, a.nbytes))
+        np.ndarray(a.shape, a.dtype, buffer=shm.buf)[...] = a
+        blocks.append(shm)
+        spec[name] = (shm.name, a.shape, a.dtype.str)
+    return blocks, spec
+
+
+def _open(name: str):
+    # arbetarna delar huvudprocessens resource_tracker (fork och spawn), där
+    # blocket redan är registrerat – ägaren avregistrerar det i release()
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+
+def attach(spec: dict) -> dict:
+    """spec från publish() -> {namn: skrivskyddad vy}. Ansluts en gång per process."""
+    key = tuple(sorted((k, v[0]) for k, v in spec.items()))
+    if key not in _attached:
+        blocks, arrays = [], {}
+        for name, (shm_name, shape, dtype) in spec.items():
+            shm = _open(shm_name)
+            a = np.ndarray(shape, np.dtype(dtype), buffer=shm.buf)
+            a.flags.writeable = False
+            blocks.append(shm)
+            arrays[name] = a
+        _attached[key] = (blocks, arrays)
+    return _attached[key][1]
+
+
+def release(blocks):
+    for shm in blocks:
+        shm.close()
+        shm.unlink()
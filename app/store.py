@@ -0,0 +1,135 @@
+"""
+Lokalt kolumnlager för OHLCV-barer.
+
+Layout på disk (en fil per ticker och intervall):
+    <BAR_STORE_DIR>/<interval>/<TICKER>.parquet       (justerade priser)
+    <BAR_STORE_DIR>/<interval>/<TICKER>.raw.parquet   (auto_adjust=False)
+
+Mappade NumPy-arrayer (app/bars.py) för delning mellan processer:
+    <BAR_STORE_DIR>/<interval>/<TICKER>.bars/
+
+Bredvid varje fil ligger en liten .json med metadata (t.ex. tidigaste
+begärda startdatum) så att vi inte hämtar om historik som inte finns.
+"""
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    from app.bars import locked, open_bars, save_bars
+except ImportError:
+    from bars import locked, open_bars, save_bars
+
+STORE_DIR = os.getenv("BAR_STORE_DIR", "bar_store")
+COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+# Parquet kräver pyarrow – utan det faller vi tillbaka på pickle (samma API)
+try:
+    import pyarrow  # noqa: F401
+    _EXT = ".parquet"
+except Exception:
+    _EXT = ".pkl"
+
+
+def safe_name(ticker: str) -> str:
+    return "".join(c if (c.isalnum() or c in ".-^=_") else "_" for c in ticker.strip().upper())
+
+
+class BarStore:
+    def __init__(self, root=None):
+        self.root = Path(root or STORE_DIR)
+
+    def path(self, ticker: str, interval: str, adjusted: bool = True) -> Path:
+        name = safe_name(ticker) + ("" if adjusted else ".raw") + _EXT
+        return self.root / interval / name
+
+    def _meta_path(self, ticker, interval, adjusted=True) -> Path:
+        return self.path(ticker, interval, adjusted).with_suffix(".json")
+
+    # ---- läsa/skriva ----
+
+    def read(self, ticker: str, interval: str, adjusted: bool = True):
+        p = self.path(ticker, interval, adjusted)
+        if not p.exists():
+            return None
+        try:
+            df = pd.read_parquet(p) if _EXT == ".parquet" else pd.read_pickle(p)
+        except Exception:
+            return None
+        return df.sort_index()
+
+    def write(self, df: pd.DataFrame, ticker: str, interval: str, adjusted: bool = True, **meta):
+        p = self.path(ticker, interval, adjusted)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_name(p.name + ".tmp")
+        if _EXT == ".parquet":
+            df.to_parquet(tmp)
+        else:
+            df.to_pickle(tmp)
+        os.replace(tmp, p)  # atomiskt – läsare ser aldrig en halvskriven fil
+        if meta:
+            old = self.meta(ticker, interval, adjusted)
+            old.update(meta)
+            self._meta_path(ticker, interval, adjusted).write_text(json.dumps(old), encoding="utf-8")
+
+    def append(self, new: pd.DataFrame, ticker: str, interval: str, adjusted: bool = True) -> pd.DataFrame:
+        """Slår ihop nya barer med lagrade. Överlappande tidsstämplar ersätts av de nya."""
+        old = self.read(ticker, interval, adjusted)
+        if old is None or old.empty:
+            merged = new
+        elif new is None or new.empty:
+            return old
+        else:
+            merged = pd.concat([old, new])
+            merged = merged[~merged.index.duplicated(keep="last")].sort_index()
+        self.write(merged, ticker, interval, adjusted)
+        return merged
+
+    def bars_path(self, ticker: str, interval: str, adjusted: bool = True) -> Path:
+        return self.path(ticker, interval, adjusted).with_suffix(".bars")
+
+    def open_bars(self, ticker: str, interval: str, adjusted: bool = True, mmap: bool = True):
+        """
+        Öppnar tickerns historik som mmap-arrayer (Bars). Exporteras från
+        kolumnfilen första gången och när den har skrivits om sedan dess.
+        Säkert från många processer samtidigt: den första som ser en inaktuell
+        export skriver om den under exklusivt lås, övriga väntar och öppnar
+        sedan den färska (se app/bars.locked).
+        """
+        src = self.path(ticker, interval, adjusted)
+        dst = self.bars_path(ticker, interval, adjusted)
+        if not src.exists():
+            return None
+        stamp = dst / "meta.json"
+        fresh = lambda: stamp.exists() and stamp.stat().st_mtime >= src.stat().st_mtime
+        with locked(dst, exclusive=False):
+            if fresh():
+                return open_bars(dst, mmap=mmap)
+        with locked(dst):
+            if not fresh():
+                save_bars(self.read(ticker, interval, adjusted), dst, lock=False)
+            return open_bars(dst, mmap=mmap)
+
+    def intervals(self, ticker: str, adjusted: bool = True) -> list:
+        """Intervall som finns lagrade för tickern."""
+        if not self.root.exists():
+            return []
+        return sorted(d.name for d in self.root.iterdir()
+                      if d.is_dir() and self.path(ticker, d.name, adjusted).exists())
+
+    def meta(self, ticker: str, interval: str, adjusted: bool = True) -> dict:
+        p = self._meta_path(ticker, interval, adjusted)
+        if p.exists():
+            try:
+                return json.loads(p.read_text(encoding="utf-8"))
+            except Exception:
+                return {}
+        return {}
+
+    def last_timestamp(self, ticker: str, interval: str, adjusted: bool = True):
+        df = self.read(ticker, interval, adjusted)
+        if df is None or df.empty:
+            return None
+        return df.index[-1]
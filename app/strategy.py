@@ -1,37 +1,99 @@
 import numpy as np
 import pandas as pd
 
-def run_backtest(df: pd.DataFrame, fee_pct: float = 0.0, slippage_bps: int = 0):
+try:
+    from app import exits, metrics
+    from app.ledger import TradeLedger
+except ImportError:
+    import exits
+    import metrics
+    from ledger import TradeLedger
+
+
+def _flags(df: pd.DataFrame, col: str) -> np.ndarray:
+    if col not in df.columns:
+        return np.zeros(len(df), dtype=bool)
+    return np.asarray(df[col].to_numpy(), dtype=bool)
+
+
+def pair_trades(buy: np.ndarray, sell: np.ndarray):
+    """
+    Parar ihop köp- och säljhändelser för 1 position åt gången, long only:
+    entry på första BUY efter föregående exit, exit på första SELL efter entry
+    (samma bar räknas inte – entry vinner). Hoppar mellan händelser med
+    searchsorted i stället för att gå igenom varje bar.
+    -> (entry_idx, exit_idx, open_idx) där open_idx är en ej stängd entry eller None.
+    """
+    buys = np.flatnonzero(buy)
+    sells = np.flatnonzero(sell)
+    entries, exits = [], []
+    start = 0
+    while True:
+        b = np.searchsorted(buys, start)
+        if b == len(buys):
+            return np.array(entries, dtype=np.int64), np.array(exits, dtype=np.int64), None
+        e = buys[b]
+        s = np.searchsorted(sells, e, side="right")
+        if s == len(sells):
+            return np.array(entries, dtype=np.int64), np.array(exits, dtype=np.int64), int(e)
+        entries.append(e)
+        exits.append(sells[s])
+        start = sells[s] + 1
+
+
+def _col(df: pd.DataFrame, name: str):
+    return df[name].to_numpy(dtype=float) if name in df.columns else None
+
+
+def stats(rets: np.ndarray, equity: np.ndarray, index) -> dict:
+    """Nyckeltal i samma form som optimize-CSV:erna (procent, max DD negativ) – se app/metrics.py."""
+    rets = np.asarray(rets, dtype=np.float64)
+    m = metrics.compute([0, len(rets)], rets, metrics.years_between(index),
+                        np.asarray(equity, dtype=np.float64)[:, None])
+    return {k: int(v[0]) if k == "trades" else float(v[0]) for k, v in m.items()}
+
+
+def run_backtest(df: pd.DataFrame, fee_pct: float = 0.0, slippage_bps: int = 0,
+                 stop_pct: float = 0.0, tp_pct: float = 0.0, trail_pct: float = 0.0,
+                 time_stop: int = 0):
     """
     Enkel backtestmotor: 1 position åt gången, long only.
+    Entry/exit på stängningen. Med stop_pct/tp_pct/trail_pct (%) eller
+    time_stop (barer) körs exit-motorn i app/exits.py: stopp och TP fylls
+    intradag på nivån (High/Low om de finns, annars Close).
     """
-    df = df.copy()
-    pos = 0
-    entry_px = None
-    rets = []
-    trades = []
-
-    for i, row in df.iterrows():
-        px = row["Close"]
-
-        if pos == 0 and row["BUY"]:
-            pos = 1
-            entry_px = px * (1 + slippage_bps/10000)
-            trades.append({"Type": "BUY", "Date": i, "Price": entry_px})
-
-        elif pos == 1 and row["SELL"]:
-            exit_px = px * (1 - slippage_bps/10000)
-            ret = (exit_px / entry_px - 1) - (fee_pct/100)*2
-            rets.append(ret)
-            trades.append({"Type": "SELL", "Date": i, "Price": exit_px, "PnL": ret})
-            pos = 0
-            entry_px = None
-
-    equity = np.cumprod([1] + [1+r for r in rets])
-    return {
-        "trades": pd.DataFrame(trades),
-        "returns": rets,
-        "equity": equity
-    }
+    close = df["Close"].to_numpy(dtype=float)
+    with_reason = bool(stop_pct or tp_pct or trail_pct or time_stop)
+    if with_reason:
+        rules = exits.ExitRules(fixed_pct=stop_pct, trail_pct=trail_pct, tp_pct=tp_pct,
+                                time_stop=int(time_stop))
+        res = exits.run_exits(_col(df, "Open"), _col(df, "High"), _col(df, "Low"), close, None,
+                              _flags(df, "BUY"), _flags(df, "SELL"), rules)
+        closed = res["exit_i"] >= 0
+        ent, ext = res["entry_i"][closed], res["exit_i"][closed]
+        open_i = int(res["entry_i"][-1]) if len(closed) and not closed[-1] else None
+        raw_exit = res["exit_px"][closed]
+        why = res["reason"][closed]
+    else:
+        ent, ext, open_i = pair_trades(_flags(df, "BUY"), _flags(df, "SELL"))
+        raw_exit = close[ext]
+        why = exits.SIGNAL
+
+    entry_px = close[ent] * (1 + slippage_bps/10000)
+    exit_px = raw_exit * (1 - slippage_bps/10000)
+    rets = (exit_px / entry_px - 1) - (fee_pct/100)*2
 
+    # KÖP/SÄLJ-rader omväxlande (+ ev. öppen entry sist) via den kolumnära liggaren
+    led = TradeLedger(len(ent) + 1)
+    led.extend(ent, ext, entry_px, exit_px, reason=why, pnl=rets)
+    if open_i is not None:
+        led.append(open_i, -1, close[open_i] * (1 + slippage_bps/10000), reason=exits.OPEN)
+    trades = led.to_rows(df.index, reason=with_reason)
 
+    equity = np.cumprod(np.concatenate([[1.0], 1.0 + rets]))
+    return {
+        "trades": trades,
+        "returns": rets.tolist(),
+        "equity": equity,
+        "stats": stats(rets, equity, df.index),
+    }
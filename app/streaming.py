@@ -0,0 +1,169 @@
+"""
+Inkrementella indikatorer: O(1) per ny bar och serialiserbara till JSON
+(sparas i alert_state.json bredvid last_signal).
+
+Samma definitioner som app/indicators.py – matat med samma barer från samma
+start ger de samma värden som batch-beräkningen:
+
+    EMAState        == indicators.ema / ewm(adjust=False)
+    MACDState       == indicators.macd
+    WilderRSIState  == indicators.rsi_wilder
+    RollingRSIState == indicators.rsi_sma
+"""
+import copy
+import math
+
+NAN = float("nan")
+
+
+class EMAState:
+    kind = "ema"
+
+    def __init__(self, alpha: float, value: float = None):
+        self.alpha = float(alpha)
+        self.value = value
+
+    @classmethod
+    def from_span(cls, span: int) -> "EMAState":
+        return cls(2.0 / (span + 1.0))
+
+    def update(self, x: float) -> float:
+        if self.value is None:
+            self.value = float(x)
+        else:
+            self.value += self.alpha * (float(x) - self.value)
+        return self.value
+
+    def to_dict(self) -> dict:
+        return {"kind": self.kind, "alpha": self.alpha, "value": self.value}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "EMAState":
+        return cls(d["alpha"], d.get("value"))
+
+
+class MACDState:
+    kind = "macd"
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self.fast = EMAState.from_span(fast)
+        self.slow = EMAState.from_span(slow)
+        self.signal = EMAState.from_span(signal)
+        self.line = None
+
+    def update(self, x: float):
+        """-> (macd_line, signal_line)"""
+        self.line = self.fast.update(x) - self.slow.update(x)
+        return self.line, self.signal.update(self.line)
+
+    def to_dict(self) -> dict:
+        return {"kind": self.kind, "fast": self.fast.to_dict(), "slow": self.slow.to_dict(),
+                "signal": self.signal.to_dict(), "line": self.line}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "MACDState":
+        m = cls()
+        m.fast = EMAState.from_dict(d["fast"])
+        m.slow = EMAState.from_dict(d["slow"])
+        m.signal = EMAState.from_dict(d["signal"])
+        m.line = d.get("line")
+        return m
+
+
+def _rsi(avg_gain, avg_loss, nan_on_zero_loss):
+    if avg_loss == 0:
+        if nan_on_zero_loss or avg_gain == 0:
+            return NAN
+        return 100.0
+    return 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+
+class WilderRSIState:
+    kind = "rsi_wilder"
+
+    def __init__(self, n: int = 14, nan_on_zero_loss: bool = True):
+        self.n = int(n)
+        self.nan_on_zero_loss = bool(nan_on_zero_loss)
+        self.prev = None
+        self.gain = EMAState(1.0 / self.n)
+        self.loss = EMAState(1.0 / self.n)
+
+    def update(self, x: float) -> float:
+        x = float(x)
+        if self.prev is None:
+            self.prev = x
+            return NAN
+        d = x - self.prev
+        self.prev = x
+        g = self.gain.update(d if d > 0 else 0.0)
+        l = self.loss.update(-d if d < 0 else 0.0)
+        return _rsi(g, l, self.nan_on_zero_loss)
+
+    def to_dict(self) -> dict:
+        return {"kind": self.kind, "n": self.n, "nan_on_zero_loss": self.nan_on_zero_loss,
+                "prev": self.prev, "gain": self.gain.to_dict(), "loss": self.loss.to_dict()}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "WilderRSIState":
+        r = cls(d["n"], d.get("nan_on_zero_loss", True))
+        r.prev = d.get("prev")
+        r.gain = EMAState.from_dict(d["gain"])
+        r.loss = EMAState.from_dict(d["loss"])
+        return r
+
+
+class RollingRSIState:
+    """RSI på rullande medel över de n senaste diffarna (fönstret sparas)."""
+    kind = "rsi_sma"
+
+    def __init__(self, n: int = 14, zero_first: bool = False, nan_on_zero_loss: bool = False):
+        self.n = int(n)
+        self.zero_first = bool(zero_first)
+        self.nan_on_zero_loss = bool(nan_on_zero_loss)
+        self.prev = None
+        self.gains = []
+        self.losses = []
+
+    def update(self, x: float) -> float:
+        x = float(x)
+        if self.prev is None:
+            self.prev = x
+            if not self.zero_first:
+                return NAN
+            d = 0.0
+        else:
+            d = x - self.prev
+            self.prev = x
+        self.gains.append(d if d > 0 else 0.0)
+        self.losses.append(-d if d < 0 else 0.0)
+        if len(self.gains) > self.n:
+            del self.gains[0], self.losses[0]
+        if len(self.gains) < self.n:
+            return NAN
+        return _rsi(math.fsum(self.gains) / self.n, math.fsum(self.losses) / self.n, self.nan_on_zero_loss)
+
+    def to_dict(self) -> dict:
+        return {"kind": self.kind, "n": self.n, "zero_first": self.zero_first,
+                "nan_on_zero_loss": self.nan_on_zero_loss, "prev": self.prev,
+                "gains": list(self.gains), "losses": list(self.losses)}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "RollingRSIState":
+        r = cls(d["n"], d.get("zero_first", False), d.get("nan_on_zero_loss", False))
+        r.prev = d.get("prev")
+        r.gains = list(d.get("gains", []))
+        r.losses = list(d.get("losses", []))
+        return r
+
+
+KINDS = {c.kind: c for c in (EMAState, MACDState, WilderRSIState, RollingRSIState)}
+
+
+def from_dict(d: dict):
+    return KINDS[d["kind"]].from_dict(d)
+
+
+def peek(state, x: float):
+    """Uppdatera en kopia – för en ofullständig sista bar som inte ska sparas."""
+    s = copy.deepcopy(state)
+    return s, s.update(x)
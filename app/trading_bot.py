@@ -1,7 +1,13 @@
 import argparse
-import numpy as np
 import pandas as pd
 
+try:
+    from app import indicators as ind
+    from app.indicator_cache import cached
+except ImportError:
+    import indicators as ind
+    from indicator_cache import cached
+
 # ---- Indikatorer ----
 def rsi(series: pd.Series, period: int = 14) -> pd.Series:
     # Säkerställ 1D Series
@@ -9,14 +15,8 @@ def rsi(series: pd.Series, period: int = 14) -> pd.Series:
         series = series.iloc[:, 0]
     series = series.astype(float)
 
-    delta = series.diff()
-    up = np.where(delta > 0, delta, 0.0)
-    down = np.where(delta < 0, -delta, 0.0)
-
-    roll_up = pd.Series(up, index=series.index).rolling(period).mean()
-    roll_down = pd.Series(down, index=series.index).rolling(period).mean()
-    rs = roll_up / roll_down
-    return 100 - (100 / (1 + rs))
+    # rullande medel, första diffen räknas som 0 – se app/indicators.py
+    return pd.Series(ind.rsi_sma(series.to_numpy(), period, zero_first=True), index=series.index)
 
 def macd(series: pd.Series, fast=12, slow=26, signal=9):
     # Säkerställ 1D Series
@@ -24,11 +24,8 @@ def macd(series: pd.Series, fast=12, slow=26, signal=9):
         series = series.iloc[:, 0]
     series = series.astype(float)
 
-    ema_fast = series.ewm(span=fast, adjust=False).mean()
-    ema_slow = series.ewm(span=slow, adjust=False).mean()
-    macd_line = ema_fast - ema_slow
-    signal_line = macd_line.ewm(span=signal, adjust=False).mean()
-    return macd_line, signal_line
+    macd_line, signal_line, _ = ind.macd(series.to_numpy(), fast, slow, signal)
+    return pd.Series(macd_line, index=series.index), pd.Series(signal_line, index=series.index)
 
 # ---- Strategi ----
 def generate_signals(close: pd.Series) -> pd.DataFrame:
@@ -37,14 +34,14 @@ def generate_signals(close: pd.Series) -> pd.DataFrame:
         close = close.iloc[:, 0]
     close = pd.to_numeric(close, errors="coerce").dropna()
 
-    macd_line, signal_line = macd(close)
-    rsi14 = rsi(close, 14)
+    px = close.to_numpy(dtype=float)
+    macd_line, signal_line, _ = cached("macd", px, fast=12, slow=26, signal=9)
 
     signals = pd.DataFrame(index=close.index)
     signals["close"] = close
     signals["macd"] = macd_line
     signals["signal"] = signal_line
-    signals["rsi"] = rsi14
+    signals["rsi"] = cached("rsi_sma", px, n=14, zero_first=True)
 
     # Köp/sälj logik
     signals["buy"] = (signals["macd"] > signals["signal"]) & (signals["rsi"] > 50)
@@ -3,9 +3,8 @@ import pandas as pd
 import numpy as np
 import altair as alt
 
-from app.data import get_data
-from app.strategy import build_signals
-from app.backtest import run_backtest
+from app.data import get_data, build_signals
+from app.strategy import run_backtest
 
 # ---------- Page setup ----------
 st.set_page_config(
@@ -1,36 +1,75 @@
 import numpy as np
 import pandas as pd
 
+
+def _flags(df: pd.DataFrame, col: str) -> np.ndarray:
+    if col not in df.columns:
+        return np.zeros(len(df), dtype=bool)
+    return np.asarray(df[col].to_numpy(), dtype=bool)
+
+
+def pair_trades(buy: np.ndarray, sell: np.ndarray):
+    """
+    Parar ihop köp- och säljhändelser för 1 position åt gången, long only:
+    entry på första BUY efter föregående exit, exit på första SELL efter entry
+    (samma bar räknas inte – entry vinner). Hoppar mellan händelser med
+    searchsorted i stället för att gå igenom varje bar.
+    -> (entry_idx, exit_idx, open_idx) där open_idx är en ej stängd entry eller None.
+    """
+    buys = np.flatnonzero(buy)
+    sells = np.flatnonzero(sell)
+    entries, exits = [], []
+    start = 0
+    while True:
+        b = np.searchsorted(buys, start)
+        if b == len(buys):
+            return np.array(entries, dtype=np.int64), np.array(exits, dtype=np.int64), None
+        e = buys[b]
+        s = np.searchsorted(sells, e, side="right")
+        if s == len(sells):
+            return np.array(entries, dtype=np.int64), np.array(exits, dtype=np.int64), int(e)
+        entries.append(e)
+        exits.append(sells[s])
+        start = sells[s] + 1
+
+
 def run_backtest(df: pd.DataFrame, fee_pct: float = 0.0, slippage_bps: int = 0):
     """
     Enkel backtestmotor: 1 position åt gången, long only.
     Exit sker när SELL triggar. (Stoppar kan läggas till senare.)
     """
-    d = df.copy()
-    pos = 0
-    entry_px = None
-    rets = []
-    trades = []
-
-    for i, row in d.iterrows():
-        px = row["Close"]
-
-        if pos == 0 and row.get("BUY", False):
-            pos = 1
-            entry_px = px * (1 + slippage_bps/10000)
-            trades.append({"Type": "BUY", "Date": i, "Price": float(entry_px)})
-
-        elif pos == 1 and row.get("SELL", False):
-            exit_px = px * (1 - slippage_bps/10000)
-            ret = (exit_px / entry_px - 1) - (fee_pct/100)*2  # courtage båda sidor
-            rets.append(float(ret))
-            trades.append({"Type": "SELL", "Date": i, "Price": float(exit_px), "PnL": float(ret)})
-            pos = 0
-            entry_px = None
-
-    equity = np.cumprod([1.0] + [1.0 + r for r in rets])
+    close = df["Close"].to_numpy(dtype=float)
+    ent, ext, open_i = pair_trades(_flags(df, "BUY"), _flags(df, "SELL"))
+
+    entry_px = close[ent] * (1 + slippage_bps/10000)
+    exit_px = close[ext] * (1 - slippage_bps/10000)
+    rets = (exit_px / entry_px - 1) - (fee_pct/100)*2
+
+    # KÖP/SÄLJ-rader omväxlande (+ ev. öppen entry sist), byggda som kolumner
+    idx = df.index
+    n = len(ent)
+    pos = np.empty(2 * n, dtype=np.int64)
+    pos[0::2], pos[1::2] = ent, ext
+    prices = np.empty(2 * n)
+    prices[0::2], prices[1::2] = entry_px, exit_px
+    types = ["BUY", "SELL"] * n
+    if open_i is not None:
+        pos = np.append(pos, open_i)
+        prices = np.append(prices, close[open_i] * (1 + slippage_bps/10000))
+        types.append("BUY")
+    if len(pos):
+        cols = {"Type": types, "Date": idx[pos], "Price": prices}
+        if n:
+            pnl = np.full(len(pos), np.nan)
+            pnl[1:2 * n:2] = rets
+            cols["PnL"] = pnl
+        trades = pd.DataFrame(cols)
+    else:
+        trades = pd.DataFrame([])
+
+    equity = np.cumprod(np.concatenate([[1.0], 1.0 + rets]))
     return {
-        "trades": pd.DataFrame(trades),
-        "returns": rets,
+        "trades": trades,
+        "returns": rets.tolist(),
         "equity": equity.tolist()
     }